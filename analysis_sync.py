@@ -0,0 +1,117 @@
+"""Commit sequence for test rows, so analysis clients can fetch only what is new.
+
+Test IDs come from per-worker blocks, so they do not grow in commit order and cannot serve
+as a watermark. Instead every transaction that inserts tests takes the next value of the
+``test_details`` commit sequence as its last statement and stamps its rows with it. The
+sequence row stays locked until the commit, so sequence order is commit order: once a
+reader sees value ``n``, every row stamped ``<= n`` is visible as well.
+
+Rows written without a stamp (before schema version 3, or by direct SQL) keep
+``commit_seq = 0`` and only appear in full reads. Give them a sequence value with:
+
+    python -m analysis_sync stamp
+"""
+import argparse
+import sys
+from queries import ANALYSIS_QUERY
+
+
+SEQUENCE = "test_details"
+
+NEXT_SQL = "UPDATE commit_sequence SET value = value + 1 WHERE name = %s"
+CURRENT_SQL = "SELECT value FROM commit_sequence WHERE name = %s"
+
+# Rows stamped per UPDATE; keeps the IN list well under the driver parameter limits
+STAMP_CHUNK = 1000
+
+
+# ---------- WRITERS ----------
+def stamp_query(seq, test_ids):
+    placeholders = ", ".join(["%s"] * len(test_ids))
+    return f"UPDATE test_details SET commit_seq = %s WHERE test_id IN ({placeholders})", (seq, *test_ids)
+
+
+def stamp_tests(cursor, test_ids):
+    """Stamps the tests inserted by the current transaction and returns their sequence value.
+
+    Must run last before the commit: it holds the sequence row lock until then, and writers
+    take the other locks (test rows, cohort histogram cells) before it.
+    """
+    if not test_ids:
+        return None
+    cursor.execute(NEXT_SQL, (SEQUENCE,))
+    cursor.execute(CURRENT_SQL, (SEQUENCE,))
+    seq = cursor.fetchone()[0]
+    for start in range(0, len(test_ids), STAMP_CHUNK):
+        cursor.execute(*stamp_query(seq, test_ids[start:start + STAMP_CHUNK]))
+    return seq
+
+
+def stamp_unstamped(cursor):
+    """Gives every unstamped test one new sequence value; the caller commits."""
+    cursor.execute(NEXT_SQL, (SEQUENCE,))
+    cursor.execute(CURRENT_SQL, (SEQUENCE,))
+    seq = cursor.fetchone()[0]
+    cursor.execute("UPDATE test_details SET commit_seq = %s WHERE commit_seq = 0", (seq,))
+    return cursor.rowcount
+
+
+def reset(cursor):
+    """Restarts the sequence after the test table was emptied, so clients holding a newer
+    watermark fall back to a full read."""
+    cursor.execute("UPDATE commit_sequence SET value = 0 WHERE name = %s", (SEQUENCE,))
+
+
+# ---------- READERS ----------
+def current(cursor):
+    cursor.execute(CURRENT_SQL, (SEQUENCE,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def analysis_query(watermark, since=None):
+    """Returns ``(query, params, headers)`` for the analysis rows committed up to ``watermark``,
+    or only those committed after ``since`` when it is given.
+
+    Bounding by the watermark read beforehand keeps the response and its ``X-Watermark``
+    consistent even when tests commit while the rows are read.
+    """
+    if since is not None and since > watermark:
+        # The sequence went backwards, so the tests were reloaded: send everything again
+        since = None
+    query = ANALYSIS_QUERY + " WHERE td.commit_seq <= %s"
+    params = (watermark,)
+    headers = {"X-Watermark": str(watermark)}
+    if since is not None:
+        query += " AND td.commit_seq > %s"
+        params += (since,)
+        headers["X-Delta-Since"] = str(since)
+    return query, params, headers
+
+
+def main(argv=None):
+    from app_config import settings
+    from storage import connector
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("stamp", "status"))
+    args = parser.parse_args(argv)
+
+    conn = connector(settings)()
+    cursor = conn.cursor()
+    try:
+        if args.command == "stamp":
+            stamped = stamp_unstamped(cursor)
+            conn.commit()
+            print(f"stamped {stamped} test rows")
+        watermark = current(cursor)
+        cursor.execute("SELECT COUNT(*) FROM test_details WHERE commit_seq = 0")
+        print(f"watermark {watermark}, {cursor.fetchone()[0]} unstamped test rows")
+    finally:
+        cursor.close()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
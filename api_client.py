@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# ---------- API CLIENT ----------
+class ApiClient:
+    """Keep-alive HTTP client for the backend API shared by the Streamlit pages.
+
+    One pooled session is reused for every call; GETs are retried with backoff on connection
+    errors and 502/503/504 (POSTs are not, since they are not idempotent). ``gather`` runs
+    independent calls in parallel so a page waits for the slowest call, not the sum.
+    """
+
+    def __init__(self, base_url, timeout=(3.05, 30), retries=3, backoff=0.3, pool_size=16):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="api-client")
+
+    def get(self, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(self.base_url + path, **kwargs)
+
+    def post(self, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(self.base_url + path, **kwargs)
+
+    def gather(self, calls):
+        """Runs ``{name: zero-arg callable}`` concurrently. Returns ``{name: result}``, where a
+        call that raised maps to the exception instead of a response."""
+        futures = {name: self._executor.submit(call) for name, call in calls.items()}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+class DeltaFrame:
+    """Local DataFrame copy of an append-only endpoint such as ``/get_analysis``.
+
+    Each refresh sends the ``X-Watermark`` of the previous response as ``since`` and appends
+    the rows of a delta response (one carrying ``X-Delta-Since``); any other response
+    replaces the copy. Steady-state traffic is then proportional to the new rows.
+    """
+
+    def __init__(self, client, path, decode, accept):
+        self.client = client
+        self.path = path
+        self.decode = decode
+        self.accept = accept
+        self.frame = None
+        self.watermark = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Fetches what is new and returns ``(frame, watermark)``; raises on HTTP errors."""
+        with self._lock:
+            params = {"since": self.watermark} if self.watermark is not None and self.frame is not None else {}
+            response = self.client.get(self.path, params=params, headers={"Accept": self.accept})
+            response.raise_for_status()
+            rows = self.decode(response.content, response.headers["content-type"])
+            if "X-Delta-Since" in response.headers:
+                if len(rows):
+                    self.frame = pd.concat([self.frame, rows], ignore_index=True)
+            else:
+                self.frame = rows
+            self.watermark = response.headers.get("X-Watermark")
+            return self.frame, self.watermark
+
+
+class ReadCache:
+    """Bounded LRU with TTL for the reads of one UI session.
+
+    Each entry carries tags such as ``patient:42``. A write made by the session invalidates
+    the tags it touched, so reruns triggered by widgets reuse earlier reads without showing
+    data from before the session's own writes. Failed responses are not stored.
+    """
+
+    def __init__(self, max_entries=128, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that overlapped one is not stored
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, tags, load):
+        """Returns the value cached under ``key``, or calls ``load()`` and caches its result
+        (tagged with ``tags``) unless it is a response with an error status."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+            generation = self._generation
+        value = load()
+        if getattr(value, "ok", True):
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (value, now + self.ttl, frozenset(tags))
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, tags):
+        tags = set(tags)
+        with self._lock:
+            self._generation += 1
+            for key in [key for key, entry in self._entries.items() if entry[2] & tags]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+
+def unwrap(result):
+    """Returns a ``gather`` result, re-raising it if the call failed."""
+    if isinstance(result, Exception):
+        raise result
+    return result
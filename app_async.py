@@ -0,0 +1,228 @@
+import aiomysql
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from async_db import Error
+from columnar import negotiate_format, tuples_to_table, table_response
+from input_basemodels import PatientBase, Lifestyle, AppointmentCreate, TestDetails, Prescription
+from queries import PATIENT_INSERT, LIFESTYLE_INSERT, APPOINTMENT_INSERT, TEST_INSERT, PRESCRIPTION_INSERT, RISK_QUERY, TEST_SELECT
+import analysis_sync
+import cohort_stats
+import patient_search
+from doctor_scheduler import BOOKING_ATTEMPTS, DOCTOR_LOCK, BOOKINGS_COUNT
+
+
+# Async versions of the core endpoints. app_main registers this router ahead of its sync
+# handlers when HEALTHCARE_DB_ASYNC is enabled, so matching paths are served from here and
+# everything else (bulk, fetch, aggregates) falls through to the sync implementation.
+def create_router(get_pool, id_allocator, medicine_for, response_cache, scheduler):
+    router = APIRouter()
+
+    async def next_id(table):
+        value = id_allocator.next_id_nowait(table)
+        if value is None:
+            value = await run_in_threadpool(id_allocator.next_id, table)
+        return value
+
+    async def book_appointment(appointment_id, appt, doctor_id, capacity):
+        """Inserts the booking unless the doctor is already at ``capacity`` that day (see
+        doctor_scheduler.has_room); returns whether it was inserted."""
+        async with get_pool().connection() as conn:
+            await conn.begin()
+            async with conn.cursor() as cursor:
+                if capacity is not None:
+                    await cursor.execute(DOCTOR_LOCK, (doctor_id,))
+                    await cursor.fetchall()
+                    await cursor.execute(BOOKINGS_COUNT, (doctor_id, appt.appointment_date))
+                    if (await cursor.fetchone())[0] >= capacity:
+                        await conn.rollback()
+                        return False
+                await cursor.execute(
+                    APPOINTMENT_INSERT,
+                    (appointment_id, appt.patient_id, doctor_id, appt.appointment_date, appt.appointment_type),
+                )
+            await conn.commit()
+            return True
+
+    async def fetch_list(request, format, query, params=(), cache_tags=None, headers=None):
+        fmt = negotiate_format(request, format)
+        if cache_tags:
+            key = (query, fmt, tuple(params))
+            hit, cached, token = response_cache.lookup(key, cache_tags)
+            if hit:
+                return cached
+        async with get_pool().connection() as conn:
+            cursor_class = aiomysql.DictCursor if fmt == "json" else aiomysql.Cursor
+            async with conn.cursor(cursor_class) as cursor:
+                await cursor.execute(query, params)
+                rows = await cursor.fetchall()
+                names = [d[0] for d in cursor.description]
+        if fmt != "json":
+            result = table_response(tuples_to_table(names, rows), fmt, headers)
+        else:
+            result = JSONResponse(jsonable_encoder(rows), headers=headers) if headers else rows
+        if cache_tags:
+            response_cache.store(key, result, token)
+        return result
+
+    # ---------- ENDPOINTS ----------
+    @router.post("/patients/new")
+    async def create_patient(patient: PatientBase):
+        try:
+            patient_id = await next_id("patient_details")
+            async with get_pool().connection() as conn:
+                await conn.begin()
+                async with conn.cursor() as cursor:
+                    await cursor.execute(PATIENT_INSERT, (patient_id, patient.name, patient.age, patient.gender, patient.height, patient.weight))
+                    await cursor.executemany(patient_search.TERM_INSERT, patient_search.term_rows([(patient_id, patient.name)]))
+                await conn.commit()
+            response_cache.invalidate("patient_details")
+            return {"patient_id": patient_id}
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.post("/patients/lifestyle")
+    async def create_lifestyle(lifestyle: Lifestyle):
+        try:
+            async with get_pool().connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(LIFESTYLE_INSERT, (lifestyle.patient_id, lifestyle.smoke, lifestyle.alco, lifestyle.active))
+            response_cache.invalidate("patient_lifestyle")
+            return {"message": "Lifestyle data added successfully"}
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get("/doctors")
+    async def get_doctors(request: Request, format: str = None):
+        try:
+            return await fetch_list(request, format, "SELECT * FROM doctors", cache_tags=("doctors",))
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.post("/appointments")
+    async def create_appointment(appt: AppointmentCreate):
+        try:
+            appointment_id = await next_id("appointments")
+            for _ in range(BOOKING_ATTEMPTS):
+                if scheduler.needs_load(appt.appointment_date):
+                    await run_in_threadpool(scheduler.load_date, appt.appointment_date)
+                assigned_doctor = scheduler.assign(appt.appointment_date)
+                capacity = scheduler.capacity(assigned_doctor)
+                try:
+                    booked = await book_appointment(appointment_id, appt, assigned_doctor, capacity)
+                except BaseException:
+                    scheduler.release(appt.appointment_date, assigned_doctor)
+                    raise
+                if booked:
+                    scheduler.confirm(appt.appointment_date, assigned_doctor)
+                    response_cache.invalidate("appointments")
+                    return {"appointment_id": appointment_id, "assigned_doctor_id": assigned_doctor}
+                scheduler.mark_full(appt.appointment_date, assigned_doctor)
+            raise HTTPException(status_code=409, detail=f"All doctors are fully booked on {appt.appointment_date}")
+        except Error as e:
+            print(e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.post("/tests")
+    async def add_test_details(test: TestDetails):
+        try:
+            test_id = await next_id("test_details")
+            sample = (test.appointment_id, test.ap_hi, test.ap_lo, test.cholesterol, test.gluc)
+            async with get_pool().connection() as conn:
+                await conn.begin()
+                async with conn.cursor() as cursor:
+                    await cursor.execute(TEST_INSERT, (test_id, *sample))
+                    query, params = cohort_stats.age_lookup([sample])
+                    await cursor.execute(query, params)
+                    rows = cohort_stats.tests_to_rows([sample], dict(await cursor.fetchall()))
+                    if rows:
+                        await cursor.executemany(cohort_stats.UPSERT_SQL, rows)
+                    # Last statement before the commit, see analysis_sync.stamp_tests
+                    await cursor.execute(analysis_sync.NEXT_SQL, (analysis_sync.SEQUENCE,))
+                    await cursor.execute(analysis_sync.CURRENT_SQL, (analysis_sync.SEQUENCE,))
+                    seq = (await cursor.fetchone())[0]
+                    await cursor.execute(*analysis_sync.stamp_query(seq, [test_id]))
+                await conn.commit()
+            response_cache.invalidate("test_details", "cohort_histogram")
+            return {"test_id": test_id}
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.post("/prescriptions")
+    async def prescribe_medicine(presc: Prescription):
+        try:
+            prescription_id = await next_id("prescriptions")
+            async with get_pool().connection() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(RISK_QUERY + " WHERE td.appointment_id = %s", (presc.appointment_id,))
+                    test = await cursor.fetchone()
+                    if not test:
+                        raise HTTPException(status_code=404, detail="Test data not found")
+
+                    medicine_name = medicine_for(test, presc.medicine_name)
+                    await cursor.execute(PRESCRIPTION_INSERT, (prescription_id, presc.appointment_id, presc.prescribed_date, medicine_name, presc.dosage, presc.duration_days))
+            response_cache.invalidate("prescriptions")
+            return {"prescription_id": prescription_id}
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get("/patients/{patient_id}")
+    async def get_patient_info(patient_id: int):
+        key = ("patient", patient_id)
+        hit, cached, token = response_cache.lookup(key, ("patient_details", "patient_lifestyle"))
+        if hit:
+            return cached
+        try:
+            async with get_pool().connection() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute("SELECT * FROM patient_details WHERE patient_id = %s", (patient_id,))
+                    patient = await cursor.fetchone()
+                    await cursor.execute("SELECT * FROM patient_lifestyle WHERE patient_id = %s", (patient_id,))
+                    lifestyle = await cursor.fetchone()
+            result = {"patient": patient, "lifestyle": lifestyle}
+            response_cache.store(key, result, token)
+            return result
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get("/appointments/{patient_id}")
+    async def get_appointments(patient_id: int, request: Request, format: str = None):
+        try:
+            return await fetch_list(request, format, "SELECT * FROM appointments WHERE patient_id = %s", (patient_id,))
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get("/records/{appointment_id}")
+    async def get_records(appointment_id: int):
+        try:
+            async with get_pool().connection() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(TEST_SELECT + " WHERE appointment_id = %s", (appointment_id,))
+                    test = await cursor.fetchone()
+                    await cursor.execute("SELECT * FROM prescriptions WHERE appointment_id = %s", (appointment_id,))
+                    presc = await cursor.fetchone()
+            return {"test_details": test, "prescription": presc}
+        except Error as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get("/get_analysis")
+    async def get_analysis(request: Request, format: str = None, since: int = Query(None, ge=0)):
+        key = ("analysis", negotiate_format(request, format), since)
+        hit, cached, token = response_cache.lookup(key, ("patient_details", "appointments", "test_details"))
+        if hit:
+            return cached
+        try:
+            async with get_pool().connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(analysis_sync.CURRENT_SQL, (analysis_sync.SEQUENCE,))
+                    row = await cursor.fetchone()
+            query, params, headers = analysis_sync.analysis_query(row[0] if row else 0, since)
+            result = await fetch_list(request, format, query, params, headers=headers)
+            response_cache.store(key, result, token)
+            return result
+        except Error as e:
+            print("Error occurred:", e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return router
@@ -0,0 +1,103 @@
+import os
+from pydantic import BaseModel
+
+
+# ---------- SETTINGS ----------
+# Every value can be overridden through an environment variable of the same
+# name in upper case, prefixed with HEALTHCARE_ (e.g. HEALTHCARE_DB_PASSWORD).
+ENV_PREFIX = "HEALTHCARE_"
+
+
+class Settings(BaseModel):
+    # "mysql", or "sqlite" for the embedded single-node mode backed by the file at db_path
+    db_backend: str = "mysql"
+    db_path: str = "healthcare.db"
+    # "duckdb" runs /get_analysis through DuckDB's columnar engine on the embedded database
+    db_analytics_engine: str = "sqlite"
+    # Apply pending schema migrations (schema.py) when the API starts
+    db_migrate_on_startup: bool = True
+
+    db_host: str = "127.0.0.1"
+    db_port: int = 3306
+    db_user: str = "root"
+    db_password: str = ""
+    db_name: str = "healthcare_db"
+
+    # Read replica for the GET endpoints (host for mysql, file for sqlite); empty disables it.
+    # Reads fall back to the primary when it is down, lags more than max_lag seconds, or has
+    # not yet replayed the caller's last write.
+    db_replica_host: str = ""
+    db_replica_port: int = 3306
+    db_replica_path: str = ""
+    db_replica_pool_size: int = 10
+    db_replica_max_lag: float = 5.0
+    db_replica_check_interval: float = 1.0
+    # Seconds a read waits for a free replica connection before it goes to the primary instead
+    db_replica_checkout_timeout: float = 0.05
+
+    # Connection pool
+    db_pool_size: int = 10
+    db_max_overflow: int = 5
+    db_pool_timeout: float = 10.0
+    db_pool_pre_ping: bool = True
+    db_pool_drain_timeout: float = 30.0
+
+    # Serve the core endpoints from async handlers on an aiomysql pool
+    db_async: bool = False
+    db_async_pool_size: int = 50
+    db_async_pool_recycle: int = 3600
+
+    # ID allocation: IDs reserved from the database per refill
+    id_block_size: int = 1000
+
+    # Response cache
+    cache_enabled: bool = True
+    cache_max_entries: int = 1024
+    cache_ttl: float = 30.0
+    # File (e.g. /dev/shm/healthcare_cache) holding table versions shared by all workers on the host
+    cache_shared_path: str = ""
+
+    # Doctor scheduling: bookings per doctor per day (0 = unlimited) and roster refresh period
+    doctor_daily_capacity: int = 0
+    scheduler_refresh_interval: float = 300.0
+
+    # Instrumentation: /metrics endpoint and slow-query log threshold in milliseconds
+    metrics_enabled: bool = True
+    slow_query_ms: float = 200.0
+
+    # Risk rule for prescriptions and cohort scoring as JSON (see risk_scoring.RiskRule);
+    # empty keeps the default ap_hi > 140 or cholesterol > 2
+    risk_rule: str = ""
+
+    # Group commit: coalesce single-row POST writes into shared transactions; each request is
+    # acknowledged once its batch has committed. A window of 0 batches what arrived while the
+    # previous batch committed; a longer one waits for more writes per commit.
+    write_queue_enabled: bool = False
+    write_queue_window_ms: float = 0.0
+    write_queue_max_batch: int = 100
+    write_queue_workers: int = 1
+
+    # Bulk ingestion
+    bulk_chunk_size: int = 500
+    bulk_max_items: int = 50000
+
+    # Production launcher (python -m serve): worker processes (0 = one per CPU core), the
+    # directory where workers report their health, how often they report, and how long a
+    # worker may go without reporting (or take to start) before it is replaced
+    server_workers: int = 0
+    server_status_dir: str = ""
+    server_heartbeat_interval: float = 2.0
+    server_worker_timeout: float = 30.0
+
+
+def load_settings(environ=None):
+    environ = os.environ if environ is None else environ
+    values = {}
+    for name in Settings.model_fields:
+        key = ENV_PREFIX + name.upper()
+        if key in environ:
+            values[name] = environ[key]
+    return Settings(**values)
+
+
+settings = load_settings()
@@ -1,80 +1,259 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
 from typing import List
-import mysql.connector
-from mysql.connector import Error
-import random
+from contextlib import asynccontextmanager
+from storage import Error, is_embedded, create_columnar_reader
 import datetime
-from input_basemodels import PatientBase, Lifestyle, AppointmentCreate, TestDetails, Prescription
+from input_basemodels import PatientBase, Lifestyle, AppointmentCreate, TestDetails, Prescription, RiskEvaluation
+from app_config import settings
+from db_pool import create_pool, create_replica_pool
+from async_db import create_async_pool
+from app_async import create_router as create_async_router
+from id_allocator import IdAllocator, MySQLBlockReserver
+from bulk_ingest import read_bulk_items, validate_items, insert_chunked, bulk_response
+from table_access import TABLES, RESERVED_PARAMS, build_fetch_query, encode_cursor, decode_cursor, stream_ndjson
+from columnar import negotiate_format, cursor_to_table, table_response
+from queries import PATIENT_INSERT, LIFESTYLE_INSERT, APPOINTMENT_INSERT, TEST_INSERT, PRESCRIPTION_INSERT, RISK_QUERY, TEST_SELECT
+import analysis_sync
+import appointment_calendar
+import cohort_stats
+import patient_search
+import risk_scoring
+import schema
+import serve
+from response_cache import create_cache
+from doctor_scheduler import DoctorScheduler, BOOKING_ATTEMPTS, has_room
+from metrics import MetricsRegistry, MetricsMiddleware
+from group_commit import create_write_queue
+from read_routing import ReadYourWritesMiddleware, create_read_router
+
+
+
+db_pool = None
+replica_pool = None
+read_router = None
+async_pool = None
+write_queue = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global db_pool, replica_pool, read_router, async_pool, write_queue
+    observe_query = metrics.observe_query if settings.metrics_enabled else None
+    db_pool = create_pool(settings, observe_query)
+    write_queue = create_write_queue(settings, get_connection, metrics.observe_write_batch)
+    if settings.db_migrate_on_startup:
+        ensure_schema()
+    replica_pool = create_replica_pool(settings, observe_query)
+    read_router = create_read_router(settings, db_pool, replica_pool)
+    warm_scheduler()
+    scheduler.start()
+    if async_enabled:
+        async_pool = await create_async_pool(settings)
+    try:
+        yield
+    finally:
+        scheduler.close()
+        if async_pool is not None:
+            await async_pool.close()
+        if write_queue is not None:
+            write_queue.close()
+        if read_router is not None:
+            read_router.monitor.close()
+            replica_pool.close(drain_timeout=settings.db_pool_drain_timeout)
+        db_pool.close(drain_timeout=settings.db_pool_drain_timeout)
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Per-route latency/status histograms and per-statement SQL timings, exported at /metrics
+metrics = MetricsRegistry(slow_query_seconds=settings.slow_query_ms / 1000)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware, registry=metrics)
+# X-Last-Write on write responses, honoured by reads routed through read_router
+app.add_middleware(ReadYourWritesMiddleware)
+
+# ---------- DB CONNECTION ----------
+def get_connection():
+    if db_pool is None:
+        raise HTTPException(status_code=503, detail="Database pool is not initialised")
+    return db_pool.get_connection()
+
+
+def get_read_connection():
+    """Connection for a read-only endpoint: the replica when one is configured and fresh enough
+    for the caller (see read_routing), otherwise the primary."""
+    if read_router is None:
+        return get_connection()
+    if db_pool is None:
+        raise HTTPException(status_code=503, detail="Database pool is not initialised")
+    return read_router.get_connection()
+
+
+def cache_read(conn, key, result, token):
+    # A replica result can predate writes whose invalidations the cache has already seen, so
+    # only results read from the primary are cached.
+    if conn.role == "primary":
+        response_cache.store(key, result, token)
+
+
+def run_write(apply, stamp=()):
+    """Runs ``apply(cursor)`` and commits, returning its result. With the write queue enabled
+    the write shares a transaction with concurrent ones (see group_commit); otherwise it gets
+    its own. ``stamp`` lists the test IDs it inserts (see analysis_sync)."""
+    if write_queue is not None:
+        return write_queue.submit(apply, stamp)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        result = apply(cursor)
+        analysis_sync.stamp_tests(cursor, list(stamp))
+        conn.commit()
+        return result
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def ensure_schema():
+    try:
+        conn = get_connection()
+        try:
+            schema.migrate(conn)
+        finally:
+            conn.close()
+    except Error as e:
+        print("Error occurred:", e)
 
 
+def warm_scheduler():
+    try:
+        scheduler.warm(since=datetime.date.today())
+    except Error as e:
+        print("Error occurred:", e)
 
-app = FastAPI()
 
-# ---------- DB CONNECTION ----------
-def get_connection():
-    return mysql.connector.connect(
-        host='127.0.0.1',
-        port=3306,
-        user='root',
-        password='1234',
-        database='healthcare_db'
-    )
+# IDs are allocated before a request borrows its own connection, so a block
+# refill never waits on the pool while holding a connection.
+id_allocator = IdAllocator(MySQLBlockReserver(get_connection), block_size=settings.id_block_size)
+
+# Read endpoints cache their results per parameters; every write endpoint invalidates the
+# tables it touched once its transaction has committed.
+response_cache = create_cache(settings)
+ANALYSIS_TAGS = ("patient_details", "appointments", "test_details")
+PATIENT_TAGS = ("patient_details", "patient_lifestyle")
+DOSSIER_TAGS = ("patient_details", "patient_lifestyle", "appointments", "test_details", "prescriptions")
+
+# Doctor roster and per-day booking counts live in memory; bookings go to the least-loaded doctor.
+scheduler = DoctorScheduler(get_connection, settings.doctor_daily_capacity, settings.scheduler_refresh_interval)
+
+# Optional DuckDB engine for the analysis join on the embedded database
+columnar_reader = create_columnar_reader(settings)
+
+
+# ---------- BUSINESS RULES ----------
+# Business logic: patients matching the risk rule get the requested medicine, everyone else
+# multivitamins. The default rule is ap_hi > 140 or cholesterol > 2; HEALTHCARE_RISK_RULE
+# replaces it for prescriptions and cohort scoring alike.
+risk_rule = risk_scoring.load_rule(settings.risk_rule)
 
 
+def select_medicine(at_risk, requested_medicine):
+    return requested_medicine if at_risk else "Multivitamins"
+
+
+def medicine_for(test, requested_medicine):
+    return select_medicine(risk_scoring.is_at_risk(risk_rule, test), requested_medicine)
+
+
+
+@app.get("/patients/search")
+def search_patients(
+    q: str = Query(..., min_length=1, max_length=100),
+    age_min: int = Query(None, ge=0),
+    age_max: int = Query(None, ge=0),
+    gender: int = None,
+    limit: int = Query(20, ge=1, le=100),
+    fuzzy: bool = True,
+):
+    # Name prefix search for typeahead (see patient_search); a numeric q also matches the ID.
+    # Registered ahead of the async router, whose /patients/{patient_id} would capture it.
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=True)
+        return patient_search.search(cursor, q, age_min, age_max, gender, limit, fuzzy)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+
+def get_async_pool():
+    if async_pool is None:
+        raise HTTPException(status_code=503, detail="Async database pool is not initialised")
+    return async_pool
+
+
+# Registered ahead of the sync handlers below so the async versions take precedence.
+# The async path talks to MySQL through aiomysql, so the embedded backend always runs sync.
+async_enabled = settings.db_async and not is_embedded(settings)
+if async_enabled:
+    app.include_router(create_async_router(get_async_pool, id_allocator, medicine_for, response_cache, scheduler))
+
 
 # ---------- ENDPOINTS ----------
 @app.post("/patients/new")
 def create_patient(patient: PatientBase):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
+        patient_id = id_allocator.next_id("patient_details")
+        params = (patient_id, patient.name, patient.age, patient.gender, patient.height, patient.weight)
 
-        while True:
-            patient_id = random.randint(10000000, 99999999)
-            cursor.execute("SELECT COUNT(*) FROM patient_details WHERE patient_id = %s", (patient_id,))
-            if cursor.fetchone()[0] == 0:
-                break
+        def insert(cursor):
+            cursor.execute(PATIENT_INSERT, params)
+            patient_search.index_patients(cursor, [(patient_id, patient.name)])
 
-        query = ("INSERT INTO patient_details (patient_id, name, age, gender, height, weight) "
-                 "VALUES (%s, %s, %s, %s, %s, %s)")
-        cursor.execute(query, (patient_id, patient.name, patient.age, patient.gender, patient.height, patient.weight))
-        conn.commit()
+        run_write(insert)
+        response_cache.invalidate("patient_details")
         return {"patient_id": patient_id}
 
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
 
 
 @app.post("/patients/lifestyle")
 def create_lifestyle(lifestyle: Lifestyle):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        query = ("INSERT INTO patient_lifestyle (patient_id, smoke, alco, active) "
-                 "VALUES (%s, %s, %s, %s)")
-        cursor.execute(query, (lifestyle.patient_id, lifestyle.smoke, lifestyle.alco, lifestyle.active))
-        conn.commit()
+        params = (lifestyle.patient_id, lifestyle.smoke, lifestyle.alco, lifestyle.active)
+        run_write(lambda cursor: cursor.execute(LIFESTYLE_INSERT, params))
+        response_cache.invalidate("patient_lifestyle")
         return {"message": "Lifestyle data added successfully"}
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
 
 
 @app.get("/doctors")
-def get_doctors():
+def get_doctors(request: Request, format: str = None):
+    fmt = negotiate_format(request, format)
+    key = ("doctors", fmt)
+    hit, cached, token = response_cache.lookup(key, ("doctors",))
+    if hit:
+        return cached
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=(fmt == "json"))
         cursor.execute("SELECT * FROM doctors")
-        return cursor.fetchall()
+        if fmt != "json":
+            result = table_response(cursor_to_table(cursor), fmt)
+        else:
+            result = cursor.fetchall()
+        cache_read(conn, key, result, token)
+        return result
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -82,103 +261,199 @@ def get_doctors():
         conn.close()
 
 
-
 @app.post("/appointments")
 def create_appointment(appt: AppointmentCreate):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT doctor_id FROM doctors")
-        doctor_ids = [row[0] for row in cursor.fetchall()]
-
-        while True:
-            appointment_id = random.randint(10000000, 99999999)
-            cursor.execute("SELECT COUNT(*) FROM appointments WHERE appointment_id = %s", (appointment_id,))
-            if cursor.fetchone()[0] == 0:
-                break
-
-        assigned_doctor = random.choice(doctor_ids)
-        query = ("INSERT INTO appointments (appointment_id, patient_id, doctor_id, appointment_date, appointment_type) "
-         "VALUES (%s, %s, %s, %s, %s)")
-        cursor.execute(query, (appointment_id, appt.patient_id, assigned_doctor, appt.appointment_date, appt.appointment_type))
-        conn.commit()
-        return {"appointment_id": appointment_id, "assigned_doctor_id": assigned_doctor}
+        appointment_id = id_allocator.next_id("appointments")
+        for _ in range(BOOKING_ATTEMPTS):
+            assigned_doctor = scheduler.assign(appt.appointment_date)
+            capacity = scheduler.capacity(assigned_doctor)
+            params = (appointment_id, appt.patient_id, assigned_doctor, appt.appointment_date, appt.appointment_type)
+
+            def book(cursor):
+                if not has_room(cursor, assigned_doctor, appt.appointment_date, capacity):
+                    return False
+                cursor.execute(APPOINTMENT_INSERT, params)
+                return True
+
+            try:
+                booked = run_write(book)
+            except BaseException:
+                # Any failure (driver error, full write queue, cancellation) frees the reservation
+                scheduler.release(appt.appointment_date, assigned_doctor)
+                raise
+            if booked:
+                scheduler.confirm(appt.appointment_date, assigned_doctor)
+                response_cache.invalidate("appointments")
+                return {"appointment_id": appointment_id, "assigned_doctor_id": assigned_doctor}
+            # Another worker process filled this doctor's day first
+            scheduler.mark_full(appt.appointment_date, assigned_doctor)
+        raise HTTPException(status_code=409, detail=f"All doctors are fully booked on {appt.appointment_date}")
     except Error as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
 
 
 @app.post("/tests")
 def add_test_details(test: TestDetails):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
+        test_id = id_allocator.next_id("test_details")
+        sample = (test.appointment_id, test.ap_hi, test.ap_lo, test.cholesterol, test.gluc)
 
-        while True:
-            test_id = random.randint(10000000, 99999999)
-            cursor.execute("SELECT COUNT(*) FROM test_details WHERE test_id = %s", (test_id,))
-            if cursor.fetchone()[0] == 0:
-                break
+        def insert(cursor):
+            cursor.execute(TEST_INSERT, (test_id, *sample))
+            cohort_stats.record_tests(cursor, [sample])
 
-        query = ("INSERT INTO test_details (test_id, appointment_id, ap_hi, ap_lo, cholesterol, gluc) "
-                 "VALUES (%s, %s, %s, %s, %s, %s)")
-        cursor.execute(query, (test_id, test.appointment_id, test.ap_hi, test.ap_lo, test.cholesterol, test.gluc))
-        conn.commit()
+        run_write(insert, stamp=[test_id])
+        response_cache.invalidate("test_details", "cohort_histogram")
         return {"test_id": test_id}
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
 
 
 @app.post("/prescriptions")
 def prescribe_medicine(presc: Prescription):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
+        prescription_id = id_allocator.next_id("prescriptions")
 
-        while True:
-            prescription_id = random.randint(10000000, 99999999)
-            cursor.execute("SELECT COUNT(*) FROM prescriptions WHERE prescription_id = %s", (prescription_id,))
-            if cursor.fetchone()[0] == 0:
-                break
+        def insert(cursor):
+            cursor.execute(RISK_QUERY + " WHERE td.appointment_id = %s", (presc.appointment_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="Test data not found")
 
-        # Business logic: assume patient with ap_hi > 140 or cholesterol > 2 is at risk
-        cursor.execute("SELECT ap_hi, cholesterol FROM test_details WHERE appointment_id = %s", (presc.appointment_id,))
-        test = cursor.fetchone()
-        if not test:
-            raise HTTPException(status_code=404, detail="Test data not found")
-
-        ap_hi, chol = test
-        if ap_hi > 140 or chol > 2:
-            medicine_name = presc.medicine_name
-        else:
-            medicine_name = "Multivitamins"
+            medicine_name = medicine_for(dict(zip(cursor.column_names, row)), presc.medicine_name)
+            cursor.execute(PRESCRIPTION_INSERT, (prescription_id, presc.appointment_id, presc.prescribed_date,
+                                                 medicine_name, presc.dosage, presc.duration_days))
 
-        query = ("INSERT INTO prescriptions (prescription_id, appointment_id, prescribed_date, medicine_name, dosage, duration_days) "
-                 "VALUES (%s, %s, %s, %s, %s, %s)")
-        cursor.execute(query, (prescription_id, presc.appointment_id, presc.prescribed_date, medicine_name, presc.dosage, presc.duration_days))
-        conn.commit()
+        run_write(insert)
+        response_cache.invalidate("prescriptions")
         return {"prescription_id": prescription_id}
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+
+# ---------- BULK ENDPOINTS ----------
+# Accept a JSON array or an NDJSON body (Content-Type: application/x-ndjson) of the
+# same payloads as the single-record endpoints and report an ID or error per item.
+# Chunks commit independently, so the cache is invalidated even if a later chunk fails.
+def index_inserted_patients(cursor, inserted):
+    patient_search.index_patients(cursor, [row[:2] for row in inserted])
+
+
+@app.post("/patients/bulk")
+def create_patients_bulk(items: list = Depends(read_bulk_items)):
+    valid, errors = validate_items(PatientBase, items, settings.bulk_max_items)
+    patient_ids = id_allocator.next_ids("patient_details", len(valid))
+    conn = get_connection()
+    try:
+        rows = [(index, (patient_id, p.name, p.age, p.gender, p.height, p.weight))
+                for (index, p), patient_id in zip(valid, patient_ids)]
+        errors.update(insert_chunked(conn, PATIENT_INSERT, rows, settings.bulk_chunk_size, before_commit=index_inserted_patients))
+        results = {index: {"patient_id": patient_id} for (index, _), patient_id in zip(valid, patient_ids)}
+        return bulk_response(len(items), results, errors)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
     finally:
+        conn.close()
+        response_cache.invalidate("patient_details")
+
+
+
+@app.post("/patients/lifestyle/bulk")
+def create_lifestyles_bulk(items: list = Depends(read_bulk_items)):
+    valid, errors = validate_items(Lifestyle, items, settings.bulk_max_items)
+    conn = get_connection()
+    try:
+        rows = [(index, (l.patient_id, l.smoke, l.alco, l.active)) for index, l in valid]
+        errors.update(insert_chunked(conn, LIFESTYLE_INSERT, rows, settings.bulk_chunk_size))
+        results = {index: {"patient_id": l.patient_id} for index, l in valid}
+        return bulk_response(len(items), results, errors)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+        response_cache.invalidate("patient_lifestyle")
+
+
+
+def record_inserted_tests(cursor, inserted):
+    cohort_stats.record_tests(cursor, [row[1:] for row in inserted])
+    analysis_sync.stamp_tests(cursor, [row[0] for row in inserted])
+
+
+@app.post("/tests/bulk")
+def add_test_details_bulk(items: list = Depends(read_bulk_items)):
+    valid, errors = validate_items(TestDetails, items, settings.bulk_max_items)
+    test_ids = id_allocator.next_ids("test_details", len(valid))
+    conn = get_connection()
+    try:
+        rows = [(index, (test_id, t.appointment_id, t.ap_hi, t.ap_lo, t.cholesterol, t.gluc))
+                for (index, t), test_id in zip(valid, test_ids)]
+        errors.update(insert_chunked(conn, TEST_INSERT, rows, settings.bulk_chunk_size, before_commit=record_inserted_tests))
+        results = {index: {"test_id": test_id} for (index, _), test_id in zip(valid, test_ids)}
+        return bulk_response(len(items), results, errors)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+        response_cache.invalidate("test_details", "cohort_histogram")
+
+
+
+@app.post("/prescriptions/bulk")
+def prescribe_medicine_bulk(items: list = Depends(read_bulk_items)):
+    valid, errors = validate_items(Prescription, items, settings.bulk_max_items)
+    prescription_ids = dict(zip((index for index, _ in valid), id_allocator.next_ids("prescriptions", len(valid))))
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        appointment_ids = sorted({p.appointment_id for _, p in valid})
+        at_risk = {}
+        for start in range(0, len(appointment_ids), settings.bulk_chunk_size):
+            chunk = appointment_ids[start:start + settings.bulk_chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(RISK_QUERY + f" WHERE td.appointment_id IN ({placeholders})", chunk)
+            # The whole chunk is scored in one vectorized pass with the same rule as /prescriptions
+            for frame in risk_scoring.iter_frames(cursor):
+                _, flags = risk_scoring.score(risk_rule, frame)
+                for appointment_id, flag in zip(frame["appointment_id"].tolist(), flags.tolist()):
+                    at_risk.setdefault(appointment_id, flag)
         cursor.close()
+
+        found = []
+        for index, p in valid:
+            if p.appointment_id in at_risk:
+                found.append((index, p))
+            else:
+                errors[index] = "Test data not found"
+
+        rows = []
+        for index, p in found:
+            medicine_name = select_medicine(at_risk[p.appointment_id], p.medicine_name)
+            rows.append((index, (prescription_ids[index], p.appointment_id, p.prescribed_date, medicine_name, p.dosage, p.duration_days)))
+        errors.update(insert_chunked(conn, PRESCRIPTION_INSERT, rows, settings.bulk_chunk_size))
+        results = {index: {"prescription_id": prescription_ids[index]} for index, _ in found}
+        return bulk_response(len(items), results, errors)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
         conn.close()
+        response_cache.invalidate("prescriptions")
 
 
 
 @app.get("/patients/{patient_id}")
 def get_patient_info(patient_id: int):
+    key = ("patient", patient_id)
+    hit, cached, token = response_cache.lookup(key, PATIENT_TAGS)
+    if hit:
+        return cached
     try:
-        conn = get_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("SELECT * FROM patient_details WHERE patient_id = %s", (patient_id,))
@@ -186,7 +461,9 @@ def get_patient_info(patient_id: int):
         cursor.execute("SELECT * FROM patient_lifestyle WHERE patient_id = %s", (patient_id,))
         lifestyle = cursor.fetchone()
 
-        return {"patient": patient, "lifestyle": lifestyle}
+        result = {"patient": patient, "lifestyle": lifestyle}
+        cache_read(conn, key, result, token)
+        return result
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -195,12 +472,132 @@ def get_patient_info(patient_id: int):
 
 
 
-@app.get("/appointments/{patient_id}")
-def get_appointments(patient_id: int):
+@app.get("/patients/{patient_id}/dossier")
+def get_patient_dossier(
+    patient_id: int,
+    limit: int = Query(None, ge=1, le=1000),
+    date_from: datetime.date = None,
+    date_to: datetime.date = None,
+):
+    # Patient, lifestyle and every appointment with its tests and prescriptions in a fixed
+    # number of set-based queries, independent of how many visits the patient has.
+    key = ("dossier", patient_id, limit, date_from, date_to)
+    hit, cached, token = response_cache.lookup(key, DOSSIER_TAGS)
+    if hit:
+        return cached
     try:
-        conn = get_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
+
+        cursor.execute("SELECT * FROM patient_details WHERE patient_id = %s", (patient_id,))
+        patient = cursor.fetchone()
+        if not patient:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        cursor.execute("SELECT * FROM patient_lifestyle WHERE patient_id = %s", (patient_id,))
+        lifestyle = cursor.fetchone()
+
+        query = "SELECT * FROM appointments WHERE patient_id = %s"
+        params = [patient_id]
+        if date_from:
+            query += " AND appointment_date >= %s"
+            params.append(date_from)
+        if date_to:
+            query += " AND appointment_date <= %s"
+            params.append(date_to)
+        query += " ORDER BY appointment_date DESC, appointment_id DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        cursor.execute(query, params)
+        appointments = cursor.fetchall()
+
+        by_id = {}
+        for appt in appointments:
+            appt["tests"] = []
+            appt["prescriptions"] = []
+            by_id[appt["appointment_id"]] = appt
+
+        if by_id:
+            placeholders = ", ".join(["%s"] * len(by_id))
+            ids = list(by_id)
+            cursor.execute(f"{TEST_SELECT} WHERE appointment_id IN ({placeholders})", ids)
+            for test in cursor.fetchall():
+                by_id[test["appointment_id"]]["tests"].append(test)
+            cursor.execute(f"SELECT * FROM prescriptions WHERE appointment_id IN ({placeholders})", ids)
+            for presc in cursor.fetchall():
+                by_id[presc["appointment_id"]]["prescriptions"].append(presc)
+
+        result = {"patient": patient, "lifestyle": lifestyle, "appointments": appointments}
+        cache_read(conn, key, result, token)
+        return result
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+
+@app.get("/appointments")
+def get_appointment_calendar(
+    doctor_id: List[int] = Query(None),
+    date_from: datetime.date = Query(None, alias="from"),
+    date_to: datetime.date = Query(None, alias="to"),
+    type: str = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: str = None,
+    rollup: bool = True,
+):
+    # Schedules for dashboards, e.g. /appointments?doctor_id=1&doctor_id=2&from=2024-01-01&to=2024-01-07.
+    # Rows come in (doctor_id, date, id) order, paged through X-Next-Cursor; the first page also
+    # carries per-doctor, per-day counts over the whole range unless rollup=false.
+    if doctor_id and len(doctor_id) > appointment_calendar.MAX_DOCTORS:
+        raise HTTPException(status_code=400, detail=f"At most {appointment_calendar.MAX_DOCTORS} doctor_id values")
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    try:
+        after = appointment_calendar.parse_cursor_key(decode_cursor(cursor)) if cursor else None
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    doctor_ids = sorted(set(doctor_id or ()))
+    filters = (doctor_ids, date_from, date_to, type)
+
+    key = ("calendar", tuple(doctor_ids), date_from, date_to, type, limit, cursor, rollup)
+    hit, cached, token = response_cache.lookup(key, ("appointments",))
+    if hit:
+        return cached
+    try:
+        conn = get_read_connection()
+        db_cursor = conn.cursor(dictionary=True)
+        db_cursor.execute(*appointment_calendar.page_query(*filters, after=after, limit=limit))
+        rows = db_cursor.fetchall()
+        body = {"appointments": rows}
+        if rollup and after is None:
+            db_cursor.execute(*appointment_calendar.rollup_query(*filters))
+            body["days"] = db_cursor.fetchall()
+        headers = {}
+        if len(rows) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(appointment_calendar.cursor_key(rows[-1]))
+        result = JSONResponse(jsonable_encoder(body), headers=headers)
+        cache_read(conn, key, result, token)
+        return result
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        db_cursor.close()
+        conn.close()
+
+
+
+@app.get("/appointments/{patient_id}")
+def get_appointments(patient_id: int, request: Request, format: str = None):
+    fmt = negotiate_format(request, format)
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor(dictionary=(fmt == "json"))
         cursor.execute("SELECT * FROM appointments WHERE patient_id = %s", (patient_id,))
+        if fmt != "json":
+            return table_response(cursor_to_table(cursor), fmt)
         return cursor.fetchall()
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -213,10 +610,10 @@ def get_appointments(patient_id: int):
 @app.get("/records/{appointment_id}")
 def get_records(appointment_id: int):
     try:
-        conn = get_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
-        cursor.execute("SELECT * FROM test_details WHERE appointment_id = %s", (appointment_id,))
+        cursor.execute(TEST_SELECT + " WHERE appointment_id = %s", (appointment_id,))
         test = cursor.fetchone()
         cursor.execute("SELECT * FROM prescriptions WHERE appointment_id = %s", (appointment_id,))
         presc = cursor.fetchone()
@@ -231,44 +628,107 @@ def get_records(appointment_id: int):
 
 
 @app.get("/fetch/{table}")
-def fetch_table(table: str):
+def fetch_table(
+    table: str,
+    request: Request,
+    columns: str = None,
+    limit: int = Query(None, ge=1, le=10000),
+    cursor: str = None,
+    format: str = Query(None, pattern="^(json|ndjson|arrow|parquet)$"),
+):
+    # Equality filters are passed as extra query parameters, e.g. /fetch/appointments?doctor_id=3
+    if table not in TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table '{table}'")
+    filters = {k: v for k, v in request.query_params.items() if k not in RESERVED_PARAMS}
+    after = decode_cursor(cursor) if cursor else None
+    stream = format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", ""))
+    fmt = "ndjson" if stream else negotiate_format(request, format)
+
+    key = ("fetch", table, fmt, tuple(sorted(request.query_params.items())))
+    if not stream:
+        hit, cached, token = response_cache.lookup(key, (table,))
+        if hit:
+            return cached
+
+    conn = get_read_connection()
+    handed_off = False
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(f"SELECT * FROM {table}")
-        return cursor.fetchall()
+        if stream:
+            query, params = build_fetch_query(conn, table, columns, filters, after, limit)
+            # The streaming generator takes ownership of the connection and releases it when done.
+            handed_off = True
+            return StreamingResponse(stream_ndjson(conn, query, params), media_type="application/x-ndjson")
+
+        page_size = limit or 1000
+        query, params = build_fetch_query(conn, table, columns, filters, after, page_size)
+        if fmt != "json":
+            db_cursor = conn.cursor()
+            try:
+                db_cursor.execute(query, params)
+                page = cursor_to_table(db_cursor)
+            finally:
+                db_cursor.close()
+            headers = {}
+            if page.num_rows == page_size:
+                headers["X-Next-Cursor"] = encode_cursor(page[TABLES[table]][-1].as_py())
+            result = table_response(page, fmt, headers)
+        else:
+            db_cursor = conn.cursor(dictionary=True)
+            try:
+                db_cursor.execute(query, params)
+                rows = db_cursor.fetchall()
+            finally:
+                db_cursor.close()
+            headers = {}
+            if len(rows) == page_size:
+                headers["X-Next-Cursor"] = encode_cursor(rows[-1][TABLES[table]])
+            result = JSONResponse(jsonable_encoder(rows), headers=headers)
+        cache_read(conn, key, result, token)
+        return result
     except Error as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        if not handed_off:
+            conn.close()
 
 
 
 @app.get("/get_analysis")
-def get_analysis():
+def get_analysis(request: Request, format: str = None, since: int = Query(None, ge=0)):
+    # Every response carries an X-Watermark header; pass it back as `since` to receive only the
+    # rows committed after it (such responses also carry X-Delta-Since).
+    fmt = negotiate_format(request, format)
+    key = ("analysis", fmt, since)
+    hit, cached, token = response_cache.lookup(key, ANALYSIS_TAGS)
+    if hit:
+        return cached
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        query = """
-            SELECT
-                pd.patient_id,
-                pd.age,
-                td.ap_hi,
-                td.ap_lo,
-                td.cholesterol,
-                td.gluc
-            FROM
-                patient_details pd
-            JOIN
-                appointments a ON pd.patient_id = a.patient_id
-            JOIN
-                test_details td ON a.appointment_id = td.appointment_id
-        """
-
-        cursor.execute(query)
-        results = cursor.fetchall()
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        watermark = analysis_sync.current(cursor)
+        cursor.close()
+        if since is not None and since > watermark and conn.role == "replica":
+            # The caller has seen commits the replica has not replayed yet
+            conn.close()
+            conn = get_connection()
+            cursor = conn.cursor()
+            watermark = analysis_sync.current(cursor)
+            cursor.close()
+        query, params, headers = analysis_sync.analysis_query(watermark, since)
+
+        table = columnar_reader.query_table(query, params) if columnar_reader else None
+        if table is not None:
+            results = table_response(table, fmt, headers) if fmt != "json" else JSONResponse(table.to_pylist(), headers=headers)
+            cache_read(conn, key, results, token)
+            return results
+
+        cursor = conn.cursor(dictionary=(fmt == "json"))
+        cursor.execute(query, params)
+        if fmt != "json":
+            results = table_response(cursor_to_table(cursor), fmt, headers)
+        else:
+            results = JSONResponse(jsonable_encoder(cursor.fetchall()), headers=headers)
+        cache_read(conn, key, results, token)
         return results
 
     except Error as e:
@@ -277,5 +737,161 @@ def get_analysis():
     finally:
         cursor.close()
         conn.close()
-        
-        
\ No newline at end of file
+
+
+
+@app.get("/analysis/aggregate")
+def get_analysis_aggregate(metric: List[str] = Query(None)):
+    # Constant-size age-trend data (per age bucket stats + 2D bins) from the incremental summary.
+    unknown = [m for m in metric or [] if m not in cohort_stats.METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metric(s): {', '.join(unknown)}")
+    key = ("aggregate", tuple(metric or ()))
+    hit, cached, token = response_cache.lookup(key, ("cohort_histogram",))
+    if hit:
+        return cached
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        result = cohort_stats.summarize(cohort_stats.load_rows(cursor), metric)
+        cache_read(conn, key, result, token)
+        return result
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+
+# ---------- RISK SCORING ----------
+@app.post("/risk/evaluate")
+def evaluate_risk(body: RiskEvaluation):
+    # Scores inline records, selected appointments, or (with neither) the whole cohort in
+    # columnar batches. Pass a candidate rule to see how a rule change would move patients.
+    rule = body.rule or risk_rule
+    if body.tests is not None:
+        if len(body.tests) > settings.bulk_max_items:
+            raise HTTPException(status_code=413, detail=f"At most {settings.bulk_max_items} tests per request")
+        frame = risk_scoring.records_frame(body.tests)
+        scores, at_risk = risk_scoring.score(rule, frame)
+        return {
+            "rule": rule,
+            "evaluated": len(frame),
+            "at_risk": int(at_risk.sum()),
+            "results": [{"index": i, "score": int(s), "at_risk": bool(r)} for i, (s, r) in enumerate(zip(scores, at_risk))],
+        }
+
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        if body.appointment_ids is None:
+            cursor.execute(RISK_QUERY)
+            return {"rule": rule, **risk_scoring.evaluate_cohort(cursor, rule, risk_rule)}
+
+        ids = sorted(set(body.appointment_ids))
+        if len(ids) > settings.bulk_max_items:
+            raise HTTPException(status_code=413, detail=f"At most {settings.bulk_max_items} appointments per request")
+        results = []
+        for start in range(0, len(ids), settings.bulk_chunk_size):
+            chunk = ids[start:start + settings.bulk_chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(RISK_QUERY + f" WHERE td.appointment_id IN ({placeholders})", chunk)
+            for frame in risk_scoring.iter_frames(cursor):
+                frame = risk_scoring.score_frame(rule, frame)
+                frame["current_at_risk"] = risk_scoring.score(risk_rule, frame)[1]
+                results.extend(risk_scoring.to_records(
+                    frame[["test_id", "appointment_id", "patient_id", "score", "at_risk", "current_at_risk"]]))
+        return {"rule": rule, "evaluated": len(results), "at_risk": sum(r["at_risk"] for r in results), "results": results}
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+
+@app.get("/risk/cohort")
+def export_risk_cohort(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), at_risk_only: bool = True):
+    # Streams scored tests (patient, test results, lifestyle, score) for outreach lists.
+    conn = get_read_connection()
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    # The streaming generator takes ownership of the connection and releases it when done.
+    return StreamingResponse(risk_scoring.stream_cohort(conn, RISK_QUERY, (), risk_rule, format, at_risk_only),
+                             media_type=media_type)
+
+
+
+@app.get("/scheduler/stats")
+def get_scheduler_stats(date: datetime.date = None):
+    stats = scheduler.stats()
+    if date:
+        stats["loads"] = scheduler.day_loads(date)
+    return stats
+
+
+
+@app.post("/scheduler/refresh")
+def refresh_scheduler():
+    # Call after changing the doctors table so new doctors start receiving bookings.
+    try:
+        scheduler.refresh()
+        response_cache.invalidate("doctors")
+        return scheduler.stats()
+    except Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return response_cache.stats()
+
+
+
+@app.get("/pool/stats")
+def get_pool_stats():
+    if db_pool is None:
+        raise HTTPException(status_code=503, detail="Database pool is not initialised")
+    stats = db_pool.stats()
+    if read_router is not None:
+        stats["replica"] = read_router.stats()
+    if async_pool is not None:
+        stats["async"] = async_pool.stats()
+    return stats
+
+
+
+@app.get("/workers")
+def get_workers():
+    """Health of every worker when the API runs under ``python -m serve``."""
+    if not settings.server_status_dir:
+        return {"supervised": False, "workers": []}
+    return {"supervised": True, "workers": serve.worker_statuses(settings.server_status_dir)}
+
+
+
+@app.get("/write_queue/stats")
+def get_write_queue_stats():
+    if write_queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **write_queue.stats()}
+
+
+
+@app.get("/metrics")
+def get_metrics():
+    gauges = {"healthcare_cache": response_cache.stats()}
+    if db_pool is not None:
+        gauges["healthcare_db_pool"] = db_pool.stats()
+    if read_router is not None:
+        replica = read_router.stats()
+        gauges["healthcare_replica_pool"] = replica.pop("pool")
+        gauges["healthcare_replica"] = {"up": replica["up"], "lag_seconds": replica["lag_seconds"] or 0.0,
+                                        "failed_checks": replica["failed_checks"]}
+        gauges["healthcare_replica_reads"] = replica["routed"]
+    if async_pool is not None:
+        gauges["healthcare_async_pool"] = async_pool.stats()
+    if write_queue is not None:
+        gauges["healthcare_write_queue"] = write_queue.stats()
+    return Response(metrics.render(gauges), media_type="text/plain; version=0.0.4")
@@ -1,14 +1,67 @@
 import streamlit as st
-import requests
 import datetime
-import pandas as pd
 import json
-import matplotlib.pyplot as plt
+import requests
+from columnar import ARROW_STREAM, decode_response
+from charts import render_trends
+from api_client import ApiClient, DeltaFrame, ReadCache, unwrap
 
 BASE_URL = "http://localhost:8000"
 
+# Per-session read cache: entries older than this are fetched again
+READ_CACHE_TTL = 60.0
+READ_CACHE_ENTRIES = 128
+# Rows per page of each table on the admin overview (the /fetch default)
+TABLE_PAGE_ROWS = 1000
+
 st.set_page_config(page_title="Healthcare App", layout="centered")
 
+# One pooled keep-alive client per Streamlit server process, shared by all sessions
+@st.cache_resource
+def get_api_client():
+    return ApiClient(BASE_URL)
+
+api = get_api_client()
+
+# Analysis rows are append-only: one local copy per Streamlit server process is extended
+# with the rows committed since its watermark instead of re-downloading the whole join
+@st.cache_resource
+def get_analysis_frame():
+    return DeltaFrame(api, "/get_analysis", decode_response, ARROW_STREAM)
+
+analysis_frame = get_analysis_frame()
+
+# Rendered trend charts are memoized by watermark, so reruns with unchanged data skip plotting
+@st.cache_data(max_entries=8, show_spinner=False)
+def trend_chart(watermark, rows, _df):
+    return render_trends(_df)
+
+# Reads of this session, reused by widget reruns until a write of the same session
+# invalidates their tags, their TTL runs out, or the sidebar's refresh button is pressed
+if "read_cache" not in st.session_state:
+    st.session_state.read_cache = ReadCache(max_entries=READ_CACHE_ENTRIES, ttl=READ_CACHE_TTL)
+read_cache = st.session_state.read_cache
+
+# Reads may be served by a replica; echoing the X-Last-Write of this session's latest write
+# makes the API answer from the primary until the replica has caught up with it
+def post(path, invalidates=(), **kwargs):
+    res = api.post(path, **kwargs)
+    if "X-Last-Write" in res.headers:
+        st.session_state.last_write = res.headers["X-Last-Write"]
+    if res.ok:
+        read_cache.invalidate(invalidates)
+    return res
+
+def read_headers(**headers):
+    last_write = st.session_state.get("last_write")
+    return {**headers, "X-Last-Write": last_write} if last_write else headers
+
+# Headers are read from the session up front, so the returned call can run in api.gather
+def cached_get(path, tags, params=None):
+    headers = read_headers()
+    key = (path, tuple(sorted((params or {}).items())))
+    return lambda: read_cache.get(key, tags, lambda: api.get(path, params=params, headers=headers))
+
 # Load user config
 @st.cache_data
 def load_users():
@@ -33,6 +86,14 @@ if "role" not in st.session_state:
 
 st.title("🏥 Cardiovascular Healthcare App")
 
+if st.session_state.logged_in_user:
+    with st.sidebar:
+        if st.button("🔄 Refresh data", help="Drop this session's cached reads and load them again"):
+            read_cache.clear()
+        stats = read_cache.stats()
+        st.caption(f"{stats['entries']} cached reads ({stats['hits']} hits, {stats['misses']} misses), "
+                   f"kept up to {READ_CACHE_TTL:.0f} s")
+
 # ------------------ LOGIN PAGE ------------------ #
 if st.session_state.page == "login":
     st.subheader("Login")
@@ -85,7 +146,7 @@ elif st.session_state.page == "new_patient_personal":
 
     if submitted:
         payload = {"name": name, "age": age, "gender": gender, "height": height, "weight": weight}
-        res = requests.post(f"{BASE_URL}/patients/new", json=payload)
+        res = post("/patients/new", json=payload, invalidates=("search",))
         if res.status_code == 200:
             st.session_state.patient_id = res.json()["patient_id"]
             st.success(f"Patient created successfully. ID: {st.session_state.patient_id}")
@@ -108,7 +169,7 @@ elif st.session_state.page == "new_patient_lifestyle":
 
     if submitted2:
         payload = {"patient_id": st.session_state.patient_id, "smoke": smoke, "alco": alco, "active": active}
-        res = requests.post(f"{BASE_URL}/patients/lifestyle", json=payload)
+        res = post("/patients/lifestyle", json=payload, invalidates=(f"patient:{st.session_state.patient_id}",))
         if res.status_code == 200:
             st.success("Lifestyle data submitted.")
             st.session_state.page = "new_patient_appointment"
@@ -125,7 +186,7 @@ elif st.session_state.page == "new_patient_appointment":
 
     if submitted3:
         payload = {"patient_id": st.session_state.patient_id, "appointment_type": appt_type, "appointment_date": str(appt_date)}
-        res = requests.post(f"{BASE_URL}/appointments", json=payload)
+        res = post("/appointments", json=payload, invalidates=(f"patient:{st.session_state.patient_id}", "analysis"))
         if res.status_code == 200:
             result = res.json()
             st.session_state.appointment_id = result['appointment_id']
@@ -155,7 +216,8 @@ elif st.session_state.page == "new_patient_test":
             "cholesterol": chol,
             "gluc": gluc
         }
-        res = requests.post(f"{BASE_URL}/tests", json=payload)
+        res = post("/tests", json=payload, invalidates=(f"patient:{st.session_state.patient_id}",
+                                                        f"appointment:{st.session_state.appointment_id}", "analysis"))
         if res.status_code == 200:
             st.session_state.test_id = res.json()["test_id"]
             st.success(f"Test submitted. Test ID: {st.session_state.test_id}")
@@ -167,6 +229,16 @@ elif st.session_state.page == "new_patient_test":
 elif st.session_state.page == "new_patient_prescription":    
     col1, col2, col3 = st.columns([4, 3.5, 5])
 
+    # The snapshot and chart reads are independent, so fetch them in parallel; reruns from the
+    # prescription form reuse them from the session cache
+    patient_id = st.session_state.patient_id
+    appointment_id = st.session_state.appointment_id
+    responses = api.gather({
+        "patient": cached_get(f"/patients/{patient_id}", (f"patient:{patient_id}",)),
+        "records": cached_get(f"/records/{appointment_id}", (f"appointment:{appointment_id}",)),
+        "analysis": lambda: read_cache.get("analysis", ("analysis",), analysis_frame.refresh),
+    })
+
     # ------------------ Column 1: Prescription Form ------------------ #
     with col1:
         st.markdown("### Generate Prescription")
@@ -185,7 +257,8 @@ elif st.session_state.page == "new_patient_prescription":
                 "dosage": dosage,
                 "duration_days": duration
             }
-            res = requests.post(f"{BASE_URL}/prescriptions", json=payload)
+            res = post("/prescriptions", json=payload, invalidates=(f"patient:{st.session_state.patient_id}",
+                                                                    f"appointment:{st.session_state.appointment_id}"))
             if res.status_code == 200:
                 st.session_state.prescription_id = res.json()["prescription_id"]
                 st.success(f"Prescription generated. ID: {st.session_state.prescription_id}")
@@ -199,7 +272,7 @@ elif st.session_state.page == "new_patient_prescription":
 
         # Fetch patient details
         try:
-            pat_res = requests.get(f"{BASE_URL}/patients/{st.session_state.patient_id}")
+            pat_res = unwrap(responses["patient"])
             if pat_res.status_code == 200:
                 pdata = pat_res.json()
                 patient = pdata["patient"]
@@ -221,7 +294,7 @@ elif st.session_state.page == "new_patient_prescription":
                 st.warning("Failed to load patient details.")
 
             # Fetch test details
-            rec_res = requests.get(f"{BASE_URL}/records/{st.session_state.appointment_id}")
+            rec_res = unwrap(responses["records"])
             if rec_res.status_code == 200:
                 test = rec_res.json().get("test_details")
                 if test:
@@ -243,41 +316,43 @@ elif st.session_state.page == "new_patient_prescription":
         st.markdown("### Test Result Trends by Age")
 
         try:
-            response = requests.get(f"{BASE_URL}/get_analysis")
-            if response.status_code == 200:
-                df = pd.DataFrame(response.json())
-
-                fig1, ax1 = plt.subplots()
-                ax1.scatter(df["age"], df["ap_hi"], alpha=0.7)
-                ax1.set_title("Age vs Systolic BP")
-                st.pyplot(fig1, use_container_width=True)
-
-                fig2, ax2 = plt.subplots()
-                ax2.scatter(df["age"], df["ap_lo"], alpha=0.7)
-                ax2.set_title("Age vs Diastolic BP")
-                st.pyplot(fig2, use_container_width=True)
-
-                fig3, ax3 = plt.subplots()
-                ax3.scatter(df["age"], df["cholesterol"], alpha=0.7)
-                ax3.set_title("Age vs Cholesterol")
-                st.pyplot(fig3, use_container_width=True)
-
-                fig4, ax4 = plt.subplots()
-                ax4.scatter(df["age"], df["gluc"], alpha=0.7)
-                ax4.set_title("Age vs Glucose")
-                st.pyplot(fig4, use_container_width=True)
-
-            else:
-                st.error("Failed to fetch analysis data.")
+            df, watermark = unwrap(responses["analysis"])
+            png = trend_chart(watermark, len(df), df)
+            st.image(png, use_container_width=True)
+        except requests.RequestException:
+            st.error("Failed to fetch analysis data.")
         except Exception as e:
             st.error(f"Error loading charts: {e}")
 
 # ------------------ EXISTING PATIENT FLOW ------------------ #
 elif st.session_state.page == "existing_patient":
     st.subheader("Search Existing Patient")
-    patient_id = st.text_input("Enter Patient ID")
-    if st.button("Fetch Details"):
-        res = requests.get(f"{BASE_URL}/patients/{patient_id}")
+    # Matches refresh whenever the search text changes (on Enter or when the box loses focus)
+    query = st.text_input("Search by name or patient ID", placeholder="e.g. smith jo")
+    with st.expander("Filters"):
+        age_min, age_max = st.slider("Age", 0, 120, (0, 120))
+        gender = st.selectbox("Gender", ["Any", "Male", "Female"])
+    patient_id = None
+    if query.strip():
+        params = {"q": query, "limit": 20}
+        if (age_min, age_max) != (0, 120):
+            params.update(age_min=age_min, age_max=age_max)
+        if gender != "Any":
+            params["gender"] = 1 if gender == "Male" else 2
+        res = cached_get("/patients/search", ("search",), params)()
+        matches = {m["patient_id"]: m for m in res.json()} if res.status_code == 200 else {}
+        if matches:
+            patient_id = st.selectbox(
+                "Matching patients", list(matches),
+                format_func=lambda pid: f"{matches[pid]['name']} (age {matches[pid]['age']}, ID {pid})",
+            )
+        else:
+            st.info("No matching patients.")
+    if patient_id and st.button("Fetch Details"):
+        st.session_state.details_patient_id = patient_id
+    # Details stay open across reruns caused by other widgets, served from the session cache
+    if patient_id and patient_id == st.session_state.get("details_patient_id"):
+        res = cached_get(f"/patients/{patient_id}/dossier", (f"patient:{patient_id}",))()
         if res.status_code == 200:
             data = res.json()
             patient = data["patient"]
@@ -308,56 +383,47 @@ elif st.session_state.page == "existing_patient":
             st.divider()
 
             st.markdown("## Appointments & Records")
-            appt_res = requests.get(f"{BASE_URL}/appointments/{patient_id}")
-            if appt_res.status_code == 200:
-                appointments = appt_res.json()
-                if not appointments:
-                    st.info("No appointments found for this patient.")
-                for i, appt in enumerate(appointments):
-                    with st.expander(f"Appointment {i+1} - {appt['appointment_date']}"):
-                        st.markdown(f"**Appointment ID:** {appt['appointment_id']}")
-                        st.markdown(f"**Date:** {appt['appointment_date']}")
-                        st.markdown(f"**Type:** {appt['appointment_type']}")
-
-                        rec_res = requests.get(f"{BASE_URL}/records/{appt['appointment_id']}")
-                        if rec_res.status_code == 200:
-                            rec = rec_res.json()
-                            test = rec["test_details"]
-                            pres = rec["prescription"]
-
-                            st.markdown("### Test Results")
-                            if test:
-                                t1, t2 = st.columns(2)
-                                with t1:
-                                    st.markdown(f"- **Test ID:** {test['test_id']}")
-                                    st.markdown(f"- **Systolic BP (ap_hi):** {test['ap_hi']}")
-                                    st.markdown(f"- **Diastolic BP (ap_lo):** {test['ap_lo']}")
-                                with t2:
-                                    st.markdown(f"- **Cholesterol:** {test['cholesterol']}")
-                                    st.markdown(f"- **Glucose:** {test['gluc']}")
-                            else:
-                                st.warning("No test data found.")
-
-                            st.markdown("### Prescription")
-                            if pres:
-                                st.markdown(f"- **Prescription ID:** {pres['prescription_id']}")
-                                st.markdown(f"- **Medicine:** {pres['medicine_name']}")
-                                st.markdown(f"- **Dosage:** {pres['dosage']}")
-                                st.markdown(f"- **Duration:** {pres['duration_days']} days")
-                                st.markdown(f"- **Prescribed Date:** {pres['prescribed_date']}")
-                            else:
-                                st.warning("No prescription found.")
-                        else:
-                            st.warning("No test/prescription record found.")
-            else:
-                st.warning("Unable to fetch appointments.")
+            appointments = data["appointments"]
+            if not appointments:
+                st.info("No appointments found for this patient.")
+            for i, appt in enumerate(appointments):
+                with st.expander(f"Appointment {i+1} - {appt['appointment_date']}"):
+                    st.markdown(f"**Appointment ID:** {appt['appointment_id']}")
+                    st.markdown(f"**Date:** {appt['appointment_date']}")
+                    st.markdown(f"**Type:** {appt['appointment_type']}")
+
+                    test = appt["tests"][0] if appt["tests"] else None
+                    pres = appt["prescriptions"][0] if appt["prescriptions"] else None
+
+                    st.markdown("### Test Results")
+                    if test:
+                        t1, t2 = st.columns(2)
+                        with t1:
+                            st.markdown(f"- **Test ID:** {test['test_id']}")
+                            st.markdown(f"- **Systolic BP (ap_hi):** {test['ap_hi']}")
+                            st.markdown(f"- **Diastolic BP (ap_lo):** {test['ap_lo']}")
+                        with t2:
+                            st.markdown(f"- **Cholesterol:** {test['cholesterol']}")
+                            st.markdown(f"- **Glucose:** {test['gluc']}")
+                    else:
+                        st.warning("No test data found.")
+
+                    st.markdown("### Prescription")
+                    if pres:
+                        st.markdown(f"- **Prescription ID:** {pres['prescription_id']}")
+                        st.markdown(f"- **Medicine:** {pres['medicine_name']}")
+                        st.markdown(f"- **Dosage:** {pres['dosage']}")
+                        st.markdown(f"- **Duration:** {pres['duration_days']} days")
+                        st.markdown(f"- **Prescribed Date:** {pres['prescribed_date']}")
+                    else:
+                        st.warning("No prescription found.")
         else:
             st.error(res.json()['detail'])
 
 # ------------------ ANALYZE DATABASE PAGE ------------------ #
 elif st.session_state.page == "analyze":
     st.header("Full Database Overview")
-    st.markdown("Browse the latest records from each table in the healthcare database below:")
+    st.markdown(f"Browse each table in the healthcare database below, {TABLE_PAGE_ROWS} rows per page in ID order:")
 
     table_endpoints = [
         ("Patient Details", "patient_details"),
@@ -368,20 +434,49 @@ elif st.session_state.page == "analyze":
         ("Prescriptions", "prescriptions"),
     ]
 
+    # Cursors of the pages shown so far per table (None = first page); the last one is shown.
+    # /fetch returns the next page's cursor in X-Next-Cursor.
+    if "table_pages" not in st.session_state:
+        st.session_state.table_pages = {table: [None] for _, table in table_endpoints}
+    pages = st.session_state.table_pages
+
+    def fetch_page(table, cursor, headers):
+        params = {"limit": TABLE_PAGE_ROWS}
+        if cursor:
+            params["cursor"] = cursor
+        return api.get(f"/fetch/{table}", params=params, headers=headers)
+
+    # All six tables are requested in parallel; the page waits for the slowest one
+    headers = read_headers(Accept=ARROW_STREAM)
+    responses = api.gather({
+        table: (lambda table=table, cursor=pages[table][-1]: fetch_page(table, cursor, headers))
+        for _, table in table_endpoints
+    })
+
     for label, table in table_endpoints:
         st.subheader(label)
         try:
-            response = requests.get(f"{BASE_URL}/fetch/{table}")
+            response = unwrap(responses[table])
             if response.status_code == 200:
-                records = response.json()
-                if records:
-                    df = pd.DataFrame(records)
+                df = decode_response(response.content, response.headers["content-type"])
+                page = len(pages[table]) - 1
+                if not df.empty:
+                    first = page * TABLE_PAGE_ROWS + 1
+                    st.caption(f"Rows {first}–{first + len(df) - 1}")
                     st.dataframe(df, use_container_width=True, height=300)
                 else:
                     st.info("No records found in this table.")
+                prev_col, next_col = st.columns(2)
+                with prev_col:
+                    if st.button("Previous page", key=f"prev_{table}", disabled=page == 0):
+                        pages[table].pop()
+                        st.rerun()
+                with next_col:
+                    next_cursor = response.headers.get("X-Next-Cursor")
+                    if st.button("Next page", key=f"next_{table}", disabled=not next_cursor):
+                        pages[table].append(next_cursor)
+                        st.rerun()
             else:
                 st.error(f"Failed to fetch data for {label} (Status: {response.status_code})")
         except Exception as e:
             st.error(f"An error occurred while loading {label}: {str(e)}")
-
-
@@ -0,0 +1,65 @@
+import datetime
+
+
+# ---------- CALENDAR QUERIES ----------
+# Appointments are paged in (doctor_id, appointment_date, appointment_id) order, which is the
+# key order of idx_appointments_doctor_date (schema version 5). With doctor_id filters a page
+# is an index range read in order; a date range alone reads idx_appointments_date_doctor and
+# sorts just that range.
+ORDER = ("doctor_id", "appointment_date", "appointment_id")
+
+# Doctor IDs accepted per request; keeps the IN list within driver parameter limits
+MAX_DOCTORS = 1000
+
+
+def _filters(doctor_ids=None, date_from=None, date_to=None, appointment_type=None):
+    clauses, params = [], []
+    if doctor_ids:
+        clauses.append(f"doctor_id IN ({', '.join(['%s'] * len(doctor_ids))})")
+        params.extend(doctor_ids)
+    if date_from:
+        clauses.append("appointment_date >= %s")
+        params.append(date_from)
+    if date_to:
+        clauses.append("appointment_date <= %s")
+        params.append(date_to)
+    if appointment_type:
+        clauses.append("appointment_type = %s")
+        params.append(appointment_type)
+    return clauses, params
+
+
+def page_query(doctor_ids=None, date_from=None, date_to=None, appointment_type=None, after=None, limit=1000):
+    """One keyset page of appointments; ``after`` is the cursor key of the previous page's last row."""
+    clauses, params = _filters(doctor_ids, date_from, date_to, appointment_type)
+    if after is not None:
+        clauses.append("(doctor_id, appointment_date, appointment_id) > (%s, %s, %s)")
+        params.extend(after)
+    query = "SELECT * FROM appointments"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += f" ORDER BY {', '.join(ORDER)} LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+def rollup_query(doctor_ids=None, date_from=None, date_to=None, appointment_type=None):
+    """Appointment counts per doctor and day over the whole filtered range."""
+    clauses, params = _filters(doctor_ids, date_from, date_to, appointment_type)
+    query = "SELECT doctor_id, appointment_date, COUNT(*) AS appointments FROM appointments"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " GROUP BY doctor_id, appointment_date ORDER BY doctor_id, appointment_date"
+    return query, params
+
+
+def cursor_key(row):
+    """JSON-safe cursor key of a row (a dict from a dictionary cursor)."""
+    date = row["appointment_date"]
+    return [row["doctor_id"], date.isoformat() if isinstance(date, datetime.date) else date, row["appointment_id"]]
+
+
+def parse_cursor_key(key):
+    """Inverse of ``cursor_key``; raises ValueError for a malformed key."""
+    doctor_id, date, appointment_id = key
+    return int(doctor_id), datetime.date.fromisoformat(date), int(appointment_id)
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+import aiomysql
+from fastapi import HTTPException
+
+
+Error = aiomysql.Error
+
+
+# ---------- ASYNC CONNECTION POOL ----------
+class AsyncPool:
+    """aiomysql pool with a checkout timeout and the same counters as db_pool.ConnectionPool."""
+
+    def __init__(self, pool, timeout):
+        self._pool = pool
+        self.timeout = timeout
+        self._waiters = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @asynccontextmanager
+    async def connection(self):
+        start = time.monotonic()
+        self._waiters += 1
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise HTTPException(status_code=503, detail=f"Timed out after {self.timeout}s waiting for a database connection")
+        finally:
+            self._waiters -= 1
+        waited = time.monotonic() - start
+        self._checkouts += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        try:
+            yield conn
+        finally:
+            # Connections run in autocommit mode; only a write that failed mid-transaction
+            # is still open here. aiomysql closes connections released inside a transaction.
+            if conn.get_transaction_status():
+                try:
+                    await conn.rollback()
+                except Error:
+                    pass
+            self._pool.release(conn)
+
+    async def close(self):
+        self._pool.close()
+        await self._pool.wait_closed()
+
+    def stats(self):
+        return {
+            "pool_size": self._pool.maxsize,
+            "opened": self._pool.size,
+            "in_use": self._pool.size - self._pool.freesize,
+            "idle": self._pool.freesize,
+            "waiters": self._waiters,
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "wait_time_total": round(self._wait_total, 6),
+            "wait_time_avg": round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+            "wait_time_max": round(self._wait_max, 6),
+        }
+
+
+async def create_async_pool(settings):
+    pool = await aiomysql.create_pool(
+        host=settings.db_host,
+        port=settings.db_port,
+        user=settings.db_user,
+        password=settings.db_password,
+        db=settings.db_name,
+        minsize=1,
+        maxsize=settings.db_async_pool_size,
+        pool_recycle=settings.db_async_pool_recycle,
+        autocommit=True,
+    )
+    return AsyncPool(pool, settings.db_pool_timeout)
@@ -0,0 +1,97 @@
+"""Compare JSON vs Arrow IPC vs Parquet for the /get_analysis payload.
+
+Runs entirely in-process on synthetic rows shaped like the analysis join, so no
+database is needed:
+
+    python -m benchmarks.analysis_formats --rows 200000
+"""
+import argparse
+import json
+import random
+import time
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from columnar import cursor_to_table, encode_table, decode_response, FORMATS
+
+
+COLUMNS = ("patient_id", "age", "ap_hi", "ap_lo", "cholesterol", "gluc")
+
+
+class ListCursor:
+    """Minimal tuple cursor over in-memory rows, mimicking mysql.connector's fetch API."""
+
+    def __init__(self, rows):
+        self.column_names = COLUMNS
+        self._rows = rows
+        self._pos = 0
+
+    def fetchmany(self, size):
+        batch = self._rows[self._pos:self._pos + size]
+        self._pos += len(batch)
+        return batch
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows))
+
+
+def synthetic_rows(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        (10000000 + i, rng.randint(30, 65), rng.randint(90, 180), rng.randint(60, 110),
+         rng.randint(1, 3), rng.randint(1, 3))
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_json(rows, repeat):
+    def encode():
+        # What FastAPI does for the current endpoint: dictionary cursor rows -> jsonable_encoder -> json.dumps
+        dict_rows = [dict(zip(COLUMNS, row)) for row in ListCursor(rows).fetchall()]
+        return JSONResponse(jsonable_encoder(dict_rows)).body
+
+    encode_time, payload = timed(encode, repeat)
+    decode_time, _ = timed(lambda: pd.DataFrame(json.loads(payload)), repeat)
+    return {"format": "json", "bytes": len(payload), "encode_s": encode_time, "decode_s": decode_time}
+
+
+def bench_columnar(rows, fmt, repeat):
+    encode_time, payload = timed(lambda: encode_table(cursor_to_table(ListCursor(rows)), fmt), repeat)
+    decode_time, _ = timed(lambda: decode_response(payload, FORMATS[fmt]), repeat)
+    return {"format": fmt, "bytes": len(payload), "encode_s": encode_time, "decode_s": decode_time}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json-out", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    rows = synthetic_rows(args.rows)
+    results = [bench_json(rows, args.repeat)]
+    results += [bench_columnar(rows, fmt, args.repeat) for fmt in ("arrow", "parquet")]
+
+    baseline = results[0]
+    print(f"{'format':<8} {'bytes':>12} {'encode ms':>10} {'decode ms':>10} {'size vs json':>13}")
+    for r in results:
+        print(f"{r['format']:<8} {r['bytes']:>12,} {r['encode_s'] * 1000:>10.1f} {r['decode_s'] * 1000:>10.1f} "
+              f"{r['bytes'] / baseline['bytes']:>12.2%}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"rows": args.rows, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare two benchmark result files and flag regressions.
+
+Matches runs by label (``mode@patients``) and endpoint; exits 1 if any p95 latency grew or
+throughput dropped by more than ``--threshold`` (default 10%):
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.15
+"""
+import argparse
+import json
+import sys
+
+
+def _runs(doc):
+    # load_test --json-out writes {"results": {label: result}}; suite writes {"runs": [...]}
+    if "runs" in doc:
+        return {run["label"]: run["result"] for run in doc["runs"]}
+    return doc["results"]
+
+
+def compare(baseline, candidate, threshold=0.10):
+    """Returns ``(rows, regressions)``; each row is ``(run, endpoint, metric, before, after, change)``."""
+    rows, regressions = [], []
+    base_runs, cand_runs = _runs(baseline), _runs(candidate)
+    for label in sorted(base_runs.keys() & cand_runs.keys()):
+        base_endpoints = base_runs[label]["endpoints"]
+        cand_endpoints = cand_runs[label]["endpoints"]
+        for endpoint in sorted(base_endpoints.keys() & cand_endpoints.keys()):
+            for metric, worse_if_higher in (("p95_ms", True), ("throughput_rps", False)):
+                before = base_endpoints[endpoint][metric]
+                after = cand_endpoints[endpoint][metric]
+                change = (after - before) / before if before else 0.0
+                row = (label, endpoint, metric, before, after, change)
+                rows.append(row)
+                if (change > threshold) if worse_if_higher else (change < -threshold):
+                    regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    rows, regressions = compare(baseline, candidate, args.threshold)
+
+    print(f"{'run':<18} {'endpoint':<38} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for label, endpoint, metric, before, after, change in rows:
+        flag = "  <-- regression" if (label, endpoint, metric, before, after, change) in regressions else ""
+        print(f"{label:<18} {endpoint:<38} {metric:<15} {before:>10.1f} {after:>10.1f} {change:>+8.1%}{flag}")
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Insert throughput vs. added request latency of the group-commit write queue.
+
+Concurrent writers insert patients the way POST /patients/new does, first with one
+transaction per insert and then through the write queue at each window size. Runs against
+its own database (``<database>.db`` on the sqlite backend):
+
+    python -m benchmarks.group_commit --writers 32 --duration 5 --windows 0,0.5,1,2,5,10
+"""
+import argparse
+import threading
+import time
+from app_config import settings
+from db_pool import create_pool
+from group_commit import GroupCommitQueue
+from id_allocator import IdAllocator, MySQLBlockReserver
+from queries import PATIENT_INSERT
+import schema
+from benchmarks import synthetic
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(pool, ids, writers, duration, queue=None):
+    """Returns ``(inserts per second, latencies in seconds)``."""
+    latencies = [[] for _ in range(writers)]
+    stop = time.monotonic() + duration
+
+    def insert(cursor, patient_id):
+        cursor.execute(PATIENT_INSERT, (patient_id, "Bench Patient", 50, 1, 170.0, 70.0))
+
+    def writer(out):
+        while time.monotonic() < stop:
+            patient_id = ids.next_id("patient_details")
+            start = time.perf_counter()
+            if queue is not None:
+                queue.submit(lambda cursor: insert(cursor, patient_id))
+            else:
+                conn = pool.get_connection()
+                cursor = conn.cursor()
+                try:
+                    insert(cursor, patient_id)
+                    conn.commit()
+                finally:
+                    cursor.close()
+                    conn.close()
+            out.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer, args=(out,)) for out in latencies]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    flat = [value for out in latencies for value in out]
+    return len(flat) / elapsed, flat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--windows", default="0,0.5,1,2,5,10", help="comma-separated windows in milliseconds")
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--database", default="healthcare_bench_writes")
+    args = parser.parse_args(argv)
+
+    conn = synthetic.connect(settings, args.database)
+    try:
+        schema.migrate(conn, log=lambda *_: None)
+    finally:
+        conn.close()
+    bench_settings = settings.model_copy(update={
+        "db_name": args.database, "db_path": f"{args.database}.db",
+        "db_pool_size": args.writers, "db_max_overflow": 0,
+    })
+    pool = create_pool(bench_settings)
+    ids = IdAllocator(MySQLBlockReserver(pool.get_connection), block_size=10000)
+    try:
+        print(f"{'mode':<16}{'inserts/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'batch':>8}")
+        baseline, latencies = run(pool, ids, args.writers, args.duration)
+        print(f"{'per-request':<16}{baseline:>12,.0f}{percentile(latencies, 0.5) * 1000:>10.2f}"
+              f"{percentile(latencies, 0.95) * 1000:>10.2f}{percentile(latencies, 0.99) * 1000:>10.2f}{1:>8}")
+        for window in (float(w) for w in args.windows.split(",")):
+            queue = GroupCommitQueue(pool.get_connection, window / 1000, args.max_batch)
+            try:
+                rate, latencies = run(pool, ids, args.writers, args.duration, queue)
+            finally:
+                queue.close()
+            stats = queue.stats()
+            print(f"{f'window {window:g} ms':<16}{rate:>12,.0f}{percentile(latencies, 0.5) * 1000:>10.2f}"
+                  f"{percentile(latencies, 0.95) * 1000:>10.2f}{percentile(latencies, 0.99) * 1000:>10.2f}"
+                  f"{stats['mean_batch_size']:>8.1f}   ({rate / baseline:.1f}x)")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
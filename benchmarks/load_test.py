@@ -0,0 +1,375 @@
+"""Concurrent HTTP load test for the API.
+
+Drives a running server (``--url``) or spawns one per mode (``--modes sync,async``, which
+starts ``uvicorn app_main:app`` with HEALTHCARE_DB_ASYNC set accordingly) and reports
+throughput and p50/p95/p99 latency per endpoint:
+
+    python -m benchmarks.load_test --modes sync,async --concurrency 200 --duration 30
+
+With ``--workers 1,2,4`` each mode is also run under the production launcher
+(``python -m serve``) at every worker count, to measure how throughput scales with cores.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+import requests
+from benchmarks.synthetic import FIRST_NAMES, LAST_NAMES
+
+
+DEFAULT_MIX = {
+    "GET /doctors": 3,
+    "GET /patients/{patient_id}": 4,
+    "GET /appointments/{patient_id}": 3,
+    "GET /records/{appointment_id}": 3,
+    "POST /patients/new": 1,
+}
+
+# Every API endpoint that serves clinic traffic, weighted roughly like a clinic day: mostly
+# reads, a steady trickle of writes, and occasional heavy analysis, export and bulk calls.
+FULL_MIX = {
+    "GET /doctors": 3,
+    "GET /patients/search": 3,
+    "GET /patients/{patient_id}": 6,
+    "GET /patients/{patient_id}/dossier": 4,
+    "GET /appointments": 2,
+    "GET /appointments/{patient_id}": 4,
+    "GET /records/{appointment_id}": 4,
+    "GET /fetch/patient_details?limit=100": 2,
+    "GET /analysis/aggregate": 2,
+    "GET /get_analysis": 0.2,
+    "POST /risk/evaluate": 0.5,
+    "GET /risk/cohort": 0.05,
+    "POST /patients/new": 1,
+    "POST /patients/lifestyle": 1,
+    "POST /appointments": 1,
+    "POST /tests": 1,
+    "POST /prescriptions": 1,
+    "POST /patients/bulk": 0.1,
+    "POST /patients/lifestyle/bulk": 0.1,
+    "POST /tests/bulk": 0.1,
+    "POST /prescriptions/bulk": 0.1,
+}
+
+MIXES = {"default": DEFAULT_MIX, "full": FULL_MIX}
+
+
+def _patient(rng):
+    return {"name": f"Load Test {rng.randint(0, 10**9)}", "age": rng.randint(30, 65),
+            "gender": rng.randint(1, 2), "height": 170.0, "weight": 70.0}
+
+
+def _lifestyle(patient_id, rng):
+    return {"patient_id": patient_id, "smoke": rng.randint(0, 1), "alco": rng.randint(0, 1), "active": rng.randint(0, 1)}
+
+
+def _test(ids, rng):
+    return {"appointment_id": rng.choice(ids["appointment_id"]), "ap_hi": rng.randint(100, 180),
+            "ap_lo": rng.randint(60, 110), "cholesterol": rng.randint(1, 3), "gluc": rng.randint(1, 3)}
+
+
+def _prescription(ids, rng):
+    return {"appointment_id": rng.choice(ids["appointment_id"]), "prescribed_date": str(datetime.date.today()),
+            "medicine_name": "Amlodipine", "dosage": "5mg", "duration_days": 30}
+
+
+# JSON bodies for the write endpoints. IDs come from rows sampled at start-up, except that
+# lifestyle rows go to patients created during the run, which have none yet.
+PAYLOADS = {
+    "/patients/new": lambda ids, rng, fresh: _patient(rng),
+    "/patients/lifestyle": lambda ids, rng, fresh: _lifestyle(fresh.take(1)[0], rng),
+    "/appointments": lambda ids, rng, fresh: {"patient_id": rng.choice(ids["patient_id"]), "appointment_type": "Consultation",
+                                              "appointment_date": str(datetime.date.today() + datetime.timedelta(days=rng.randint(1, 30)))},
+    "/tests": lambda ids, rng, fresh: _test(ids, rng),
+    "/prescriptions": lambda ids, rng, fresh: _prescription(ids, rng),
+    "/risk/evaluate": lambda ids, rng, fresh: {"appointment_ids": rng.sample(ids["appointment_id"], min(20, len(ids["appointment_id"])))},
+    "/patients/bulk": lambda ids, rng, fresh: [_patient(rng) for _ in range(100)],
+    "/patients/lifestyle/bulk": lambda ids, rng, fresh: [_lifestyle(patient_id, rng) for patient_id in fresh.take(20)],
+    "/tests/bulk": lambda ids, rng, fresh: [_test(ids, rng) for _ in range(50)],
+    "/prescriptions/bulk": lambda ids, rng, fresh: [_prescription(ids, rng) for _ in range(20)],
+}
+
+
+def _calendar_week(ids, rng):
+    start = datetime.date.fromisoformat(rng.choice(ids["appointment_date"]))
+    return {"doctor_id": rng.sample(ids["doctor_id"], min(2, len(ids["doctor_id"]))),
+            "from": str(start), "to": str(start + datetime.timedelta(days=6))}
+
+
+# Query parameters for the GET endpoints that need them
+PARAMS = {
+    "/patients/search": lambda ids, rng: {"q": f"{rng.choice(LAST_NAMES)[:4]} {rng.choice(FIRST_NAMES)[:2]}".lower()},
+    "/appointments": _calendar_week,
+    "/risk/cohort": lambda ids, rng: {"format": rng.choice(("ndjson", "csv"))},
+}
+
+
+# ---------- WORKLOAD ----------
+def parse_mix(text):
+    if not text:
+        return dict(DEFAULT_MIX)
+    if text in MIXES:
+        return dict(MIXES[text])
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.rpartition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def discover_ids(url, session):
+    """Samples existing IDs so path-parameterised endpoints hit real rows."""
+    ids = {}
+    for table, columns in (("patient_details", ("patient_id",)), ("doctors", ("doctor_id",)),
+                           ("appointments", ("appointment_id", "appointment_date"))):
+        res = session.get(f"{url}/fetch/{table}", params={"columns": ",".join(columns), "limit": 500}, timeout=30)
+        res.raise_for_status()
+        rows = res.json()
+        for column in columns:
+            ids[column] = [row[column] for row in rows] or [0]
+    ids["appointment_date"] = [str(value)[:10] for value in ids["appointment_date"]]
+    return ids
+
+
+class FreshPatients:
+    """Patients created during the run that have no lifestyle row yet. The patient-creating
+    requests in the mix feed it; when it runs dry, a bulk create outside the timed requests
+    refills it."""
+
+    def __init__(self, url, session, refill=200):
+        self.url = url
+        self.session = session
+        self.refill = refill
+        self.ids = deque()
+        self.lock = threading.Lock()
+
+    def add(self, patient_ids):
+        self.ids.extend(patient_ids)
+
+    def collect(self, path, response):
+        if path == "/patients/new":
+            self.add([response.json()["patient_id"]])
+        elif path == "/patients/bulk":
+            self.add(item["patient_id"] for item in response.json()["items"] if "patient_id" in item)
+
+    def take(self, count):
+        taken = []
+        while len(taken) < count:
+            try:
+                taken.append(self.ids.popleft())
+            except IndexError:
+                with self.lock:
+                    if not self.ids:
+                        rng = random.Random()
+                        res = self.session.post(f"{self.url}/patients/bulk", timeout=60,
+                                                json=[_patient(rng) for _ in range(self.refill)])
+                        res.raise_for_status()
+                        self.collect("/patients/bulk", res)
+        return taken
+
+
+def make_request(session, url, name, ids, fresh, rng):
+    """Sends one request for the mix entry ``name`` and returns ``(status, seconds)``; only
+    the HTTP round trip is timed, not building the body or harvesting new IDs."""
+    method, path = name.split(" ", 1)
+    path = path.format(**{key: rng.choice(values) for key, values in ids.items()})
+    kwargs = {}
+    if method == "POST":
+        kwargs["json"] = PAYLOADS[path](ids, rng, fresh)
+    elif path in PARAMS:
+        kwargs["params"] = PARAMS[path](ids, rng)
+    t0 = time.perf_counter()
+    response = session.request(method, url + path, timeout=60, **kwargs)
+    took = time.perf_counter() - t0
+    if response.ok:
+        fresh.collect(path, response)
+    return response.status_code, took
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, elapsed):
+    endpoints = {}
+    all_latencies = []
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        all_latencies.extend(values)
+        endpoints[name] = {
+            "requests": len(values),
+            "throughput_rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "errors": sum(count for status, count in statuses[name].items() if status >= 400 or status == 0),
+        }
+    all_latencies.sort()
+    return {
+        "elapsed_s": elapsed,
+        "requests": len(all_latencies),
+        "throughput_rps": len(all_latencies) / elapsed,
+        "p50_ms": percentile(all_latencies, 0.50) * 1000,
+        "p95_ms": percentile(all_latencies, 0.95) * 1000,
+        "p99_ms": percentile(all_latencies, 0.99) * 1000,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "endpoints": endpoints,
+    }
+
+
+def run_load(url, mix, concurrency, duration, seed=0, warmup=2.0):
+    setup = requests.Session()
+    ids = discover_ids(url, setup)
+    fresh = FreshPatients(url, setup)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed * 100003 + worker_id)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        local_latencies = defaultdict(list)
+        local_statuses = defaultdict(lambda: defaultdict(int))
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            name = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status, took = make_request(session, url, name, ids, fresh, rng)
+            except requests.RequestException:
+                status, took = 0, time.perf_counter() - t0
+            if now >= start_at:
+                local_latencies[name].append(took)
+                local_statuses[name][status] += 1
+        with lock:
+            for name, values in local_latencies.items():
+                latencies[name].extend(values)
+            for name, counts in local_statuses.items():
+                for status, count in counts.items():
+                    statuses[name][status] += count
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, statuses, duration)
+
+
+# ---------- SERVER MANAGEMENT ----------
+def spawn_server(port, env_overrides, app="app_main:app", workers=None):
+    """Starts ``uvicorn app`` in one process, or the app under ``python -m serve`` with
+    ``workers`` worker processes, and waits until it (every worker) answers."""
+    env = dict(os.environ, **env_overrides)
+    if workers:
+        command = [sys.executable, "-m", "serve", "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", app]
+    proc = subprocess.Popen(command + ["--port", str(port), "--log-level", "warning"], env=env)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/pool/stats", timeout=1)
+            if not workers:
+                return proc, url
+            reports = requests.get(f"{url}/workers", timeout=1).json()["workers"]
+            if sum(r["state"] == "ready" for r in reports) >= workers:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Server did not start within 30s")
+
+
+def print_report(label, result):
+    print(f"\n== {label}: {result['throughput_rps']:.1f} req/s, p50 {result['p50_ms']:.1f} ms, "
+          f"p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, errors {result['errors']}")
+    print(f"{'endpoint':<38} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, e in result["endpoints"].items():
+        print(f"{name:<38} {e['throughput_rps']:>8.1f} {e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} "
+              f"{e['p99_ms']:>8.1f} {e['errors']:>7}")
+
+
+def print_comparison(results):
+    """One line per run, then each async run against the sync run with the same workers."""
+    print(f"\n{'run':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, r in results.items():
+        print(f"{label:<22} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['errors']:>7}")
+    for label, r in results.items():
+        sync = results.get("sync" + label[len("async"):]) if label.startswith("async") else None
+        if sync and sync["throughput_rps"] and sync["p99_ms"]:
+            print(f"{label} vs sync: throughput x{r['throughput_rps'] / sync['throughput_rps']:.2f}, "
+                  f"p99 x{r['p99_ms'] / sync['p99_ms']:.2f}")
+
+
+MODES = {
+    "sync": {"HEALTHCARE_DB_ASYNC": "0"},
+    "async": {"HEALTHCARE_DB_ASYNC": "1"},
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load an already running server instead of spawning one")
+    parser.add_argument("--modes", default="sync,async", help="comma-separated modes to spawn: " + ", ".join(MODES))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", help="comma-separated worker counts to run each mode with under python -m serve")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", help='"full", or weighted endpoints, e.g. "GET /doctors=3,POST /patients/new=1"')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    if not args.url and "async" in args.modes.split(",") and os.environ.get("HEALTHCARE_DB_BACKEND") == "sqlite":
+        # The async handlers are MySQL-only; both runs would measure the sync handlers
+        parser.error("async mode needs the MySQL backend; use --modes sync with HEALTHCARE_DB_BACKEND=sqlite")
+    results = {}
+    if args.url:
+        results["target"] = run_load(args.url, mix, args.concurrency, args.duration, args.seed)
+    else:
+        worker_counts = [int(n) for n in args.workers.split(",")] if args.workers else [None]
+        for mode in args.modes.split(","):
+            for workers in worker_counts:
+                proc, url = spawn_server(args.port, MODES[mode], workers=workers)
+                try:
+                    label = f"{mode} x{workers} workers" if workers else mode
+                    results[label] = run_load(url, mix, args.concurrency, args.duration, args.seed)
+                finally:
+                    proc.terminate()
+                    proc.wait()
+
+    for label, result in results.items():
+        print_report(label, result)
+    if len(results) > 1:
+        print_comparison(results)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"concurrency": args.concurrency, "duration_s": args.duration, "mix": mix, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
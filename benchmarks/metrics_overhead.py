@@ -0,0 +1,85 @@
+"""Measure the per-request and per-statement cost of the metrics instrumentation.
+
+Runs in-process against a minimal ASGI app and a no-op cursor, so the numbers are the
+instrumentation overhead alone, without network or database time:
+
+    python -m benchmarks.metrics_overhead --requests 20000 --statements 200000
+"""
+import argparse
+import asyncio
+import time
+from fastapi import FastAPI
+from metrics import MetricsRegistry, MetricsMiddleware, TimedCursor
+
+
+class NullCursor:
+    def execute(self, query, params=()):
+        pass
+
+
+def build_app(registry=None):
+    app = FastAPI()
+
+    @app.get("/patients/{patient_id}")
+    async def get_patient(patient_id: int):
+        return {"patient_id": patient_id}
+
+    if registry is not None:
+        app.add_middleware(MetricsMiddleware, registry=registry)
+    return app
+
+
+async def time_requests(app, count):
+    # Calls the ASGI app directly; an HTTP client would add more noise than the middleware costs
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope(i):
+        return {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": f"/patients/{i}", "raw_path": f"/patients/{i}".encode(),
+                "root_path": "", "query_string": b"", "headers": [], "server": ("bench", 80)}
+
+    for i in range(200):
+        await app(scope(i), receive, send)
+    start = time.perf_counter()
+    for i in range(count):
+        await app(scope(i), receive, send)
+    return (time.perf_counter() - start) / count
+
+
+def time_statements(cursor, count):
+    query = "SELECT * FROM test_details WHERE appointment_id IN (%s, %s, %s)"
+    start = time.perf_counter()
+    for _ in range(count):
+        cursor.execute(query, (1, 2, 3))
+    return (time.perf_counter() - start) / count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--statements", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Alternate the two apps and keep each one's best round, so machine noise does not
+    # masquerade as overhead.
+    plain_app, timed_app = build_app(), build_app(MetricsRegistry())
+    plain = timed = float("inf")
+    for _ in range(args.rounds):
+        plain = min(plain, asyncio.run(time_requests(plain_app, args.requests // args.rounds)))
+        timed = min(timed, asyncio.run(time_requests(timed_app, args.requests // args.rounds)))
+    print(f"request:   {plain * 1e6:8.1f} us plain, {timed * 1e6:8.1f} us instrumented, "
+          f"overhead {(timed - plain) * 1e6:6.1f} us ({(timed - plain) / plain:+.1%})")
+
+    plain = time_statements(NullCursor(), args.statements)
+    timed = time_statements(TimedCursor(NullCursor(), MetricsRegistry().observe_query), args.statements)
+    print(f"statement: {plain * 1e6:8.2f} us plain, {timed * 1e6:8.2f} us instrumented, "
+          f"overhead {(timed - plain) * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
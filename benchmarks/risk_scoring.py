@@ -0,0 +1,58 @@
+"""Time cohort risk scoring against the per-appointment rule check it replaces.
+
+Scores synthetic columns in-process, so the numbers exclude the database read:
+
+    python -m benchmarks.risk_scoring --rows 1000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import risk_scoring
+
+
+def synthetic_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "age": rng.integers(30, 66, rows).astype(float),
+        "gender": rng.integers(1, 3, rows).astype(float),
+        "ap_hi": rng.normal(128, 18, rows).round(),
+        "ap_lo": rng.normal(82, 10, rows).round(),
+        "cholesterol": rng.integers(1, 4, rows).astype(float),
+        "gluc": rng.integers(1, 4, rows).astype(float),
+        "smoke": rng.integers(0, 2, rows).astype(float),
+        "alco": rng.integers(0, 2, rows).astype(float),
+        "active": rng.integers(0, 2, rows).astype(float),
+    })
+    # Some tests have no lifestyle row
+    frame.loc[rng.random(rows) < 0.05, ["smoke", "alco", "active"]] = np.nan
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--loop-rows", type=int, default=20000, help="rows timed with the per-row check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    frame = synthetic_frame(args.rows, args.seed)
+    rule = risk_scoring.DEFAULT_RULE
+
+    start = time.perf_counter()
+    _, at_risk = risk_scoring.score(rule, frame)
+    vectorized = time.perf_counter() - start
+
+    records = frame.head(args.loop_rows).to_dict("records")
+    start = time.perf_counter()
+    looped = [risk_scoring.is_at_risk(rule, record) for record in records]
+    per_row = (time.perf_counter() - start) / len(records)
+
+    assert looped == at_risk[:len(records)].tolist()
+    print(f"vectorized: {args.rows:,} rows in {vectorized:.3f} s ({args.rows / vectorized:,.0f} rows/s), "
+          f"{int(at_risk.sum()):,} at risk")
+    print(f"per row:    {per_row * 1e6:.1f} us/row, {per_row * args.rows:.1f} s projected for {args.rows:,} rows")
+
+
+if __name__ == "__main__":
+    main()
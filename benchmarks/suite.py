@@ -0,0 +1,81 @@
+"""End-to-end benchmark: load a synthetic dataset, drive every endpoint, record results.
+
+Each scale is loaded into its own database, a server is spawned against it per mode, and
+the combined results are written as JSON for ``benchmarks.compare``:
+
+    python -m benchmarks.suite --scales 10000,1000000 --modes sync --duration 60 --json-out run.json
+    python -m benchmarks.compare baseline.json run.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+from dataclasses import asdict
+from app_config import settings
+from benchmarks import synthetic
+from benchmarks.load_test import MODES, parse_mix, run_load, spawn_server, print_report
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10000", help="comma-separated patient counts")
+    parser.add_argument("--modes", default="sync", help="comma-separated server modes: " + ", ".join(MODES))
+    parser.add_argument("--mix", default="full", help='"full", "default" or weighted endpoints')
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--skip-load", action="store_true", help="reuse databases loaded by an earlier run")
+    parser.add_argument("--json-out", required=True)
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    runs = []
+    for patients in (int(p) for p in args.scales.split(",")):
+        scale = synthetic.Scale(patients=patients)
+        database = f"healthcare_bench_{patients}"
+        if not args.skip_load:
+            conn = synthetic.connect(settings, database)
+            try:
+                counts = synthetic.load(conn, scale, args.seed, reset=True)
+            finally:
+                conn.close()
+            print(f"loaded {database}: {counts}")
+        for mode in args.modes.split(","):
+            # Writes from a previous mode stay in the database; reads dominate the mix, so
+            # the drift is small compared to the scale steps.
+            env = dict(MODES[mode], HEALTHCARE_DB_NAME=database, HEALTHCARE_DB_PATH=f"{database}.db")
+            proc, url = spawn_server(args.port, env)
+            try:
+                result = run_load(url, mix, args.concurrency, args.duration, args.seed)
+            finally:
+                proc.terminate()
+                proc.wait()
+            label = f"{mode}@{patients}"
+            print_report(label, result)
+            runs.append({"label": label, "mode": mode, "backend": settings.db_backend,
+                         "scale": asdict(scale), "result": result})
+
+    with open(args.json_out, "w") as f:
+        json.dump({
+            "revision": git_revision(),
+            "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": mix,
+            "runs": runs,
+        }, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Deterministic synthetic cardiovascular dataset for benchmarks.
+
+The same ``--patients``/``--seed`` always produce the same rows, so results from different
+runs are comparable. Loads into its own database (created if missing); with
+HEALTHCARE_DB_BACKEND=sqlite the database is the file ``<database>.db``:
+
+    python -m benchmarks.synthetic --patients 100000 --database healthcare_bench --reset
+"""
+import argparse
+import datetime
+import random
+import time
+from dataclasses import dataclass, asdict
+import mysql.connector
+import schema
+import sqlite_backend
+from storage import is_embedded
+from id_allocator import ID_MIN, ID_COLUMNS
+from queries import PATIENT_INSERT, LIFESTYLE_INSERT, APPOINTMENT_INSERT, TEST_INSERT, PRESCRIPTION_INSERT
+from response_cache import TAGS, create_cache
+import cohort_stats
+import analysis_sync
+import patient_search
+
+
+DOCTOR_INSERT = "INSERT INTO doctors (doctor_id, name, specialization) VALUES (%s, %s, %s)"
+
+SPECIALIZATIONS = ("Cardiology", "General Medicine", "Endocrinology", "Internal Medicine")
+APPOINTMENT_TYPES = ("Consultation", "Follow-up", "Routine Checkup")
+MEDICINES = ("Amlodipine", "Atorvastatin", "Lisinopril", "Metoprolol")
+FIRST_NAMES = ("Aaron", "Aisha", "Amelia", "Ana", "Ben", "Carlos", "Chen", "Chloe", "Daniel", "Elena",
+               "Fatima", "George", "Hannah", "Ivan", "James", "Jon", "José", "Julia", "Kenji", "Laura",
+               "Liam", "Maria", "Mohammed", "Nina", "Olivia", "Omar", "Priya", "Sophie", "Thomas", "Zoe")
+LAST_NAMES = ("Anderson", "Brown", "Chowdhury", "Clark", "Davies", "Díaz", "Evans", "Fischer", "García",
+              "Green", "Hall", "Hughes", "Ivanova", "Jackson", "Johnson", "Kim", "Kowalski", "Lee", "Lopez",
+              "Martin", "Miller", "Müller", "Nguyen", "Novak", "O'Brien", "Patel", "Rossi", "Schmidt",
+              "Silva", "Smith", "Smyth", "Suzuki", "Taylor", "Thompson", "Walker", "Wang", "White",
+              "Williams", "Wilson", "Young")
+
+
+@dataclass(frozen=True)
+class Scale:
+    patients: int = 10000
+    doctors: int = 50
+    appointments_per_patient: int = 2
+    history_days: int = 365
+    # Fixed so the generated dates do not depend on when the generator runs
+    end_date: datetime.date = datetime.date(2025, 1, 1)
+
+
+# ---------- GENERATORS ----------
+def _rng(seed, name):
+    # One independent stream per table, so changing one generator leaves the others stable
+    return random.Random(f"{seed}:{name}")
+
+
+def _level(rng, weights):
+    return rng.choices((1, 2, 3), weights)[0]
+
+
+def doctor_rows(scale, seed):
+    rng = _rng(seed, "doctors")
+    for i in range(scale.doctors):
+        yield (ID_MIN + i, f"Doctor {i:05d}", rng.choice(SPECIALIZATIONS))
+
+
+def patient_rows(scale, seed):
+    """Yields ``(patient_details row, patient_lifestyle row)`` pairs."""
+    rng = _rng(seed, "patients")
+    names = _rng(seed, "names")
+    for i in range(scale.patients):
+        patient_id = ID_MIN + i
+        gender = rng.choice((1, 2))
+        height = round(rng.gauss(164 if gender == 1 else 170, 8), 1)
+        weight = round(max(40.0, rng.gauss(74, 14)), 1)
+        yield (
+            (patient_id, f"{names.choice(FIRST_NAMES)} {names.choice(LAST_NAMES)}", rng.randint(30, 65), gender, height, weight),
+            (patient_id, int(rng.random() < 0.09), int(rng.random() < 0.05), int(rng.random() < 0.8)),
+        )
+
+
+def clinical_rows(scale, seed):
+    """Yields ``(appointment, test, prescription or None)`` for every appointment; every
+    appointment has a test and about half get a prescription."""
+    rng = _rng(seed, "clinical")
+    prescription_id = ID_MIN
+    for i in range(scale.patients):
+        for j in range(scale.appointments_per_patient):
+            appointment_id = ID_MIN + i * scale.appointments_per_patient + j
+            date = scale.end_date - datetime.timedelta(days=rng.randrange(scale.history_days))
+            appointment = (appointment_id, ID_MIN + i, ID_MIN + rng.randrange(scale.doctors),
+                           date, rng.choice(APPOINTMENT_TYPES))
+            ap_hi = int(rng.gauss(127, 17))
+            test = (appointment_id, appointment_id, ap_hi, int(rng.gauss(81, 10)),
+                    _level(rng, (75, 14, 11)), _level(rng, (85, 7, 8)))
+            prescription = None
+            if rng.random() < 0.5:
+                prescription = (prescription_id, appointment_id, date, rng.choice(MEDICINES),
+                                f"{rng.choice((5, 10, 20))}mg", rng.choice((7, 14, 30, 90)))
+                prescription_id += 1
+            yield appointment, test, prescription
+
+
+# ---------- LOADER ----------
+def _flush(conn, cursor, query, rows):
+    if rows:
+        cursor.executemany(query, rows)
+        conn.commit()
+        rows.clear()
+
+
+def load(conn, scale, seed=0, chunk_size=5000, reset=False, log=print):
+    """Migrates the schema, inserts the dataset in committed chunks and brings derived state
+    (ID counters, cohort summary) in line with it. Returns row counts per table."""
+    schema.migrate(conn, log)
+    cursor = conn.cursor()
+    try:
+        # The generated rows are consistent by construction; skipping foreign key checks lets
+        # the tables be truncated and speeds up the load.
+        cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+        if reset:
+            for table in (*schema.TABLES, "cohort_histogram"):
+                cursor.execute(f"TRUNCATE TABLE {table}")
+            cursor.execute("DELETE FROM id_blocks")
+            analysis_sync.reset(cursor)
+
+        counts = dict.fromkeys(schema.TABLES, 0)
+        doctors = list(doctor_rows(scale, seed))
+        _flush(conn, cursor, DOCTOR_INSERT, doctors[:])
+        counts["doctors"] = len(doctors)
+
+        started = time.perf_counter()
+        patients, lifestyles = [], []
+        for patient, lifestyle in patient_rows(scale, seed):
+            patients.append(patient)
+            lifestyles.append(lifestyle)
+            if len(patients) >= chunk_size:
+                counts["patient_details"] += len(patients)
+                counts["patient_lifestyle"] += len(lifestyles)
+                _flush(conn, cursor, PATIENT_INSERT, patients)
+                _flush(conn, cursor, LIFESTYLE_INSERT, lifestyles)
+        counts["patient_details"] += len(patients)
+        counts["patient_lifestyle"] += len(lifestyles)
+        _flush(conn, cursor, PATIENT_INSERT, patients)
+        _flush(conn, cursor, LIFESTYLE_INSERT, lifestyles)
+        log(f"patients: {counts['patient_details']} rows in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        buffers = {APPOINTMENT_INSERT: [], TEST_INSERT: [], PRESCRIPTION_INSERT: []}
+        for appointment, test, prescription in clinical_rows(scale, seed):
+            buffers[APPOINTMENT_INSERT].append(appointment)
+            buffers[TEST_INSERT].append(test)
+            counts["appointments"] += 1
+            counts["test_details"] += 1
+            if prescription:
+                buffers[PRESCRIPTION_INSERT].append(prescription)
+                counts["prescriptions"] += 1
+            if len(buffers[APPOINTMENT_INSERT]) >= chunk_size:
+                for query, rows in buffers.items():
+                    _flush(conn, cursor, query, rows)
+        for query, rows in buffers.items():
+            _flush(conn, cursor, query, rows)
+        log(f"appointments: {counts['appointments']} rows in {time.perf_counter() - started:.1f}s")
+
+        # Start the allocator past the generated IDs so new writes never collide with them
+        for table, column in ID_COLUMNS.items():
+            cursor.execute(f"SELECT COALESCE(MAX({column}), %s) + 1 FROM {table}", (ID_MIN - 1,))
+            next_id = cursor.fetchone()[0]
+            cursor.execute("REPLACE INTO id_blocks (name, next_id) VALUES (%s, %s)", (table, next_id))
+        # Make the loaded tests visible to analysis delta reads
+        analysis_sync.stamp_unstamped(cursor)
+        conn.commit()
+        cursor.execute("SET FOREIGN_KEY_CHECKS=1")
+    finally:
+        cursor.close()
+
+    cohort_stats.rebuild(conn)
+    patient_search.rebuild(conn, log=lambda *_: None)
+    return counts
+
+
+def connect(settings, database):
+    """Connects with the app's credentials, creating ``database`` if it does not exist."""
+    if is_embedded(settings):
+        return sqlite_backend.connect(f"{database}.db")
+    conn = mysql.connector.connect(host=settings.db_host, port=settings.db_port,
+                                   user=settings.db_user, password=settings.db_password)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    cursor.close()
+    conn.database = database
+    return conn
+
+
+def main(argv=None):
+    from app_config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=Scale.patients)
+    parser.add_argument("--doctors", type=int, default=Scale.doctors)
+    parser.add_argument("--appointments-per-patient", type=int, default=Scale.appointments_per_patient)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", default="healthcare_bench")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true", help="truncate the benchmark tables first")
+    args = parser.parse_args(argv)
+
+    scale = Scale(args.patients, args.doctors, args.appointments_per_patient)
+    conn = connect(settings, args.database)
+    try:
+        counts = load(conn, scale, args.seed, args.chunk_size, args.reset)
+    finally:
+        conn.close()
+    # Running API workers on this host drop their cached reads of the reloaded tables
+    create_cache(settings).invalidate(*TAGS)
+    print({"scale": asdict(scale), "seed": args.seed, "rows": counts})
+
+
+if __name__ == "__main__":
+    main()
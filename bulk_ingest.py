@@ -0,0 +1,110 @@
+import json
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from storage import Error
+
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+# ---------- REQUEST PARSING ----------
+async def read_bulk_items(request: Request):
+    """Returns a list of ``(raw_item, parse_error)`` from a JSON array or an NDJSON body."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_TYPES:
+        items = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            items.extend(_parse_line(line) for line in lines if line.strip())
+        if buffer.strip():
+            items.append(_parse_line(buffer))
+        return items
+
+    try:
+        payload = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of records")
+    return [(item, None) for item in payload]
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
+
+
+# ---------- VALIDATION ----------
+def validate_items(model, items, max_items):
+    """Validates every item in one pass. Returns ``(valid, errors)`` where ``valid`` is a list of
+    ``(index, model_instance)`` and ``errors`` maps index -> message."""
+    if len(items) > max_items:
+        raise HTTPException(status_code=413, detail=f"Too many records in one request (max {max_items})")
+
+    valid, errors = [], {}
+    for index, (raw, parse_error) in enumerate(items):
+        if parse_error:
+            errors[index] = parse_error
+            continue
+        try:
+            valid.append((index, model.model_validate(raw)))
+        except ValidationError as e:
+            errors[index] = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+    return valid, errors
+
+
+# ---------- INSERTION ----------
+def insert_chunked(conn, query, rows, chunk_size, before_commit=None):
+    """Inserts ``(index, params)`` rows with one multi-row statement and one commit per chunk.
+
+    If a chunk fails, it is rolled back and replayed row by row in a single transaction so
+    only the offending rows are reported. ``before_commit(cursor, inserted_params)`` runs
+    inside each chunk's transaction. Returns a dict of index -> error message.
+    """
+    errors = {}
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                cursor.executemany(query, [params for _, params in chunk])
+                if before_commit:
+                    before_commit(cursor, [params for _, params in chunk])
+                conn.commit()
+                continue
+            except Error:
+                conn.rollback()
+
+            inserted = []
+            for index, params in chunk:
+                try:
+                    cursor.execute(query, params)
+                    inserted.append(params)
+                except Error as e:
+                    errors[index] = str(e)
+            if before_commit:
+                before_commit(cursor, inserted)
+            conn.commit()
+    finally:
+        cursor.close()
+    return errors
+
+
+def bulk_response(count, results, errors):
+    """Builds the per-item response: ``results`` maps index -> success payload."""
+    items = []
+    for index in range(count):
+        if index in errors:
+            items.append({"index": index, "error": errors[index]})
+        else:
+            items.append({"index": index, **results.get(index, {})})
+    return {
+        "inserted": count - len(errors),
+        "failed": len(errors),
+        "items": items,
+    }
@@ -0,0 +1,282 @@
+"""Bulk import of historical data in the ``cardio_train`` CSV layout.
+
+Every row (age, gender, height, weight, ap_hi, ap_lo, cholesterol, gluc, smoke, alco, active)
+becomes a patient, its lifestyle, one appointment with an existing doctor and that
+appointment's test. The file is streamed in chunks that parallel worker processes validate
+with the API models and insert with multi-row statements, one transaction per chunk:
+
+    python -m cardio_import cardio_train.csv --workers 4 --chunk-size 5000
+
+Each chunk's transaction also records the chunk in ``import_checkpoints``, so rerunning the
+same command after a crash skips the chunks that committed and imports the rest exactly once.
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from pydantic import ValidationError
+import analysis_sync
+import cohort_stats
+import patient_search
+import schema
+from id_allocator import IdAllocator, MySQLBlockReserver
+from input_basemodels import PatientBase, Lifestyle, TestDetails
+from queries import PATIENT_INSERT, LIFESTYLE_INSERT, APPOINTMENT_INSERT, TEST_INSERT
+from response_cache import create_cache
+from storage import Error, connector
+
+
+CHECKPOINT_INSERT = "INSERT INTO import_checkpoints (source, chunk, imported, rejected) VALUES (%s, %s, %s, %s)"
+
+# cardio_train records age in days; larger values than this are taken to be days
+MAX_AGE_YEARS = 150
+
+# Rejected rows reported on the console; --errors writes all of them
+MAX_PRINTED_ERRORS = 20
+
+
+# ---------- CHECKPOINTS ----------
+# import_checkpoints is created by schema version 7
+def source_key(path, chunk_size):
+    """Identifies a file and chunking: its size, a hash of its first megabyte and the chunk size.
+    Rerunning with another chunk size is a new import, since the chunk numbers would differ."""
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read(1 << 20)).hexdigest()[:16]
+    return f"{os.path.basename(path)[:50]}:{os.path.getsize(path)}:{digest}:{chunk_size}"
+
+
+def completed_chunks(cursor, source):
+    cursor.execute("SELECT chunk, imported, rejected FROM import_checkpoints WHERE source = %s", (source,))
+    return {chunk: (imported, rejected) for chunk, imported, rejected in cursor.fetchall()}
+
+
+# ---------- READING ----------
+def read_chunks(path, chunk_size, delimiter=None):
+    """Yields ``(chunk index, [(line number, row dict), ...])``; sniffs ``;`` or ``,``."""
+    with open(path, newline="") as f:
+        if delimiter is None:
+            delimiter = ";" if f.readline().count(";") > 0 else ","
+            f.seek(0)
+        reader = csv.DictReader(f, delimiter=delimiter)
+        # Line numbers are 1-based with the header on line 1
+        rows = ((i + 2, row) for i, row in enumerate(reader))
+        index = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield index, chunk
+            index += 1
+
+
+def parse_row(raw, age_unit="auto"):
+    """Validates one CSV row; returns ``(PatientBase, Lifestyle, TestDetails)`` with placeholder
+    IDs (the real ones are assigned per chunk) or raises ``ValidationError``/``ValueError``."""
+    raw = {k.strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in raw.items() if k}
+    age = raw.get("age")
+    if age_unit == "days" or (age_unit == "auto" and age and float(age) > MAX_AGE_YEARS):
+        raw["age"] = int(float(age) // 365)
+    name = raw.get("name") or f"Imported {raw.get('id') or 'patient'}"
+    patient = PatientBase.model_validate({**raw, "name": name})
+    lifestyle = Lifestyle.model_validate({**raw, "patient_id": 0})
+    test = TestDetails.model_validate({**raw, "appointment_id": 0})
+    return patient, lifestyle, test
+
+
+def _describe(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+    return str(error)
+
+
+# ---------- WORKERS ----------
+_worker = {}
+
+
+def _init_worker(settings, options):
+    connect = connector(settings)
+    _worker["conn"] = connect()
+    # Each chunk reserves its IDs in one block per table
+    _worker["ids"] = IdAllocator(MySQLBlockReserver(connect), block_size=options["chunk_size"])
+    _worker["options"] = options
+
+
+def import_chunk(index, rows):
+    """Validates and inserts one chunk in a single transaction. Returns
+    ``(index, imported, [(line, error), ...], failure)`` where ``failure`` is set if the
+    chunk was rolled back and must be retried."""
+    conn, ids, options = _worker["conn"], _worker["ids"], _worker["options"]
+    valid, rejected = [], []
+    for line, raw in rows:
+        try:
+            valid.append(parse_row(raw, options["age_unit"]))
+        except (ValidationError, ValueError) as e:
+            rejected.append((line, _describe(e)))
+
+    count = len(valid)
+    doctors = options["doctor_ids"]
+    try:
+        patient_ids = ids.next_ids("patient_details", count)
+        appointment_ids = ids.next_ids("appointments", count)
+        test_ids = ids.next_ids("test_details", count)
+        patients, lifestyles, appointments, tests = [], [], [], []
+        for i, (p, l, t) in enumerate(valid):
+            patient_id, appointment_id = patient_ids[i], appointment_ids[i]
+            patients.append((patient_id, p.name, p.age, p.gender, p.height, p.weight))
+            lifestyles.append((patient_id, l.smoke, l.alco, l.active))
+            # Spread the imported appointments over the roster round-robin
+            appointments.append((appointment_id, patient_id, doctors[(index * options["chunk_size"] + i) % len(doctors)],
+                                 options["appointment_date"], options["appointment_type"]))
+            tests.append((test_ids[i], appointment_id, t.ap_hi, t.ap_lo, t.cholesterol, t.gluc))
+
+        cursor = conn.cursor()
+        try:
+            # First, so a chunk another run is importing right now fails fast on the key
+            cursor.execute(CHECKPOINT_INSERT, (options["source"], index, count, len(rejected)))
+            for query, params in ((PATIENT_INSERT, patients), (LIFESTYLE_INSERT, lifestyles),
+                                  (APPOINTMENT_INSERT, appointments), (TEST_INSERT, tests)):
+                if params:
+                    cursor.executemany(query, params)
+            patient_search.index_patients(cursor, [p[:2] for p in patients])
+            cohort_stats.record_tests(cursor, [t[1:] for t in tests])
+            analysis_sync.stamp_tests(cursor, test_ids)
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    except Error as e:
+        return index, 0, rejected, str(e)
+    return index, count, rejected, None
+
+
+# ---------- DRIVER ----------
+def run_import(path, settings, workers=4, chunk_size=5000, appointment_date=None, appointment_type="Imported",
+               doctor_ids=None, age_unit="auto", delimiter=None, log=print):
+    """Imports ``path`` and returns a summary dict; chunks committed by an earlier run of the
+    same file and chunk size are skipped."""
+    conn = connector(settings)()
+    cursor = conn.cursor()
+    try:
+        schema.migrate(conn, log)
+        if not doctor_ids:
+            cursor.execute("SELECT doctor_id FROM doctors ORDER BY doctor_id")
+            doctor_ids = [row[0] for row in cursor.fetchall()]
+        if not doctor_ids:
+            raise ValueError("No doctors to assign the imported appointments to; add doctors first")
+        source = source_key(path, chunk_size)
+        done = completed_chunks(cursor, source)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    options = {
+        "source": source,
+        "chunk_size": chunk_size,
+        "doctor_ids": doctor_ids,
+        "appointment_date": appointment_date or datetime.date.today(),
+        "appointment_type": appointment_type,
+        "age_unit": age_unit,
+    }
+    summary = {"source": source, "rows": 0, "imported": 0, "rejected": 0, "skipped_chunks": len(done),
+               "failed_chunks": [], "errors": []}
+    if done:
+        log(f"resuming: {len(done)} chunks already imported")
+        summary["imported"] = sum(imported for imported, _ in done.values())
+        summary["rejected"] = sum(rejected for _, rejected in done.values())
+
+    started = time.perf_counter()
+    imported_now = 0
+
+    def collect(future):
+        nonlocal imported_now
+        index, imported, rejected, failure = future.result()
+        if failure:
+            summary["failed_chunks"].append(index)
+            log(f"chunk {index} failed and was rolled back: {failure}")
+            return
+        imported_now += imported
+        summary["imported"] += imported
+        summary["rejected"] += len(rejected)
+        summary["errors"].extend(rejected)
+        elapsed = time.perf_counter() - started
+        log(f"chunk {index}: {imported} imported, {len(rejected)} rejected "
+            f"({summary['imported']} total, {imported_now / elapsed:,.0f} rows/s)")
+
+    # At most two chunks per worker are parsed ahead, so memory stays flat for any file size
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(settings, options)) as pool:
+        pending = set()
+        for index, rows in read_chunks(path, chunk_size, delimiter):
+            summary["rows"] += len(rows)
+            if index in done:
+                continue
+            pending.add(pool.submit(import_chunk, index, rows))
+            if len(pending) >= 2 * workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future)
+        for future in pending:
+            collect(future)
+
+    summary["seconds"] = time.perf_counter() - started
+    summary["rows_per_second"] = imported_now / summary["seconds"] if summary["seconds"] else 0.0
+    # Running API workers on this host drop their cached reads of the imported tables
+    create_cache(settings).invalidate("patient_details", "patient_lifestyle", "appointments",
+                                      "test_details", "cohort_histogram")
+    return summary
+
+
+def main(argv=None):
+    from app_config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV file with a header row")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per transaction")
+    parser.add_argument("--appointment-date", type=datetime.date.fromisoformat, default=None,
+                        help="date of the imported appointments (default: today)")
+    parser.add_argument("--appointment-type", default="Imported")
+    parser.add_argument("--doctor-id", type=int, action="append", dest="doctor_ids",
+                        help="doctor for the imported appointments; repeat to round-robin (default: all doctors)")
+    parser.add_argument("--age-unit", choices=("auto", "years", "days"), default="auto",
+                        help=f"auto treats ages above {MAX_AGE_YEARS} as days, as in cardio_train")
+    parser.add_argument("--delimiter", default=None, help="field separator (default: sniff ';' or ',')")
+    parser.add_argument("--errors", help="write rejected rows as CSV (line, error) to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = run_import(args.path, settings, args.workers, args.chunk_size, args.appointment_date,
+                             args.appointment_type, args.doctor_ids, args.age_unit, args.delimiter)
+    except (*Error, ValueError) as e:
+        print("Import failed:", e)
+        return 1
+
+    errors = sorted(summary["errors"])
+    for line, error in errors[:MAX_PRINTED_ERRORS]:
+        print(f"line {line}: {error}")
+    if len(errors) > MAX_PRINTED_ERRORS:
+        print(f"... {len(errors) - MAX_PRINTED_ERRORS} more rejected rows")
+    if args.errors:
+        with open(args.errors, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("line", "error"))
+            writer.writerows(errors)
+
+    print(f"{summary['rows']} rows read, {summary['imported']} imported, {summary['rejected']} rejected, "
+          f"{summary['skipped_chunks']} chunks skipped as already imported; "
+          f"{summary['seconds']:.1f}s, {summary['rows_per_second']:,.0f} rows/s")
+    if summary["failed_chunks"]:
+        print(f"chunks {sorted(summary['failed_chunks'])} failed; rerun the same command to retry them")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
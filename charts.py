@@ -0,0 +1,40 @@
+import io
+from matplotlib.figure import Figure
+
+
+# (column, title) for the four trend panels on the prescription page
+TREND_METRICS = (
+    ("ap_hi", "Age vs Systolic BP"),
+    ("ap_lo", "Age vs Diastolic BP"),
+    ("cholesterol", "Age vs Cholesterol"),
+    ("gluc", "Age vs Glucose"),
+)
+
+# Above this many points a panel is drawn as a hexbin density plot instead of a scatter
+MAX_SCATTER_POINTS = 5000
+
+
+# ---------- RENDERING ----------
+def render_trends(df, max_points=MAX_SCATTER_POINTS, dpi=100):
+    """Draws the four metrics against age in one 2x2 figure and returns it as PNG bytes.
+
+    Uses ``matplotlib.figure.Figure`` directly rather than pyplot, so the figure is never
+    registered with the global figure manager and is freed once the bytes are written.
+    """
+    fig = Figure(figsize=(8, 6.5), dpi=dpi, layout="constrained")
+    axes = fig.subplots(2, 2).ravel()
+    for ax, (column, title) in zip(axes, TREND_METRICS):
+        data = df[["age", column]].dropna()
+        if len(data) > max_points:
+            hb = ax.hexbin(data["age"], data[column], gridsize=40, mincnt=1, bins="log", cmap="Blues")
+            fig.colorbar(hb, ax=ax, label="patients")
+        else:
+            ax.scatter(data["age"], data[column], alpha=0.7, s=12)
+        ax.set_title(title)
+        ax.set_xlabel("age")
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png")
+    finally:
+        fig.clear()
+    return buf.getvalue()
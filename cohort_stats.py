@@ -0,0 +1,216 @@
+"""Incrementally maintained age-bucket histograms of test metrics.
+
+``cohort_histogram`` holds one row per (age bucket, metric, value bin) with a count, a
+running sum and the smallest and largest value seen, which is enough for per-bucket
+counts, exact means, approximate quantiles and hexbin-style 2D bins. Rows are upserted in the same transaction that
+inserts the test, so the summary never needs a scan of ``test_details``.
+
+Recompute from raw rows and compare with the incremental state:
+
+    python -m cohort_stats rebuild [--check-only]
+"""
+import argparse
+import sys
+from collections import defaultdict
+
+
+AGE_BUCKET_WIDTH = 5
+
+# metric -> value bin width
+METRICS = {
+    "ap_hi": 5,
+    "ap_lo": 5,
+    "cholesterol": 1,
+    "gluc": 1,
+}
+
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+# ---------- STORAGE ----------
+# cohort_histogram is created by schema version 7
+def histogram_rows(samples):
+    """Aggregates ``(age, ap_hi, ap_lo, cholesterol, gluc)`` samples into sorted
+    ``(age_bucket, metric, value_bin, n, total, lo, hi)`` rows."""
+    cells = {}
+    for age, *values in samples:
+        age_bucket = age // AGE_BUCKET_WIDTH * AGE_BUCKET_WIDTH
+        for (metric, width), value in zip(METRICS.items(), values):
+            key = (age_bucket, metric, value // width * width)
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [1, value, value, value]
+            else:
+                cell[0] += 1
+                cell[1] += value
+                cell[2] = min(cell[2], value)
+                cell[3] = max(cell[3], value)
+    return [(*key, *cell) for key, cell in sorted(cells.items())]
+
+
+def record_tests(cursor, tests):
+    """Adds ``(appointment_id, ap_hi, ap_lo, cholesterol, gluc)`` tests to the summary.
+
+    Must run inside the transaction that inserts the tests. Rows are upserted in key order
+    so concurrent writers lock histogram rows in the same order.
+    """
+    if not tests:
+        return
+    query, params = age_lookup(tests)
+    cursor.execute(query, params)
+    rows = tests_to_rows(tests, dict(cursor.fetchall()))
+    if rows:
+        cursor.executemany(UPSERT_SQL, rows)
+
+
+UPSERT_SQL = (
+    "INSERT INTO cohort_histogram (age_bucket, metric, value_bin, n, total, lo, hi) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE n = n + VALUES(n), total = total + VALUES(total), "
+    "lo = LEAST(lo, VALUES(lo)), hi = GREATEST(hi, VALUES(hi))"
+)
+
+
+def age_lookup(tests):
+    appointment_ids = sorted({t[0] for t in tests})
+    placeholders = ", ".join(["%s"] * len(appointment_ids))
+    query = (f"SELECT a.appointment_id, pd.age FROM appointments a "
+             f"JOIN patient_details pd ON pd.patient_id = a.patient_id "
+             f"WHERE a.appointment_id IN ({placeholders})")
+    return query, appointment_ids
+
+
+def tests_to_rows(tests, ages):
+    return histogram_rows((ages[t[0]], *t[1:]) for t in tests if t[0] in ages)
+
+
+def load_rows(cursor):
+    cursor.execute("SELECT age_bucket, metric, value_bin, n, total, lo, hi FROM cohort_histogram "
+                   "ORDER BY age_bucket, metric, value_bin")
+    return [tuple(v if v is None or isinstance(v, str) else int(v) for v in row) for row in cursor.fetchall()]
+
+
+# ---------- SUMMARIES ----------
+def _quantile(bins, width, q):
+    """Approximate quantile from ``[(value_bin, n, lo, hi), ...]`` by interpolating between
+    the smallest and largest value seen in the bin, so the result stays within the observed
+    data. Rows without a range (written before schema version 8) use the bin bounds."""
+    count = sum(n for _, n, _, _ in bins)
+    target = q * count
+    seen = 0
+    for value_bin, n, lo, hi in bins:
+        if seen + n >= target:
+            if lo is None or hi is None:
+                lo, hi = value_bin, value_bin + width - 1
+            return lo + (hi - lo) * (target - seen) / n
+        seen += n
+    value_bin, _, _, hi = bins[-1]
+    return value_bin + width - 1 if hi is None else hi
+
+
+def summarize(rows, metrics=None):
+    """Turns histogram rows into per-metric age-bucket stats and 2D bins (size independent of test count)."""
+    grouped = defaultdict(lambda: defaultdict(list))
+    for age_bucket, metric, value_bin, n, total, lo, hi in rows:
+        grouped[metric][age_bucket].append((value_bin, n, total, lo, hi))
+
+    result = {}
+    for metric in metrics or METRICS:
+        width = METRICS[metric]
+        buckets, bins = [], []
+        for age_bucket in sorted(grouped[metric]):
+            cells = sorted(grouped[metric][age_bucket])
+            count = sum(n for _, n, _, _, _ in cells)
+            total = sum(t for _, _, t, _, _ in cells)
+            stats = {"age_bucket": age_bucket, "count": count, "mean": round(total / count, 3)}
+            quantile_bins = [(b, n, lo, hi) for b, n, _, lo, hi in cells]
+            for q in QUANTILES:
+                stats[f"p{int(q * 100)}"] = round(_quantile(quantile_bins, width, q), 3)
+            buckets.append(stats)
+            bins.extend([age_bucket, value_bin, n] for value_bin, n, _, _, _ in cells)
+        result[metric] = {"bin_width": width, "buckets": buckets, "bins": bins}
+    return {"age_bucket_width": AGE_BUCKET_WIDTH, "metrics": result}
+
+
+# ---------- REBUILD ----------
+def compute_rows(cursor):
+    """Recomputes the histogram from raw rows with GROUP BY on the database."""
+    rows = []
+    for metric, width in METRICS.items():
+        cursor.execute(
+            f"SELECT FLOOR(pd.age / {AGE_BUCKET_WIDTH}) * {AGE_BUCKET_WIDTH} AS age_bucket, "
+            f"FLOOR(td.{metric} / {width}) * {width} AS value_bin, COUNT(*), SUM(td.{metric}), "
+            f"MIN(td.{metric}), MAX(td.{metric}) "
+            f"FROM test_details td "
+            f"JOIN appointments a ON a.appointment_id = td.appointment_id "
+            f"JOIN patient_details pd ON pd.patient_id = a.patient_id "
+            f"GROUP BY age_bucket, value_bin"
+        )
+        rows.extend((int(age_bucket), metric, int(value_bin), int(n), int(total), int(lo), int(hi))
+                    for age_bucket, value_bin, n, total, lo, hi in cursor.fetchall())
+    return sorted(rows)
+
+
+def diff_rows(expected, actual):
+    expected = {row[:3]: row[3:] for row in expected}
+    actual = {row[:3]: row[3:] for row in actual}
+    return sorted(
+        (key, expected.get(key), actual.get(key))
+        for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    )
+
+
+def rebuild(conn, check_only=False):
+    """Recomputes the summary, reports differences from the incremental state and,
+    unless ``check_only``, replaces it. Returns the list of mismatched cells."""
+    cursor = conn.cursor()
+    try:
+        # Lock the summary so concurrent test inserts wait until the rebuild commits.
+        cursor.execute("SELECT COUNT(*) FROM cohort_histogram FOR UPDATE")
+        cursor.fetchall()
+        current = load_rows(cursor)
+        expected = compute_rows(cursor)
+        mismatches = diff_rows(expected, current)
+        if not check_only and mismatches:
+            cursor.execute("DELETE FROM cohort_histogram")
+            cursor.executemany(
+                "INSERT INTO cohort_histogram (age_bucket, metric, value_bin, n, total, lo, hi) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                expected,
+            )
+        conn.commit()
+        return mismatches
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    from app_config import settings
+    from db_pool import create_pool
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="recompute cohort_histogram from raw test rows")
+    rebuild_cmd.add_argument("--check-only", action="store_true", help="only report differences")
+    args = parser.parse_args(argv)
+
+    pool = create_pool(settings)
+    conn = pool.get_connection()
+    try:
+        mismatches = rebuild(conn, check_only=args.check_only)
+    finally:
+        conn.close()
+        pool.close()
+
+    for key, expected, actual in mismatches:
+        print(f"mismatch {key}: expected (n, total, lo, hi)={expected} incremental={actual}")
+    if not mismatches:
+        print("cohort_histogram matches the raw test data")
+    elif not args.check_only:
+        print(f"rebuilt cohort_histogram ({len(mismatches)} cells corrected)")
+    return 1 if mismatches and args.check_only else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import io
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException, Response
+
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+FORMATS = {
+    "json": "application/json",
+    "arrow": ARROW_STREAM,
+    "parquet": PARQUET,
+}
+
+_ACCEPT_ALIASES = {
+    ARROW_STREAM: "arrow",
+    "application/vnd.apache.arrow.file": "arrow",
+    PARQUET: "parquet",
+    "application/x-parquet": "parquet",
+}
+
+
+# ---------- CONTENT NEGOTIATION ----------
+def negotiate_format(request, explicit=None):
+    """Picks json/arrow/parquet from an explicit ``format`` parameter or the Accept header."""
+    if explicit:
+        if explicit not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format '{explicit}'")
+        return explicit
+    for part in request.headers.get("accept", "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in _ACCEPT_ALIASES:
+            return _ACCEPT_ALIASES[media_type]
+    return "json"
+
+
+# ---------- ENCODING ----------
+def cursor_to_table(cursor, batch_size=10000):
+    """Builds an Arrow table column by column from an executed tuple cursor."""
+    names = list(cursor.column_names)
+    columns = [[] for _ in names]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for values, column in zip(zip(*rows), columns):
+            column.extend(values)
+    return pa.table({name: pa.array(column) for name, column in zip(names, columns)})
+
+
+def tuples_to_table(names, rows):
+    """Builds an Arrow table from already fetched tuple rows (e.g. from an async cursor)."""
+    columns = zip(*rows) if rows else [() for _ in names]
+    return pa.table({name: pa.array(list(column)) for name, column in zip(names, columns)})
+
+
+def encode_table(table, fmt):
+    if fmt == "arrow":
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        return buffer.getvalue()
+    raise ValueError(f"Not a columnar format: {fmt}")
+
+
+def table_response(table, fmt, headers=None):
+    return Response(content=encode_table(table, fmt), media_type=FORMATS[fmt], headers=headers)
+
+
+# ---------- DECODING (clients) ----------
+def decode_response(content, media_type):
+    """Decodes a columnar response body into a pandas DataFrame."""
+    media_type = media_type.split(";")[0].strip().lower()
+    if media_type == ARROW_STREAM:
+        return pa.ipc.open_stream(content).read_pandas()
+    if media_type in (PARQUET, "application/x-parquet"):
+        return pq.read_table(io.BytesIO(content)).to_pandas()
+    raise ValueError(f"Not a columnar media type: {media_type}")
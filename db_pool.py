@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import deque
+from mysql.connector.errors import PoolError
+from storage import Error, connector, replica_connector
+from metrics import TimedCursor
+
+
+# ---------- POOLED CONNECTION ----------
+class PooledConnection:
+    """Proxy handed out by the pool; ``close()`` returns the connection instead of closing it."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._conn, name)
+
+    @property
+    def role(self):
+        return self._pool.role
+
+    def cursor(self, *args, **kwargs):
+        if self._conn is None:
+            raise PoolError("Connection has already been returned to the pool")
+        cursor = self._conn.cursor(*args, **kwargs)
+        if self._pool.observe_query is not None:
+            return TimedCursor(cursor, self._pool.observe_query)
+        return cursor
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- CONNECTION POOL ----------
+class ConnectionPool:
+    def __init__(self, connect, pool_size=10, max_overflow=5, timeout=10.0, pre_ping=True, observe_query=None,
+                 role="primary"):
+        self.connect = connect
+        # "primary" or "replica"; handlers check conn.role to tell where a read was served from
+        self.role = role
+        # Called as observe_query(query, seconds, failed=False) for every statement when set
+        self.observe_query = observe_query
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._opened = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        return self.connect()
+
+    def _healthy(self, conn):
+        if not self.pre_ping:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def get_connection(self, timeout=None):
+        """Borrows a connection, waiting up to ``timeout`` seconds (default: the pool's) for one
+        to be returned when the pool is at its limit."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._opened < self.pool_size + self.max_overflow:
+                    conn = None
+                    self._opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolError(f"Timed out after {timeout}s waiting for a database connection")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            self._in_use += 1
+
+        # Connecting and pinging happen outside the lock so slow I/O never blocks other borrowers.
+        try:
+            if conn is not None and not self._healthy(conn):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            keep = True
+        except Error:
+            keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            if keep and not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                conn = None
+            else:
+                self._opened -= 1
+            self._cond.notify()
+
+        if conn is not None:
+            self._discard(conn)
+
+    def close(self, drain_timeout=30.0):
+        # Stop handing out connections, wait for borrowers to return theirs, then close everything.
+        deadline = time.monotonic() + drain_timeout
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            while self._in_use and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            idle, self._idle = list(self._idle), deque()
+            self._opened -= len(idle)
+        for conn in idle:
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "overflow": max(0, self._opened - self.pool_size),
+                "waiters": self._waiters,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_time_total": round(self._wait_total, 6),
+                "wait_time_avg": round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+                "wait_time_max": round(self._wait_max, 6),
+                "closed": self._closed,
+            }
+
+
+def create_pool(settings, observe_query=None):
+    return ConnectionPool(
+        connector(settings),
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        timeout=settings.db_pool_timeout,
+        pre_ping=settings.db_pool_pre_ping,
+        observe_query=observe_query,
+    )
+
+
+def create_replica_pool(settings, observe_query=None):
+    """Pool for the read replica, or None when no replica is configured."""
+    connect = replica_connector(settings)
+    if connect is None:
+        return None
+    return ConnectionPool(
+        connect,
+        pool_size=settings.db_replica_pool_size,
+        max_overflow=settings.db_max_overflow,
+        timeout=settings.db_pool_timeout,
+        pre_ping=settings.db_pool_pre_ping,
+        observe_query=observe_query,
+        role="replica",
+    )
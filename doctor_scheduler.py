@@ -0,0 +1,276 @@
+import heapq
+import threading
+import time
+from fastapi import HTTPException
+from storage import Error
+
+
+# ---------- LOADERS ----------
+def load_roster(conn):
+    """Returns ``{doctor_id: daily_capacity or None}``; a ``daily_capacity`` column on
+    ``doctors`` is honoured when present."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM doctors")
+        return {row["doctor_id"]: row.get("daily_capacity") for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def load_counts(conn, date=None, since=None):
+    """Returns ``{(date, doctor_id): bookings}`` for one date or for every date from ``since``."""
+    cursor = conn.cursor()
+    try:
+        query = "SELECT appointment_date, doctor_id, COUNT(*) FROM appointments"
+        if date is not None:
+            cursor.execute(query + " WHERE appointment_date = %s GROUP BY appointment_date, doctor_id", (date,))
+        else:
+            cursor.execute(query + " WHERE appointment_date >= %s GROUP BY appointment_date, doctor_id", (since,))
+        return {(d, doctor_id): n for d, doctor_id, n in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+# ---------- CAPACITY CHECK ----------
+# Each worker process has its own scheduler, so capacity is also checked in the booking
+# transaction: locking the doctor row serialises bookings of that doctor across processes,
+# and the count then includes every committed booking.
+DOCTOR_LOCK = "SELECT doctor_id FROM doctors WHERE doctor_id = %s FOR UPDATE"
+BOOKINGS_COUNT = "SELECT COUNT(*) FROM appointments WHERE doctor_id = %s AND appointment_date = %s"
+
+# Doctors tried per booking when the database finds the assigned one already full
+BOOKING_ATTEMPTS = 3
+
+
+def has_room(cursor, doctor_id, date, capacity):
+    """True if ``doctor_id`` has fewer than ``capacity`` bookings on ``date``; run inside the
+    transaction that inserts the booking."""
+    if capacity is None:
+        return True
+    cursor.execute(DOCTOR_LOCK, (doctor_id,))
+    cursor.fetchall()
+    cursor.execute(BOOKINGS_COUNT, (doctor_id, date))
+    return cursor.fetchone()[0] < capacity
+
+
+# ---------- SCHEDULER ----------
+class _Day:
+    def __init__(self, doctors, counts, is_full):
+        # Reserved by assign but not yet confirmed or released, i.e. not (yet) in the database
+        self.pending = {}
+        # Confirmed while a refresh was reading the database, which may have missed them
+        self.confirmed = {}
+        self.reset(doctors, counts, is_full)
+
+    def reset(self, doctors, counts, is_full):
+        """Replaces the counts with the database's, keeping this process's reservations."""
+        self.counts = {doctor_id: counts.get(doctor_id, 0) + self.pending.get(doctor_id, 0)
+                       + self.confirmed.get(doctor_id, 0) for doctor_id in doctors}
+        self.rebuild(is_full)
+
+    def rebuild(self, is_full):
+        self.heap = [(n, doctor_id) for doctor_id, n in self.counts.items() if not is_full(doctor_id, n)]
+        heapq.heapify(self.heap)
+
+
+class DoctorScheduler:
+    """Assigns the least-loaded doctor for a date from in-memory booking counts.
+
+    Each date keeps a min-heap of ``(bookings, doctor_id)`` with lazy deletion: stale entries
+    are dropped when popped, so assign/release are O(log n). Doctors at capacity are kept
+    out of the heap until a booking is released. A background thread (``start``) re-reads
+    the roster and the loaded dates every ``refresh_interval`` seconds.
+    """
+
+    def __init__(self, get_connection, default_capacity=None, refresh_interval=300.0):
+        self.get_connection = get_connection
+        self.default_capacity = default_capacity or None
+        self.refresh_interval = refresh_interval
+        self._roster = {}
+        self._days = {}
+        self._lock = threading.Lock()
+        # Serialises refreshes (background thread and /scheduler/refresh)
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._loaded_at = 0.0
+        self._assignments = 0
+        self._rejections = 0
+
+    def _capacity(self, doctor_id):
+        return self._roster.get(doctor_id) or self.default_capacity
+
+    def capacity(self, doctor_id):
+        """Daily capacity of ``doctor_id``, or None when unlimited."""
+        with self._lock:
+            return self._capacity(doctor_id)
+
+    def _is_full(self, doctor_id, count):
+        capacity = self._capacity(doctor_id)
+        return capacity is not None and count >= capacity
+
+    # Loading -------------------------------------------------------------
+    def warm(self, since):
+        """Loads the roster and the booking counts for every date from ``since``."""
+        conn = self.get_connection()
+        try:
+            roster = load_roster(conn)
+            counts = load_counts(conn, since=since)
+        finally:
+            conn.close()
+        by_date = {}
+        for (date, doctor_id), n in counts.items():
+            by_date.setdefault(date, {})[doctor_id] = n
+        with self._lock:
+            self._roster = roster
+            self._days = {date: _Day(roster, c, self._is_full) for date, c in by_date.items()}
+            self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        """Re-reads the roster (e.g. after doctors were added or removed) and the counts of
+        the loaded dates, in place. Reservations that are not committed yet, and bookings
+        confirmed while the counts were read, are added on top, so the counts may briefly run
+        high but never low."""
+        with self._refresh_lock:
+            with self._lock:
+                dates = list(self._days)
+                for date in dates:
+                    self._days[date].confirmed.clear()
+                self._refreshing = True
+            try:
+                conn = self.get_connection()
+                try:
+                    roster = load_roster(conn)
+                    counts = load_counts(conn, since=min(dates)) if dates else {}
+                finally:
+                    conn.close()
+                by_date = {}
+                for (date, doctor_id), n in counts.items():
+                    by_date.setdefault(date, {})[doctor_id] = n
+                with self._lock:
+                    self._roster = roster
+                    # Dates loaded meanwhile are already fresh and keep their state
+                    for date in dates:
+                        self._days[date].reset(roster, by_date.get(date, {}), self._is_full)
+                    self._loaded_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="doctor-scheduler-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Error as e:
+                print("Error occurred:", e)
+
+    def needs_load(self, date):
+        return date not in self._days
+
+    def load_date(self, date):
+        if date in self._days:
+            return
+        conn = self.get_connection()
+        try:
+            counts = load_counts(conn, date=date)
+        finally:
+            conn.close()
+        with self._lock:
+            if date not in self._days:
+                self._days[date] = _Day(self._roster, {doctor_id: n for (_, doctor_id), n in counts.items()}, self._is_full)
+
+    # Hot path ------------------------------------------------------------
+    def assign(self, date):
+        """Reserves the least-loaded doctor with spare capacity on ``date``; call ``confirm``
+        once the booking is committed, or ``release`` if it is not persisted."""
+        while True:
+            with self._lock:
+                if not self._roster:
+                    raise HTTPException(status_code=503, detail="No doctors available")
+                day = self._days.get(date)
+                if day is not None:
+                    doctor_id = self._take(day)
+                    break
+            self.load_date(date)
+        if doctor_id is None:
+            raise HTTPException(status_code=409, detail=f"All doctors are fully booked on {date}")
+        return doctor_id
+
+    def _take(self, day):
+        while day.heap:
+            count, doctor_id = heapq.heappop(day.heap)
+            if day.counts.get(doctor_id) != count or doctor_id not in self._roster:
+                continue
+            count += 1
+            day.counts[doctor_id] = count
+            day.pending[doctor_id] = day.pending.get(doctor_id, 0) + 1
+            if not self._is_full(doctor_id, count):
+                heapq.heappush(day.heap, (count, doctor_id))
+            self._assignments += 1
+            return doctor_id
+        self._rejections += 1
+        return None
+
+    def confirm(self, date, doctor_id):
+        with self._lock:
+            day = self._days.get(date)
+            if day is None or not day.pending.get(doctor_id):
+                return
+            day.pending[doctor_id] -= 1
+            if self._refreshing:
+                day.confirmed[doctor_id] = day.confirmed.get(doctor_id, 0) + 1
+
+    def mark_full(self, date, doctor_id):
+        """Drops a reservation the database refused because other processes have filled the
+        doctor's day (see ``has_room``); the doctor gets no more bookings that day until a
+        refresh finds room."""
+        with self._lock:
+            day = self._days.get(date)
+            if day is None or doctor_id not in day.counts:
+                return
+            if day.pending.get(doctor_id):
+                day.pending[doctor_id] -= 1
+            capacity = self._capacity(doctor_id)
+            if capacity is not None:
+                # Heap entries of the doctor no longer match its count, so they are skipped
+                day.counts[doctor_id] = max(day.counts[doctor_id], capacity)
+
+    def release(self, date, doctor_id):
+        with self._lock:
+            day = self._days.get(date)
+            if day is None or doctor_id not in day.counts:
+                return
+            if day.pending.get(doctor_id):
+                day.pending[doctor_id] -= 1
+            day.counts[doctor_id] = max(0, day.counts[doctor_id] - 1)
+            heapq.heappush(day.heap, (day.counts[doctor_id], doctor_id))
+            # Releases leave stale entries behind; compact before they dominate the heap.
+            if len(day.heap) > 2 * len(day.counts) + 16:
+                day.rebuild(self._is_full)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "doctors": len(self._roster),
+                "dates_loaded": len(self._days),
+                "default_capacity": self.default_capacity,
+                "assignments": self._assignments,
+                "rejections": self._rejections,
+                "seconds_since_refresh": round(time.monotonic() - self._loaded_at, 1),
+            }
+
+    def day_loads(self, date):
+        with self._lock:
+            day = self._days.get(date)
+            return dict(day.counts) if day else {}
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+import analysis_sync
+
+
+# ---------- GROUP COMMIT ----------
+class _Write:
+    __slots__ = ("apply", "stamp", "done", "result", "error")
+
+    def __init__(self, apply, stamp):
+        self.apply = apply
+        self.stamp = stamp
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitQueue:
+    """Write-behind stage that runs single-row writes from concurrent requests in shared
+    transactions, so one commit (and one fsync) covers a whole batch.
+
+    ``submit`` blocks until the batch holding the write has committed, so a request is only
+    acknowledged once its row is durable. A committer thread takes the writes that arrive
+    within ``window`` seconds of the first (at most ``max_batch``) and runs each under its
+    own savepoint: a write that fails is rolled back alone and its error is raised to its
+    caller. If the commit itself fails, the batch is replayed one transaction per write.
+
+    With ``window=0`` a batch is whatever queued up while the previous one committed, which
+    adds no wait at low load; a longer window only pays off when every commit costs an fsync.
+    """
+
+    def __init__(self, get_connection, window=0.0, max_batch=100, workers=1, observe=None):
+        self.get_connection = get_connection
+        self.window = window
+        self.max_batch = max_batch
+        # observe(batch_size, commit_seconds) after every batch, e.g. for /metrics
+        self.observe = observe
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._batches = 0
+        self._writes = 0
+        self._failed = 0
+        self._replayed = 0
+        self._max_batch_seen = 0
+        self._threads = [threading.Thread(target=self._run, name=f"group-commit-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, apply, stamp=()):
+        """Runs ``apply(cursor)`` in the next batch and returns its result once the batch has
+        committed. ``stamp`` lists the test IDs the write inserts; the batch stamps them for
+        ``analysis_sync`` as its last statement."""
+        write = _Write(apply, stamp)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            self._pending.append(write)
+            self._cond.notify()
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._commit_batch(batch)
+            except Exception:
+                self._replay(batch)
+            for write in batch:
+                write.done.set()
+
+    def _commit_batch(self, batch):
+        start = time.perf_counter()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            for i, write in enumerate(batch):
+                cursor.execute(f"SAVEPOINT write_{i}")
+                try:
+                    write.result = write.apply(cursor)
+                except Exception as e:
+                    # Raises if the transaction itself was lost (e.g. a deadlock rollback),
+                    # which sends the whole batch to the replay path
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT write_{i}")
+                    write.error = e
+            analysis_sync.stamp_tests(cursor, [test_id for w in batch if w.error is None for test_id in w.stamp])
+            conn.commit()
+        except Exception:
+            for write in batch:
+                write.result = write.error = None
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        self._record(batch, time.perf_counter() - start)
+
+    def _replay(self, batch):
+        for write in batch:
+            start = time.perf_counter()
+            try:
+                conn = self.get_connection()
+            except Exception as e:
+                write.error = e
+                continue
+            cursor = conn.cursor()
+            try:
+                write.result = write.apply(cursor)
+                analysis_sync.stamp_tests(cursor, list(write.stamp))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                write.error = e
+            finally:
+                cursor.close()
+                conn.close()
+            self._record([write], time.perf_counter() - start, replayed=True)
+
+    def _record(self, batch, seconds, replayed=False):
+        failed = sum(1 for write in batch if write.error is not None)
+        with self._cond:
+            self._batches += 1
+            self._writes += len(batch)
+            self._failed += failed
+            self._replayed += len(batch) if replayed else 0
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+        if self.observe:
+            self.observe(len(batch), seconds)
+
+    def close(self, timeout=30.0):
+        """Commits what is queued, then stops the committer threads."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "batches": self._batches,
+                "writes": self._writes,
+                "failed_writes": self._failed,
+                "replayed_writes": self._replayed,
+                "mean_batch_size": self._writes / self._batches if self._batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "window_ms": self.window * 1000,
+            }
+
+
+def create_write_queue(settings, get_connection, observe=None):
+    """Returns a started queue when HEALTHCARE_WRITE_QUEUE_ENABLED is set, otherwise None."""
+    if not settings.write_queue_enabled:
+        return None
+    return GroupCommitQueue(get_connection, settings.write_queue_window_ms / 1000,
+                            settings.write_queue_max_batch, settings.write_queue_workers, observe)
@@ -0,0 +1,99 @@
+import threading
+
+
+# IDs stay in the 8-digit keyspace the tables already use.
+ID_MIN = 10000000
+ID_MAX = 99999999
+
+ID_COLUMNS = {
+    "patient_details": "patient_id",
+    "appointments": "appointment_id",
+    "test_details": "test_id",
+    "prescriptions": "prescription_id",
+}
+
+
+# ---------- BLOCK RESERVATION ----------
+class MySQLBlockReserver:
+    """Reserves contiguous ID ranges from the ``id_blocks`` table.
+
+    One short transaction per block: the counter row is locked, advanced by
+    ``size`` and any IDs in the range that are already used (e.g. legacy
+    random IDs) are returned so the allocator can skip them.
+    """
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+
+
+    def __call__(self, table, size):
+        column = ID_COLUMNS[table]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("INSERT IGNORE INTO id_blocks (name, next_id) VALUES (%s, %s)", (table, ID_MIN))
+            cursor.execute("SELECT next_id FROM id_blocks WHERE name = %s FOR UPDATE", (table,))
+            start = cursor.fetchone()[0]
+            if start + size - 1 > ID_MAX:
+                start = ID_MIN
+            end = start + size - 1
+            cursor.execute("UPDATE id_blocks SET next_id = %s WHERE name = %s", (end + 1, table))
+            cursor.execute(f"SELECT {column} FROM {table} WHERE {column} BETWEEN %s AND %s", (start, end))
+            taken = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+            return start, end, taken
+        finally:
+            cursor.close()
+            conn.close()
+
+
+# ---------- ALLOCATOR ----------
+class _Block:
+    def __init__(self, start, end, taken):
+        self.next = start
+        self.end = end
+        self.taken = taken
+
+
+class IdAllocator:
+    """Hands out unique IDs from in-memory blocks; only a block refill touches the database."""
+
+    def __init__(self, reserve_block, block_size=1000):
+        self.reserve_block = reserve_block
+        self.block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _take(self, table):
+        block = self._blocks.get(table)
+        while block is not None and block.next <= block.end:
+            value = block.next
+            block.next += 1
+            if value not in block.taken:
+                return value
+        return None
+
+    def next_id(self, table):
+        return self.next_ids(table, 1)[0]
+
+    def next_id_nowait(self, table):
+        """Returns an ID only if one is available without waiting (for event-loop callers),
+        otherwise None; the caller should then fall back to ``next_id`` in a worker thread."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._take(table)
+        finally:
+            self._lock.release()
+
+    def next_ids(self, table, count):
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                value = self._take(table)
+                if value is None:
+                    start, end, taken = self.reserve_block(table, max(self.block_size, count - len(ids)))
+                    self._blocks[table] = _Block(start, end, taken)
+                    continue
+                ids.append(value)
+        return ids
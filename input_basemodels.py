@@ -1,5 +1,7 @@
 from pydantic import BaseModel
+from typing import Dict, List, Optional
 import datetime
+from risk_scoring import RiskRule
 
 class PatientBase(BaseModel):
     name: str
@@ -31,4 +33,12 @@ class Prescription(BaseModel):
     prescribed_date: datetime.date
     medicine_name: str
     dosage: str
-    duration_days: int
\ No newline at end of file
+    duration_days: int
+
+class RiskEvaluation(BaseModel):
+    # Candidate rule to evaluate; the configured rule when omitted
+    rule: Optional[RiskRule] = None
+    # Inline records ({field: value}) scored without touching the database
+    tests: Optional[List[Dict[str, Optional[float]]]] = None
+    # Stored tests to score; with neither tests nor appointment_ids the whole cohort is scored
+    appointment_ids: Optional[List[int]] = None
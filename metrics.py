@@ -0,0 +1,219 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+
+logger = logging.getLogger("healthcare.slow_query")
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the group-commit batch size histogram
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Distinct normalized statements tracked before the rest are folded into "other", so ad-hoc
+# /fetch column and filter combinations cannot grow the label set without bound.
+MAX_QUERY_LABELS = 500
+
+
+# ---------- QUERY NORMALIZATION ----------
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)", re.I)
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_query(query):
+    """Collapses whitespace, literals and IN lists so one statement shape maps to one label."""
+    query = _IN_LIST.sub("IN (...)", query)
+    query = _STRING.sub("?", query)
+    query = _NUMBER.sub("?", query)
+    return _SPACE.sub(" ", query).strip()
+
+
+# ---------- REGISTRY ----------
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """In-process request and SQL metrics rendered in the Prometheus text format.
+
+    Recording is a dict lookup and a few integer updates under one lock, so it can stay on
+    in production (see ``benchmarks.metrics_overhead``).
+    """
+
+    def __init__(self, slow_query_seconds=0.2):
+        self.slow_query_seconds = slow_query_seconds
+        self.in_flight = 0
+        self._requests = {}
+        self._responses = {}
+        self._queries = {}
+        self._slow = {}
+        self._errors = {}
+        self._batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self._batch_commits = Histogram()
+        self._lock = threading.Lock()
+
+    def observe_request(self, method, route, status, seconds):
+        with self._lock:
+            key = (method, route)
+            hist = self._requests.get(key)
+            if hist is None:
+                hist = self._requests[key] = Histogram()
+            hist.observe(seconds)
+            key = (method, route, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def requests_total(self):
+        with self._lock:
+            return sum(self._responses.values())
+
+    def observe_query(self, query, seconds, failed=False):
+        label = normalize_query(query)
+        with self._lock:
+            hist = self._queries.get(label)
+            if hist is None:
+                if len(self._queries) >= MAX_QUERY_LABELS:
+                    label = "other"
+                hist = self._queries.setdefault(label, Histogram())
+            hist.observe(seconds)
+            if failed:
+                self._errors[label] = self._errors.get(label, 0) + 1
+            slow = seconds >= self.slow_query_seconds
+            if slow:
+                self._slow[label] = self._slow.get(label, 0) + 1
+        if slow:
+            logger.warning("slow query (%.1f ms): %s", seconds * 1000, label)
+
+    def observe_write_batch(self, size, seconds):
+        with self._lock:
+            self._batch_sizes.observe(size)
+            self._batch_commits.observe(seconds)
+
+    def render(self, gauges=None):
+        """Prometheus text exposition; ``gauges`` maps a metric prefix to a stats dict
+        (e.g. pool stats) whose numeric values are exported as gauges."""
+        lines = ["# TYPE healthcare_http_requests_in_flight gauge",
+                 f"healthcare_http_requests_in_flight {self.in_flight}"]
+        with self._lock:
+            _histograms(lines, "healthcare_http_request_duration_seconds",
+                        {f'method="{m}",route="{_escape(r)}"': h for (m, r), h in self._requests.items()})
+            _counters(lines, "healthcare_http_responses_total",
+                      {f'method="{m}",route="{_escape(r)}",status="{s}"': n for (m, r, s), n in self._responses.items()})
+            _histograms(lines, "healthcare_sql_query_duration_seconds",
+                        {f'query="{_escape(q)}"': h for q, h in self._queries.items()})
+            _counters(lines, "healthcare_sql_slow_queries_total",
+                      {f'query="{_escape(q)}"': n for q, n in self._slow.items()})
+            _counters(lines, "healthcare_sql_errors_total",
+                      {f'query="{_escape(q)}"': n for q, n in self._errors.items()})
+            if self._batch_sizes.count:
+                _histograms(lines, "healthcare_write_batch_size", {"": self._batch_sizes})
+                _histograms(lines, "healthcare_write_batch_commit_seconds", {"": self._batch_commits})
+        for prefix, stats in (gauges or {}).items():
+            for name, value in stats.items():
+                if isinstance(value, (bool, int, float)):
+                    lines.append(f"# TYPE {prefix}_{name} gauge")
+                    lines.append(f"{prefix}_{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histograms(lines, name, series):
+    lines.append(f"# TYPE {name} histogram")
+    for labels, hist in series.items():
+        cumulative = 0
+        bucket_labels = f"{labels}," if labels else ""
+        for bound, count in zip(hist.buckets, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{bucket_labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{bucket_labels}le="+Inf"}} {hist.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {hist.sum}")
+        lines.append(f"{name}_count{suffix} {hist.count}")
+
+
+def _counters(lines, name, series):
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in series.items():
+        lines.append(f"{name}{{{labels}}} {value}")
+
+
+# ---------- INSTRUMENTATION ----------
+class TimedCursor:
+    """Cursor proxy that reports the duration of every execute/executemany. For unbuffered
+    cursors this covers execution up to the first result, not the row transfer."""
+
+    def __init__(self, cursor, observe):
+        self._cursor = cursor
+        self._observe = observe
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, query, params):
+        start = time.perf_counter()
+        try:
+            result = method(query, params)
+        except Exception:
+            self._observe(query, time.perf_counter() - start, failed=True)
+            raise
+        self._observe(query, time.perf_counter() - start)
+        return result
+
+    def execute(self, query, params=()):
+        return self._timed(self._cursor.execute, query, params)
+
+    def executemany(self, query, seq_params):
+        return self._timed(self._cursor.executemany, query, seq_params)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight count per route template.
+    Timing ends when the response body has been sent, so streamed responses are included."""
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        # Runs on the event loop thread only, so the gauge needs no lock
+        self.registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.registry.in_flight -= 1
+            route = scope.get("route")
+            # Route templates keep the label set bounded; unmatched paths share one label
+            self.registry.observe_request(scope["method"], route.path if route else "unmatched",
+                                          status, time.perf_counter() - start)
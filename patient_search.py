@@ -0,0 +1,248 @@
+"""Patient name search for typeahead lookups.
+
+Every word of a patient's name is stored in ``patient_search_terms`` together with its
+Soundex code (prefixed with ``~``), in the same transaction that inserts the patient.
+A search is then an index range per query word: prefix matches come first, in term
+order, and if they do not fill the page, names that sound alike (``jon smyth`` for
+``John Smith``) follow. The cost depends on the page size, not on the number of patients.
+
+Patients inserted before schema version 6, or by direct SQL, are indexed with:
+
+    python -m patient_search rebuild
+    python -m patient_search status     # count patients missing from the index
+"""
+import argparse
+import difflib
+import re
+import sys
+import unicodedata
+
+
+TERM_INSERT = "INSERT IGNORE INTO patient_search_terms (term, patient_id) VALUES (%s, %s)"
+
+# Matches the term column width (schema version 6)
+MAX_TERM_LENGTH = 64
+
+# Query words shorter than this only match as prefixes; phonetic codes of a couple of
+# typed letters match too much to be useful
+MIN_PHONETIC_LENGTH = 3
+# Soundex keeps little more than the first letter of some words ("zzqx" codes like "zoe"),
+# so a phonetic match must also be spelled similarly (difflib ratio) to a word of the name
+MIN_PHONETIC_SIMILARITY = 0.6
+
+REBUILD_CHUNK = 5000
+
+_WORD = re.compile(r"[^\W_]+")
+_SOUNDEX = {c: str(d) for d, letters in enumerate(("aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"))
+            for c in letters}
+
+
+# ---------- TERMS ----------
+def words(text):
+    """Lower-case words of ``text`` with accents removed (``"José-Luis"`` -> ``["jose", "luis"]``)."""
+    folded = "".join(c for c in unicodedata.normalize("NFKD", text or "") if not unicodedata.combining(c))
+    return [w[:MAX_TERM_LENGTH] for w in _WORD.findall(folded.casefold())]
+
+
+def soundex(word):
+    """American Soundex code of an ASCII word, or None if it has no letters to code."""
+    letters = [c for c in word if "a" <= c <= "z"]
+    if not letters:
+        return None
+    code, last = letters[0].upper(), _SOUNDEX[letters[0]]
+    for c in letters[1:]:
+        digit = _SOUNDEX[c]
+        if digit != "0" and digit != last:
+            code += digit
+        # h and w do not separate letters with the same code; vowels do
+        if c not in "hw":
+            last = digit
+    return (code + "000")[:4]
+
+
+def terms(name):
+    found = set()
+    for word in words(name):
+        found.add(word)
+        code = soundex(word)
+        if code:
+            found.add("~" + code.lower())
+    return found
+
+
+def term_rows(patients):
+    """``(term, patient_id)`` rows for ``(patient_id, name)`` pairs, sorted so concurrent
+    writers lock index entries in the same order."""
+    return sorted((term, patient_id) for patient_id, name in patients for term in terms(name))
+
+
+def index_patients(cursor, patients):
+    """Adds ``(patient_id, name)`` pairs to the search index. Runs inside the transaction
+    that inserts the patients."""
+    rows = term_rows(patients)
+    if rows:
+        cursor.executemany(TERM_INSERT, rows)
+
+
+# ---------- QUERIES ----------
+def _prefix_range(prefix):
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _filters(age_min, age_max, gender):
+    clauses, params = [], []
+    if age_min is not None:
+        clauses.append("p.age >= %s")
+        params.append(age_min)
+    if age_max is not None:
+        clauses.append("p.age <= %s")
+        params.append(age_max)
+    if gender is not None:
+        clauses.append("p.gender = %s")
+        params.append(gender)
+    return clauses, params
+
+
+def _word_match(word, phonetic):
+    """Condition on alias ``t`` matching ``word`` as a prefix (or by sound when ``phonetic``)."""
+    clause, params = "(t.term >= %s AND t.term < %s)", list(_prefix_range(word))
+    code = soundex(word) if phonetic and len(word) >= MIN_PHONETIC_LENGTH else None
+    if code:
+        clause = f"({clause} OR t.term = %s)"
+        params.append("~" + code.lower())
+    return clause, params
+
+
+def search_query(q, age_min=None, age_max=None, gender=None, limit=20, phonetic=False):
+    """``(query, params)`` for one page of matches, or None if ``q`` has no words.
+
+    The longest word drives the scan through the term index in order, so the page ends after
+    ``limit`` rows however many patients match; the other words are checked per candidate.
+    With ``phonetic`` the driving word matches by Soundex code instead of prefix."""
+    query_words = sorted(set(words(q)), key=len, reverse=True)
+    if not query_words:
+        return None
+    driver, others = query_words[0], query_words[1:]
+    code = soundex(driver) if phonetic and len(driver) >= MIN_PHONETIC_LENGTH else None
+    if phonetic and not code:
+        return None
+    if code:
+        clauses, params = ["t.term = %s"], ["~" + code.lower()]
+        order = "t.patient_id"
+    else:
+        clauses, params = ["t.term >= %s AND t.term < %s"], list(_prefix_range(driver))
+        order = "t.term, t.patient_id"
+    for word in others:
+        match, match_params = _word_match(word, phonetic)
+        clauses.append("EXISTS (SELECT 1 FROM patient_search_terms t2 WHERE t2.patient_id = t.patient_id AND "
+                       + match.replace("t.term", "t2.term") + ")")
+        params.extend(match_params)
+    filter_clauses, filter_params = _filters(age_min, age_max, gender)
+    clauses.extend(filter_clauses)
+    params.extend(filter_params)
+    query = ("SELECT p.* FROM patient_search_terms t JOIN patient_details p ON p.patient_id = t.patient_id "
+             f"WHERE {' AND '.join(clauses)} ORDER BY {order} LIMIT %s")
+    # A name with two words matching the same prefix yields two index entries
+    params.append(limit * 2)
+    return query, params
+
+
+def _spelled_alike(q, name):
+    name_words = words(name)
+    return all(any(difflib.SequenceMatcher(None, word, other).ratio() >= MIN_PHONETIC_SIMILARITY
+                   or other.startswith(word) for other in name_words)
+               for word in words(q))
+
+
+def search(cursor, q, age_min=None, age_max=None, gender=None, limit=20, fuzzy=True):
+    """Up to ``limit`` patient rows (dictionary cursor) matching ``q``, each with a ``match``
+    key: ``id`` for an exact patient ID, then ``prefix``, then ``phonetic``."""
+    results, seen = [], set()
+
+    def add(rows, match):
+        for row in rows:
+            if len(results) < limit and row["patient_id"] not in seen:
+                seen.add(row["patient_id"])
+                results.append({**row, "match": match})
+
+    if q.strip().isdigit():
+        clauses, params = _filters(age_min, age_max, gender)
+        cursor.execute(" AND ".join(["SELECT p.* FROM patient_details p WHERE p.patient_id = %s", *clauses]),
+                       [int(q), *params])
+        add(cursor.fetchall(), "id")
+    for phonetic in (False, True) if fuzzy else (False,):
+        if len(results) >= limit:
+            break
+        built = search_query(q, age_min, age_max, gender, limit, phonetic)
+        if built:
+            cursor.execute(*built)
+            rows = cursor.fetchall()
+            if phonetic:
+                rows = [row for row in rows if _spelled_alike(q, row["name"])]
+            add(rows, "phonetic" if phonetic else "prefix")
+    return results
+
+
+# ---------- MAINTENANCE ----------
+def unindexed(cursor):
+    cursor.execute("SELECT COUNT(*) FROM patient_details p WHERE NOT EXISTS "
+                   "(SELECT 1 FROM patient_search_terms t WHERE t.patient_id = p.patient_id)")
+    return cursor.fetchone()[0]
+
+
+def rebuild(conn, chunk_size=REBUILD_CHUNK, log=print):
+    """Re-indexes every patient in committed chunks; returns the number of patients indexed.
+    Patients inserted meanwhile index themselves, so the API can keep running."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM patient_search_terms")
+        conn.commit()
+        after, total = None, 0
+        while True:
+            if after is None:
+                cursor.execute("SELECT patient_id, name FROM patient_details ORDER BY patient_id LIMIT %s", (chunk_size,))
+            else:
+                cursor.execute("SELECT patient_id, name FROM patient_details WHERE patient_id > %s "
+                               "ORDER BY patient_id LIMIT %s", (after, chunk_size))
+            patients = cursor.fetchall()
+            if not patients:
+                return total
+            index_patients(cursor, patients)
+            conn.commit()
+            after = patients[-1][0]
+            total += len(patients)
+            log(f"indexed {total} patients")
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    from app_config import settings
+    from db_pool import create_pool
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="re-index every patient name")
+    sub.add_parser("status", help="count patients missing from the index")
+    args = parser.parse_args(argv)
+
+    pool = create_pool(settings)
+    conn = pool.get_connection()
+    try:
+        if args.command == "rebuild":
+            print(f"indexed {rebuild(conn, log=lambda *_: None)} patients")
+            return 0
+        cursor = conn.cursor()
+        try:
+            missing = unindexed(cursor)
+        finally:
+            cursor.close()
+        print(f"{missing} patients missing from the search index")
+        return 1 if missing else 0
+    finally:
+        conn.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
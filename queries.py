@@ -0,0 +1,56 @@
+# SQL shared by the sync handlers in app_main.py and the async handlers in app_async.py.
+
+PATIENT_INSERT = ("INSERT INTO patient_details (patient_id, name, age, gender, height, weight) "
+                  "VALUES (%s, %s, %s, %s, %s, %s)")
+LIFESTYLE_INSERT = ("INSERT INTO patient_lifestyle (patient_id, smoke, alco, active) "
+                    "VALUES (%s, %s, %s, %s)")
+APPOINTMENT_INSERT = ("INSERT INTO appointments (appointment_id, patient_id, doctor_id, appointment_date, appointment_type) "
+                      "VALUES (%s, %s, %s, %s, %s)")
+TEST_INSERT = ("INSERT INTO test_details (test_id, appointment_id, ap_hi, ap_lo, cholesterol, gluc) "
+               "VALUES (%s, %s, %s, %s, %s, %s)")
+# Public test_details columns; commit_seq is analysis_sync's watermark and stays internal
+TEST_SELECT = "SELECT test_id, appointment_id, ap_hi, ap_lo, cholesterol, gluc FROM test_details"
+PRESCRIPTION_INSERT = ("INSERT INTO prescriptions (prescription_id, appointment_id, prescribed_date, medicine_name, dosage, duration_days) "
+                       "VALUES (%s, %s, %s, %s, %s, %s)")
+
+# Test results with the patient attributes risk rules may use (risk_scoring.FIELDS). Left
+# joins keep tests whose patient or lifestyle row is missing; those fields score as missing.
+RISK_QUERY = """
+    SELECT
+        td.test_id,
+        td.appointment_id,
+        a.patient_id,
+        pd.age,
+        pd.gender,
+        td.ap_hi,
+        td.ap_lo,
+        td.cholesterol,
+        td.gluc,
+        pl.smoke,
+        pl.alco,
+        pl.active
+    FROM
+        test_details td
+    LEFT JOIN
+        appointments a ON a.appointment_id = td.appointment_id
+    LEFT JOIN
+        patient_details pd ON pd.patient_id = a.patient_id
+    LEFT JOIN
+        patient_lifestyle pl ON pl.patient_id = a.patient_id
+"""
+
+ANALYSIS_QUERY = """
+    SELECT
+        pd.patient_id,
+        pd.age,
+        td.ap_hi,
+        td.ap_lo,
+        td.cholesterol,
+        td.gluc
+    FROM
+        patient_details pd
+    JOIN
+        appointments a ON pd.patient_id = a.patient_id
+    JOIN
+        test_details td ON a.appointment_id = td.appointment_id
+"""
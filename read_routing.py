@@ -0,0 +1,216 @@
+import threading
+import time
+from contextvars import ContextVar
+from mysql.connector.errors import PoolError
+from storage import Error
+
+
+# ---------- READ-YOUR-WRITES ----------
+# Write responses carry X-Last-Write (primary clock, seconds since the epoch); a client that
+# sends it back on its next reads is only served by the replica once the replica has
+# replayed everything the primary had committed at that time.
+LAST_WRITE_HEADER = "X-Last-Write"
+last_write = ContextVar("last_write", default=None)
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware that stamps successful write responses with X-Last-Write and exposes
+    the X-Last-Write request header of reads to ``ReadRouter`` through ``last_write``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] in ("GET", "HEAD"):
+            token = None
+            for name, value in scope["headers"]:
+                if name == b"x-last-write":
+                    try:
+                        token = float(value)
+                    except ValueError:
+                        pass
+            # Sync handlers run in a worker thread that inherits this context
+            last_write.set(token)
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_stamp(message):
+            # Handlers commit before they return, so the stamp is taken after the write is durable
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message["headers"] = [*message.get("headers", []),
+                                      (LAST_WRITE_HEADER.lower().encode(), repr(time.time()).encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_stamp)
+
+
+# ---------- REPLICA MONITOR ----------
+HEARTBEAT_WRITE = "UPDATE replication_heartbeat SET beat = %s WHERE id = 1"
+HEARTBEAT_READ = "SELECT beat FROM replication_heartbeat WHERE id = 1"
+
+
+class ReplicaMonitor:
+    """Measures replica lag with a heartbeat row: every ``interval`` seconds the primary's
+    clock is written to ``replication_heartbeat`` and read back from the replica.
+
+    The beat the replica returns is the newest primary time it has fully replayed, which
+    needs no replication privileges and works for any replication method (or none, e.g. a
+    copied SQLite file, which simply ages past ``max_lag``). The replica counts as down
+    until the first successful check and after any failed one."""
+
+    def __init__(self, primary, replica, interval=1.0):
+        self.primary = primary
+        self.replica = replica
+        self.interval = interval
+        self.replica_beat = None
+        self.checked_at = None
+        self.error = None
+        self._checks = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+
+    def start(self):
+        self.check()
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(self.interval + 5)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def _beat(self):
+        conn = self.primary.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(HEARTBEAT_WRITE, (time.time(),))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def check(self):
+        try:
+            self._beat()
+        except Error:
+            # The primary being down is not the replica's fault; its beat just stops advancing
+            pass
+        try:
+            conn = self.replica.get_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute(HEARTBEAT_READ)
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+                conn.close()
+        except Error as e:
+            self.mark_down(e)
+            return
+        if row is None:
+            self.mark_down("replica has no heartbeat row (schema version 4 not replicated yet)")
+            return
+        with self._lock:
+            self.replica_beat = float(row[0])
+            self.checked_at = time.time()
+            self.error = None
+            self._checks += 1
+
+    def mark_down(self, error):
+        with self._lock:
+            self.replica_beat = None
+            self.error = str(error)
+            self._checks += 1
+            self._failures += 1
+
+    def lag(self):
+        """Seconds the replica is behind the primary, or None while it is down."""
+        with self._lock:
+            if self.replica_beat is None:
+                return None
+            return max(0.0, time.time() - self.replica_beat)
+
+    def stats(self):
+        lag = self.lag()
+        with self._lock:
+            return {
+                "up": self.replica_beat is not None,
+                "lag_seconds": round(lag, 3) if lag is not None else None,
+                "replayed_until": self.replica_beat,
+                "checks": self._checks,
+                "failed_checks": self._failures,
+                "last_error": self.error,
+            }
+
+
+# ---------- ROUTER ----------
+class ReadRouter:
+    """Hands out replica connections for reads unless the replica is down, lags more than
+    ``max_lag`` seconds, or has not replayed the caller's last write; then the primary.
+
+    A read also goes to the primary when no replica connection frees up within
+    ``checkout_timeout`` seconds; a busy pool says nothing about the replica's health."""
+
+    def __init__(self, primary, replica, monitor, max_lag=5.0, checkout_timeout=0.05):
+        self.primary = primary
+        self.replica = replica
+        self.monitor = monitor
+        self.max_lag = max_lag
+        self.checkout_timeout = checkout_timeout
+        self._lock = threading.Lock()
+        self._routed = {"replica": 0, "primary_down": 0, "primary_lagging": 0, "primary_last_write": 0,
+                        "primary_replica_busy": 0}
+
+    def _count(self, reason):
+        with self._lock:
+            self._routed[reason] += 1
+
+    def route(self, token=None):
+        """Returns "replica", or the reason the read has to go to the primary."""
+        lag = self.monitor.lag()
+        if lag is None:
+            return "primary_down"
+        if lag > self.max_lag:
+            return "primary_lagging"
+        if token is not None and (self.monitor.replica_beat or 0.0) <= token:
+            return "primary_last_write"
+        return "replica"
+
+    def get_connection(self):
+        reason = self.route(last_write.get())
+        if reason == "replica":
+            try:
+                conn = self.replica.get_connection(timeout=self.checkout_timeout)
+                self._count(reason)
+                return conn
+            except PoolError:
+                reason = "primary_replica_busy"
+            except Error as e:
+                # Stop sending reads there until the monitor sees it answer again
+                self.monitor.mark_down(e)
+                reason = "primary_down"
+        self._count(reason)
+        return self.primary.get_connection()
+
+    def stats(self):
+        with self._lock:
+            routed = dict(self._routed)
+        return {"max_lag": self.max_lag, "checkout_timeout": self.checkout_timeout, "routed": routed, **self.monitor.stats(), "pool": self.replica.stats()}
+
+
+def create_read_router(settings, primary, replica):
+    """Returns a started router when a replica pool is configured, otherwise None."""
+    if replica is None:
+        return None
+    monitor = ReplicaMonitor(primary, replica, settings.db_replica_check_interval)
+    monitor.start()
+    return ReadRouter(primary, replica, monitor, settings.db_replica_max_lag,
+                      settings.db_replica_checkout_timeout)
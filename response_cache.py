@@ -0,0 +1,173 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Response
+
+
+# Tables whose writes invalidate cached reads. Each gets a version counter; a cached entry
+# remembers the versions it was computed under and is discarded once any of them moves.
+TAGS = (
+    "patient_details",
+    "patient_lifestyle",
+    "doctors",
+    "appointments",
+    "test_details",
+    "prescriptions",
+    "cohort_histogram",
+)
+
+_SLOT = struct.Struct("Q")
+
+
+# ---------- VERSION COUNTERS ----------
+class LocalVersions:
+    """Per-process table versions."""
+
+    def __init__(self):
+        self._versions = dict.fromkeys(TAGS, 0)
+        self._lock = threading.Lock()
+
+    def get(self, tags):
+        return tuple(self._versions[t] for t in tags)
+
+    def bump(self, tags):
+        with self._lock:
+            for t in tags:
+                self._versions[t] += 1
+
+
+class SharedVersions:
+    """Table versions in a memory-mapped file, so a write in one worker process invalidates
+    the caches of every worker on the host (e.g. path under /dev/shm)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+        self._offsets = {t: i * _SLOT.size for i, t in enumerate(TAGS)}
+        # flock() locks belong to the open file, which a forked worker would share with its
+        # parent and siblings (python -m serve), so each process opens the file itself
+        os.register_at_fork(after_in_child=self._reopen)
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = _SLOT.size * len(TAGS)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _reopen(self):
+        self._map.close()
+        os.close(self._fd)
+        self._open()
+
+    def get(self, tags):
+        return tuple(_SLOT.unpack_from(self._map, self._offsets[t])[0] for t in tags)
+
+    def bump(self, tags):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            for t in tags:
+                offset = self._offsets[t]
+                _SLOT.pack_into(self._map, offset, _SLOT.unpack_from(self._map, offset)[0] + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+# ---------- CACHE ----------
+class ResponseCache:
+    """Size-bounded LRU with TTL for endpoint results, invalidated through table versions."""
+
+    def __init__(self, max_entries=1024, ttl=30.0, versions=None, enabled=True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.versions = versions or LocalVersions()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def lookup(self, key, tags):
+        """Returns ``(hit, value, token)``; pass ``token`` to ``store`` after computing on a miss.
+
+        The token captures table versions *before* the database is read, so a write that
+        commits while the value is being computed makes the stored entry stale immediately.
+        """
+        token = self.versions.get(tags)
+        if not self.enabled:
+            return False, None, token
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, versions = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    self._expirations += 1
+                elif versions != token:
+                    del self._entries[key]
+                    self._invalidations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return True, _fresh(value), token
+            self._misses += 1
+        return False, None, token
+
+    def store(self, key, value, token):
+        if not self.enabled or (isinstance(value, Response) and value.status_code != 200):
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, *tags):
+        self.versions.bump(tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+                "shared_versions": isinstance(self.versions, SharedVersions),
+            }
+
+
+def _fresh(value):
+    # Response objects are rebuilt per request so headers set downstream never leak between hits.
+    if isinstance(value, Response):
+        return Response(content=value.body, status_code=value.status_code, media_type=value.media_type,
+                        headers={k: v for k, v in value.headers.items() if k.lower() != "content-length"})
+    return value
+
+
+def create_cache(settings):
+    versions = SharedVersions(settings.cache_shared_path) if settings.cache_shared_path else LocalVersions()
+    return ResponseCache(settings.cache_max_entries, settings.cache_ttl, versions, settings.cache_enabled)
@@ -0,0 +1,146 @@
+import json
+from typing import List, Literal
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+from storage import Error
+
+
+# Columns a rule may test: the test results plus the patient's age, gender and lifestyle.
+FIELDS = ("age", "gender", "ap_hi", "ap_lo", "cholesterol", "gluc", "smoke", "alco", "active")
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+# ---------- RULES ----------
+class RiskCondition(BaseModel):
+    field: Literal[FIELDS]
+    op: Literal[tuple(OPERATORS)]
+    value: float
+
+
+class RiskRule(BaseModel):
+    """A test scores one point per condition it meets and is at risk from ``min_score`` points."""
+    conditions: List[RiskCondition] = Field(min_length=1)
+    min_score: int = Field(1, ge=1)
+
+
+# The clinical rule the prescription path has always applied: ap_hi > 140 or cholesterol > 2
+DEFAULT_RULE = RiskRule(conditions=[
+    RiskCondition(field="ap_hi", op=">", value=140),
+    RiskCondition(field="cholesterol", op=">", value=2),
+])
+
+
+def load_rule(text):
+    """Parses a rule from JSON (e.g. the HEALTHCARE_RISK_RULE setting); empty means the default."""
+    return RiskRule.model_validate(json.loads(text)) if text else DEFAULT_RULE
+
+
+# ---------- SCORING ----------
+def score(rule, columns):
+    """Scores column arrays (a DataFrame or ``{field: array}``; scalars work too) in one pass
+    per condition. Returns ``(scores, at_risk)``. Missing values never meet a condition."""
+    total = None
+    for condition in rule.conditions:
+        values = np.asarray(columns[condition.field], dtype=float)
+        met = OPERATORS[condition.op](values, condition.value) & ~np.isnan(values)
+        total = met.astype(np.int16) if total is None else total + met
+    return total, total >= rule.min_score
+
+
+def is_at_risk(rule, test):
+    """Single-test form of ``score`` used per request, so both paths apply the same rule."""
+    return bool(score(rule, test)[1])
+
+
+# ---------- BATCHES ----------
+def iter_frames(cursor, batch_size=50000):
+    """Yields DataFrames of ``batch_size`` rows from an executed tuple cursor."""
+    columns = list(cursor.column_names)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+
+def records_frame(records):
+    """DataFrame over inline ``{field: value}`` records; absent fields become missing values."""
+    return pd.DataFrame.from_records(records, columns=list(FIELDS), coerce_float=True)
+
+
+def restore_ints(frame):
+    """Turns float columns that only hold whole numbers back into (nullable) integers. Batches
+    come back as floats wherever a left-joined column had NULLs, which would print IDs as 1.0."""
+    frame = frame.copy(deep=False)
+    for column in frame.columns:
+        values = frame[column]
+        if values.dtype.kind == "f" and (values.dropna() % 1 == 0).all():
+            frame[column] = values.astype("Int64")
+    return frame
+
+
+def to_records(frame):
+    return restore_ints(frame).astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def score_frame(rule, frame):
+    frame = frame.copy(deep=False)
+    frame["score"], frame["at_risk"] = score(rule, frame)
+    return frame
+
+
+def evaluate_cohort(cursor, rule, baseline, batch_size=50000):
+    """Scores every row of an executed cursor under ``rule`` and the ``baseline`` rule and
+    counts how many tests the change would move in or out of the at-risk group."""
+    summary = {"evaluated": 0, "at_risk": 0, "baseline_at_risk": 0, "newly_at_risk": 0, "no_longer_at_risk": 0}
+    for frame in iter_frames(cursor, batch_size):
+        _, at_risk = score(rule, frame)
+        _, before = score(baseline, frame)
+        summary["evaluated"] += len(frame)
+        summary["at_risk"] += int(at_risk.sum())
+        summary["baseline_at_risk"] += int(before.sum())
+        summary["newly_at_risk"] += int((at_risk & ~before).sum())
+        summary["no_longer_at_risk"] += int((before & ~at_risk).sum())
+    return summary
+
+
+# ---------- EXPORT ----------
+def stream_cohort(conn, query, params, rule, fmt="ndjson", at_risk_only=True, batch_size=50000):
+    """Yields the scored cohort as NDJSON or CSV, one scored batch at a time.
+
+    Like ``table_access.stream_ndjson`` the generator owns ``conn`` and returns it to the pool
+    when the stream ends or is abandoned.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        header = True
+        for frame in iter_frames(cursor, batch_size):
+            frame = score_frame(rule, frame)
+            if at_risk_only:
+                frame = frame[frame["at_risk"]]
+            if frame.empty:
+                continue
+            frame = restore_ints(frame)
+            if fmt == "csv":
+                yield frame.to_csv(index=False, header=header)
+                header = False
+            else:
+                # Older pandas releases leave off the final newline
+                lines = frame.to_json(orient="records", lines=True, date_format="iso")
+                yield lines if lines.endswith("\n") else lines + "\n"
+    finally:
+        try:
+            cursor.close()
+        except Error:
+            pass
+        conn.close()
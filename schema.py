@@ -0,0 +1,355 @@
+"""Versioned schema for the application tables.
+
+    python -m schema migrate    # apply pending migrations
+    python -m schema status     # list applied and pending versions
+    python -m schema check      # EXPLAIN every hot query; exit 1 if one degrades to a full scan
+
+Migrations are append-only: never edit an applied one, add a new version instead. Each
+statement is idempotent (or tolerated when the object already exists), so migrating a
+hand-made database or racing another worker at startup is safe. A step can also be a
+function of the connection, for changes that need to inspect the database first.
+"""
+import argparse
+import sys
+import analysis_sync
+import appointment_calendar
+import cohort_stats
+import patient_search
+from queries import ANALYSIS_QUERY, RISK_QUERY, TEST_SELECT
+from storage import Error
+from table_access import build_fetch_query
+
+
+# ---------- KEYS ----------
+PRIMARY_KEYS = {
+    "patient_details": "patient_id",
+    "doctors": "doctor_id",
+    "patient_lifestyle": "patient_id",
+    "appointments": "appointment_id",
+    "test_details": "test_id",
+    "prescriptions": "prescription_id",
+}
+
+# (table, column, referenced table, referenced column)
+FOREIGN_KEYS = (
+    ("patient_lifestyle", "patient_id", "patient_details", "patient_id"),
+    ("appointments", "patient_id", "patient_details", "patient_id"),
+    ("appointments", "doctor_id", "doctors", "doctor_id"),
+    ("test_details", "appointment_id", "appointments", "appointment_id"),
+    ("prescriptions", "appointment_id", "appointments", "appointment_id"),
+)
+
+
+def existing_keys(conn):
+    """Returns ``(primary keys, foreign keys)`` as found in the database, in the shapes of
+    PRIMARY_KEYS and FOREIGN_KEYS; single-column primary keys only."""
+    cursor = conn.cursor()
+    try:
+        primary, foreign = {}, set()
+        if getattr(conn, "dialect", "mysql") == "sqlite":
+            for table in PRIMARY_KEYS:
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = [row[1] for row in cursor.fetchall() if row[5]]
+                if len(columns) == 1:
+                    primary[table] = columns[0]
+                cursor.execute(f"PRAGMA foreign_key_list({table})")
+                # Rows are (id, seq, table, from, to, on_update, on_delete, match)
+                foreign.update((table, row[3], row[2], row[4]) for row in cursor.fetchall())
+            return primary, foreign
+        cursor.execute(
+            "SELECT kcu.TABLE_NAME, kcu.COLUMN_NAME, tc.CONSTRAINT_TYPE, "
+            "kcu.REFERENCED_TABLE_NAME, kcu.REFERENCED_COLUMN_NAME "
+            "FROM information_schema.TABLE_CONSTRAINTS tc "
+            "JOIN information_schema.KEY_COLUMN_USAGE kcu "
+            "ON kcu.CONSTRAINT_SCHEMA = tc.CONSTRAINT_SCHEMA AND kcu.TABLE_NAME = tc.TABLE_NAME "
+            "AND kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME "
+            "WHERE tc.CONSTRAINT_SCHEMA = DATABASE() AND tc.CONSTRAINT_TYPE IN ('PRIMARY KEY', 'FOREIGN KEY')"
+        )
+        primary_columns = {}
+        for table, column, kind, ref_table, ref_column in cursor.fetchall():
+            if kind == "PRIMARY KEY":
+                primary_columns.setdefault(table, []).append(column)
+            else:
+                foreign.add((table, column, ref_table, ref_column))
+        primary = {table: columns[0] for table, columns in primary_columns.items() if len(columns) == 1}
+        return primary, foreign
+    finally:
+        cursor.close()
+
+
+def missing_keys(conn):
+    """Returns the PRIMARY_KEYS tables and FOREIGN_KEYS entries the database does not enforce."""
+    primary, foreign = existing_keys(conn)
+    return ([table for table, column in PRIMARY_KEYS.items() if primary.get(table) != column],
+            [key for key in FOREIGN_KEYS if key not in foreign])
+
+
+def _count(conn, query):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def ensure_keys(conn):
+    """Adds the missing primary and foreign keys with ALTER TABLE.
+
+    Raises RuntimeError, naming the table and the offending rows, when a key cannot be added:
+    duplicate or NULL ids, orphaned references, or a table that does not enforce foreign keys
+    (MyISAM). SQLite cannot add keys to an existing table, so there a missing key only raises.
+    """
+    tables, references = missing_keys(conn)
+    if not tables and not references:
+        return
+    if getattr(conn, "dialect", "mysql") == "sqlite":
+        raise RuntimeError(f"Missing keys that SQLite cannot add in place: primary keys on {tables}, "
+                           f"foreign keys {references}; recreate these tables from schema version 1")
+    cursor = conn.cursor()
+    try:
+        for table in tables:
+            column = PRIMARY_KEYS[table]
+            duplicates = _count(conn, f"SELECT COUNT(*) FROM (SELECT {column} FROM {table} "
+                                      f"GROUP BY {column} HAVING COUNT(*) > 1) d")
+            nulls = _count(conn, f"SELECT COUNT(*) FROM {table} WHERE {column} IS NULL")
+            if duplicates or nulls:
+                raise RuntimeError(f"Cannot add PRIMARY KEY ({column}) to {table}: {duplicates} duplicated "
+                                   f"and {nulls} NULL {column} values; clean them up and migrate again")
+            cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({column})")
+        for table, column, ref_table, ref_column in references:
+            orphans = _count(conn, f"SELECT COUNT(*) FROM {table} t LEFT JOIN {ref_table} r "
+                                   f"ON r.{ref_column} = t.{column} "
+                                   f"WHERE t.{column} IS NOT NULL AND r.{ref_column} IS NULL")
+            if orphans:
+                raise RuntimeError(f"Cannot add FOREIGN KEY {table}.{column} -> {ref_table}.{ref_column}: "
+                                   f"{orphans} rows reference a missing {ref_table} row")
+            cursor.execute(f"ALTER TABLE {table} ADD FOREIGN KEY ({column}) "
+                           f"REFERENCES {ref_table} ({ref_column})")
+    finally:
+        cursor.close()
+    # Storage engines without foreign keys accept the ALTER and drop the constraint
+    tables, references = missing_keys(conn)
+    if tables or references:
+        raise RuntimeError(f"Keys still missing after ALTER TABLE: primary keys on {tables}, foreign keys "
+                           f"{references}; convert these tables to InnoDB and migrate again")
+
+
+# ---------- MIGRATIONS ----------
+MIGRATIONS = (
+    (1, "base tables", (
+        "CREATE TABLE IF NOT EXISTS patient_details ("
+        "patient_id BIGINT PRIMARY KEY, name VARCHAR(100), age INT, gender INT, height FLOAT, weight FLOAT)",
+        "CREATE TABLE IF NOT EXISTS doctors ("
+        "doctor_id BIGINT PRIMARY KEY, name VARCHAR(100), specialization VARCHAR(100))",
+        "CREATE TABLE IF NOT EXISTS patient_lifestyle ("
+        "patient_id BIGINT PRIMARY KEY, smoke INT, alco INT, active INT, "
+        "FOREIGN KEY (patient_id) REFERENCES patient_details (patient_id))",
+        "CREATE TABLE IF NOT EXISTS appointments ("
+        "appointment_id BIGINT PRIMARY KEY, patient_id BIGINT NOT NULL, doctor_id BIGINT NOT NULL, "
+        "appointment_date DATE, appointment_type VARCHAR(50), "
+        "FOREIGN KEY (patient_id) REFERENCES patient_details (patient_id), "
+        "FOREIGN KEY (doctor_id) REFERENCES doctors (doctor_id))",
+        "CREATE TABLE IF NOT EXISTS test_details ("
+        "test_id BIGINT PRIMARY KEY, appointment_id BIGINT NOT NULL, ap_hi INT, ap_lo INT, cholesterol INT, gluc INT, "
+        "FOREIGN KEY (appointment_id) REFERENCES appointments (appointment_id))",
+        "CREATE TABLE IF NOT EXISTS prescriptions ("
+        "prescription_id BIGINT PRIMARY KEY, appointment_id BIGINT NOT NULL, prescribed_date DATE, "
+        "medicine_name VARCHAR(100), dosage VARCHAR(50), duration_days INT, "
+        "FOREIGN KEY (appointment_id) REFERENCES appointments (appointment_id))",
+    )),
+    (2, "secondary indexes for the hot lookups", (
+        # Patient history, dossier ordering and the analysis join from patients to appointments
+        "CREATE INDEX idx_appointments_patient ON appointments (patient_id, appointment_date, appointment_id)",
+        # Scheduler booking counts per date and doctor
+        "CREATE INDEX idx_appointments_date_doctor ON appointments (appointment_date, doctor_id)",
+        # Records, prescription rule lookup and the analysis join; covers every column they read
+        "CREATE INDEX idx_test_details_appointment ON test_details (appointment_id, ap_hi, ap_lo, cholesterol, gluc)",
+        "CREATE INDEX idx_prescriptions_appointment ON prescriptions (appointment_id)",
+    )),
+    (3, "commit sequence for analysis delta reads", (
+        "CREATE TABLE IF NOT EXISTS commit_sequence (name VARCHAR(64) PRIMARY KEY, value BIGINT NOT NULL)",
+        "INSERT IGNORE INTO commit_sequence (name, value) VALUES ('test_details', 0)",
+        "ALTER TABLE test_details ADD COLUMN commit_seq BIGINT NOT NULL DEFAULT 0",
+        "CREATE INDEX idx_test_details_commit_seq ON test_details (commit_seq)",
+    )),
+    (4, "heartbeat row for replica lag checks", (
+        # Written on the primary and read back from the replica by read_routing.ReplicaMonitor
+        "CREATE TABLE IF NOT EXISTS replication_heartbeat (id INT PRIMARY KEY, beat DOUBLE NOT NULL)",
+        "INSERT IGNORE INTO replication_heartbeat (id, beat) VALUES (1, 0)",
+    )),
+    (5, "doctor calendar index", (
+        # GET /appointments: per-doctor date ranges in keyset order and per-day rollups
+        "CREATE INDEX idx_appointments_doctor_date ON appointments (doctor_id, appointment_date, appointment_id)",
+    )),
+    (6, "patient name search index", (
+        # Maintained by patient_search.index_patients; a binary collation keeps prefix ranges
+        # in byte order. Existing patients need `python -m patient_search rebuild`.
+        "CREATE TABLE IF NOT EXISTS patient_search_terms ("
+        "term VARCHAR(64) COLLATE utf8mb4_bin NOT NULL, patient_id BIGINT NOT NULL, "
+        "PRIMARY KEY (term, patient_id))",
+        "CREATE INDEX idx_patient_search_terms_patient ON patient_search_terms (patient_id, term)",
+    )),
+    (7, "support tables previously created on first use", (
+        # Already present on databases where the allocator, the cohort summary or the importer
+        # ran before this version; the definitions are unchanged
+        "CREATE TABLE IF NOT EXISTS id_blocks (name VARCHAR(64) PRIMARY KEY, next_id BIGINT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS cohort_histogram ("
+        "age_bucket INT NOT NULL, metric VARCHAR(16) NOT NULL, value_bin INT NOT NULL, "
+        "n BIGINT NOT NULL, total BIGINT NOT NULL, "
+        "PRIMARY KEY (age_bucket, metric, value_bin))",
+        "CREATE TABLE IF NOT EXISTS import_checkpoints ("
+        "source VARCHAR(100) NOT NULL, chunk INT NOT NULL, imported INT NOT NULL, rejected INT NOT NULL, "
+        "PRIMARY KEY (source, chunk))",
+    )),
+    (8, "observed value range per cohort histogram bin", (
+        # NULL on rows written before this version until python -m cohort_stats rebuild
+        "ALTER TABLE cohort_histogram ADD COLUMN lo INT NULL",
+        "ALTER TABLE cohort_histogram ADD COLUMN hi INT NULL",
+    )),
+    (9, "primary and foreign keys on hand-made base tables", (
+        # Version 1 only creates keys along with new tables; this adds the ones an existing
+        # database lacks, or stops the migration if its data would violate them
+        ensure_keys,
+    )),
+)
+
+TABLES = ("patient_details", "patient_lifestyle", "doctors", "appointments", "test_details", "prescriptions")
+
+
+def _already_exists(error):
+    # MySQL has no CREATE INDEX / ADD COLUMN IF NOT EXISTS: 1060 duplicate column,
+    # 1061 duplicate key name, 1826 duplicate foreign key
+    return (getattr(error, "errno", None) in (1060, 1061, 1826)
+            or "already exists" in str(error) or "duplicate column" in str(error))
+
+
+def applied_versions(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INT PRIMARY KEY, description VARCHAR(200), "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, log=print):
+    """Applies pending migrations in order and returns the versions it applied."""
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        applied = []
+        for version, description, statements in MIGRATIONS:
+            if version in done:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                    continue
+                try:
+                    cursor.execute(statement)
+                except Error as e:
+                    if not _already_exists(e):
+                        raise
+            cursor.execute("INSERT IGNORE INTO schema_migrations (version, description) VALUES (%s, %s)",
+                           (version, description))
+            conn.commit()
+            applied.append(version)
+            log(f"applied schema version {version}: {description}")
+        return applied
+    finally:
+        cursor.close()
+
+
+# ---------- QUERY PLAN CHECKS ----------
+def hot_queries(conn):
+    """``(name, query, params, allowed_full_scans)`` for the lookups the endpoints run per request.
+    The analysis join reads every row, so one driving-table scan is expected there."""
+    age_query, age_params = cohort_stats.age_lookup([(10000000,), (10000001,)])
+    fetch_query, fetch_params = build_fetch_query(conn, "appointments", after=10000000, limit=100)
+    week = {"doctor_ids": [1, 2], "date_from": "2024-01-01", "date_to": "2024-01-07"}
+    return (
+        ("patient by id", "SELECT * FROM patient_details WHERE patient_id = %s", (10000000,), 0),
+        ("lifestyle by patient", "SELECT * FROM patient_lifestyle WHERE patient_id = %s", (10000000,), 0),
+        ("appointments by patient", "SELECT * FROM appointments WHERE patient_id = %s", (10000000,), 0),
+        ("dossier appointments",
+         "SELECT * FROM appointments WHERE patient_id = %s AND appointment_date >= %s "
+         "ORDER BY appointment_date DESC, appointment_id DESC LIMIT %s", (10000000, "2024-01-01", 50), 0),
+        ("tests by appointment", TEST_SELECT + " WHERE appointment_id = %s", (10000000,), 0),
+        ("tests for appointments", TEST_SELECT + " WHERE appointment_id IN (%s, %s)", (10000000, 10000001), 0),
+        ("prescription rule lookup", RISK_QUERY + " WHERE td.appointment_id = %s", (10000000,), 0),
+        ("prescriptions by appointment", "SELECT * FROM prescriptions WHERE appointment_id = %s", (10000000,), 0),
+        ("scheduler counts for a date",
+         "SELECT appointment_date, doctor_id, COUNT(*) FROM appointments WHERE appointment_date = %s "
+         "GROUP BY appointment_date, doctor_id", ("2024-01-01",), 0),
+        ("cohort age lookup", age_query, age_params, 0),
+        ("fetch keyset page", fetch_query, fetch_params, 0),
+        ("doctor calendar page", *appointment_calendar.page_query(**week, after=(1, "2024-01-03", 10000000), limit=100), 0),
+        ("doctor calendar rollup", *appointment_calendar.rollup_query(**week), 0),
+        ("patient name search", *patient_search.search_query("smith jo", age_min=40, limit=20), 0),
+        ("patient phonetic search", *patient_search.search_query("smyth jon", limit=20, phonetic=True), 0),
+        ("analysis join", ANALYSIS_QUERY, (), 1),
+        ("analysis delta", *analysis_sync.analysis_query(10, since=9)[:2], 0),
+    )
+
+
+def full_scans(conn, query, params):
+    """Returns the tables (or aliases) the plan reads in full."""
+    cursor = conn.cursor()
+    try:
+        if getattr(conn, "dialect", "mysql") == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+            # Plan rows are (id, parent, notused, detail); "SCAN x" is a full pass, "SEARCH x" a lookup
+            return [row[3].split()[1] for row in cursor.fetchall() if row[3].startswith("SCAN ")]
+        cursor.execute("EXPLAIN " + query, params)
+        names = cursor.column_names
+        plans = [dict(zip(names, row)) for row in cursor.fetchall()]
+        return [plan["table"] for plan in plans if plan["type"] in ("ALL", "index")]
+    finally:
+        cursor.close()
+
+
+def check_plans(conn):
+    """Returns ``(name, scanned tables, allowed)`` for every hot query that scans too much."""
+    failures = []
+    for name, query, params, allowed in hot_queries(conn):
+        scanned = full_scans(conn, query, params)
+        if len(scanned) > allowed:
+            failures.append((name, scanned, allowed))
+    return failures
+
+
+def main(argv=None):
+    from app_config import settings
+    from storage import connector
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("migrate", "status", "check"))
+    args = parser.parse_args(argv)
+
+    conn = connector(settings)()
+    try:
+        if args.command == "migrate":
+            if not migrate(conn):
+                print("schema is up to date")
+        elif args.command == "status":
+            cursor = conn.cursor()
+            done = applied_versions(cursor)
+            cursor.close()
+            for version, description, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {description}")
+        else:
+            failures = check_plans(conn)
+            for name, scanned, allowed in failures:
+                print(f"FULL SCAN  {name}: scans {', '.join(scanned)} (allowed {allowed})")
+            if failures:
+                return 1
+            print("all hot queries use indexes")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,541 @@
+"""Production launcher: the app served by N worker processes on one socket.
+
+The parent process validates the configuration, applies pending schema migrations, binds
+the listening socket and starts the workers. Each worker is a fresh interpreter that
+imports the app and runs uvicorn on the shared socket, creating its own database pools in
+the app's lifespan, so no connection is shared between processes.
+
+    python -m serve --host 0.0.0.0 --port 8000        # one worker per CPU core
+    python -m serve --port 8000 --workers 4 --env-file healthcare.env
+    python -m serve status --port 8000     # per-worker health; exits 1 if a worker is not ready
+    python -m serve reload --port 8000     # rolling restart (same as SIGHUP to the parent)
+    python -m serve stop --port 8000       # drain and exit (same as SIGTERM)
+
+On SIGHUP the env file is re-read, pending migrations are applied, and the workers are
+replaced one at a time: each replacement has to report ready before the worker it replaces
+stops accepting connections and drains. Replacements import the code on disk, so a reload
+deploys new code and new HEALTHCARE_* settings from the env file. The launcher's own
+environment, the host, port and worker count are fixed until a stop and start. SIGTERM
+or SIGINT drain every worker (in-flight requests finish, then the pools close) and exit.
+A worker that dies, or stops reporting for server_worker_timeout seconds, is replaced.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from app_config import ENV_PREFIX, load_settings, settings
+
+
+WORKER_PREFIX = "worker-"
+SUPERVISOR_FILE = "serve.json"
+
+# How often the parent checks on its workers
+CHECK_INTERVAL = 0.5
+# Grace period on top of db_pool_drain_timeout before a draining worker is killed
+KILL_GRACE = 5.0
+# A worker that exits this soon after starting is restarted after a pause, so a broken
+# deployment does not fork in a tight loop
+CRASH_WINDOW = 5.0
+CRASH_BACKOFF = 2.0
+
+POOL_FIELDS = ("opened", "in_use", "idle", "waiters", "timeouts")
+
+
+# ---------- CONFIGURATION ----------
+def read_env_file(path):
+    """``KEY=VALUE`` lines of ``path`` as a dict; blank lines and ``#`` comments are skipped."""
+    values = {}
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, sep, value = line.partition("=")
+            if not sep:
+                raise ValueError(f"{path}:{number}: expected KEY=VALUE")
+            values[key.strip()] = value.strip()
+    return values
+
+
+def read_environment(base, env_file=None):
+    """Returns ``(environ, settings)``: ``base`` with the current contents of ``env_file`` on
+    top, and the settings it yields. Raises OSError or ValueError if either is invalid."""
+    environ = dict(base)
+    if env_file:
+        environ.update(read_env_file(env_file))
+    return environ, load_settings(environ)
+
+
+# ---------- HEALTH REPORTS ----------
+def default_status_dir(port):
+    return os.path.join(tempfile.gettempdir(), f"healthcare-serve-{port}")
+
+
+def write_json(path, payload):
+    # Renamed into place so readers never see a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def report_path(status_dir, pid):
+    return os.path.join(status_dir, f"{WORKER_PREFIX}{pid}.json")
+
+
+def worker_statuses(status_dir):
+    """Latest report of every running worker, ordered by slot, each with ``beat_age`` in seconds."""
+    try:
+        names = os.listdir(status_dir)
+    except OSError:
+        return []
+    reports = []
+    for name in names:
+        if name.startswith(WORKER_PREFIX) and name.endswith(".json"):
+            report = read_json(os.path.join(status_dir, name))
+            if report is not None:
+                report["beat_age"] = round(time.time() - report["beat_at"], 3)
+                reports.append(report)
+    return sorted(reports, key=lambda r: (r["slot"], r["started_at"]))
+
+
+def is_healthy(report, timeout):
+    return report["state"] == "ready" and report["beat_age"] <= timeout
+
+
+class HealthReporter:
+    """Thread in a worker that writes its state ("starting", "ready" or "draining"), request
+    counts and pool usage to ``<status_dir>/worker-<pid>.json`` every ``interval`` seconds.
+
+    It also asks the server to exit if the parent disappears, so workers do not outlive a
+    killed launcher."""
+
+    def __init__(self, app_module, server, status_dir, slot, generation, interval):
+        self.app_module = app_module
+        self.server = server
+        self.path = report_path(status_dir, os.getpid())
+        self.slot = slot
+        self.generation = generation
+        self.interval = interval
+        self.started_at = time.time()
+        self._parent = os.getppid()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="health-reporter", daemon=True)
+
+    def start(self):
+        self.report()
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(self.interval + 5)
+
+    def state(self):
+        if self.server.should_exit:
+            return "draining"
+        return "ready" if self.server.started else "starting"
+
+    def report(self):
+        app = self.app_module
+        payload = {
+            "slot": self.slot,
+            "pid": os.getpid(),
+            "generation": self.generation,
+            "state": self.state(),
+            "started_at": self.started_at,
+            "beat_at": time.time(),
+            "requests": app.metrics.requests_total(),
+            "in_flight": app.metrics.in_flight,
+        }
+        if app.db_pool is not None:
+            stats = app.db_pool.stats()
+            payload["pool"] = {name: stats[name] for name in POOL_FIELDS}
+        write_json(self.path, payload)
+
+    def _run(self):
+        while True:
+            # Report readiness promptly so a rolling restart does not wait a full interval
+            state = self.state()
+            if self._stop.wait(self.interval if state == "ready" else min(self.interval, 0.1)):
+                return
+            if os.getppid() != self._parent:
+                self.server.should_exit = True
+            try:
+                self.report()
+            except OSError:
+                pass
+
+
+# ---------- WORKERS ----------
+def _run_worker(sock, status_dir, slot, generation, log_level):
+    import uvicorn
+    # A fresh interpreter, so this is the code on disk and the settings the launcher started it with
+    import app_main
+
+    # Signals come from the parent, which forwards them one worker at a time; a Ctrl-C in the
+    # terminal reaches only the parent. After a signal-triggered shutdown uvicorn re-raises the
+    # signal, which the default handler turns into the process exit.
+    os.setpgrp()
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, signal.SIG_DFL)
+    config = uvicorn.Config(app_main.app, lifespan="on", log_level=log_level,
+                            timeout_graceful_shutdown=settings.db_pool_drain_timeout)
+    server = uvicorn.Server(config)
+    reporter = HealthReporter(app_main, server, status_dir, slot, generation, settings.server_heartbeat_interval)
+    reporter.start()
+    try:
+        server.run(sockets=[sock])
+    finally:
+        reporter.close()
+
+
+class Worker:
+    def __init__(self, process, slot, generation):
+        self.process = process
+        self.slot = slot
+        self.generation = generation
+        self.started_at = time.time()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+
+class Supervisor:
+    """Keeps ``workers`` processes serving the app on the bound socket ``sock``, replacing
+    dead or silent ones, and handles rolling restarts and shutdown.
+
+    Workers are started with the "spawn" method, which execs a new interpreter, and inherit
+    the environment ``base_environ`` + ``env_file`` + the launcher's overrides; a rolling
+    restart re-reads ``env_file`` first."""
+
+    def __init__(self, sock, workers, status_dir, log_level="info", base_environ=None, env_file=None):
+        self.sock = sock
+        self.workers = workers
+        self.status_dir = status_dir
+        self.log_level = log_level
+        self.base_environ = dict(os.environ if base_environ is None else base_environ)
+        self.env_file = env_file
+        self.slots = []
+        self._context = multiprocessing.get_context("spawn")
+        self._generation = 0
+        self._reload = False
+        self._stop = False
+
+    def log(self, message):
+        print(f"[serve] {message}", file=sys.stderr, flush=True)
+
+    def overrides(self, config):
+        """Settings the launcher decides for every worker."""
+        # Applied by the launcher, once for all workers
+        values = {"server_status_dir": self.status_dir, "db_migrate_on_startup": "false"}
+        if self.workers > 1 and config.cache_enabled and not config.cache_shared_path:
+            # Each worker caches reads; shared table versions let a write in one invalidate all
+            values["cache_shared_path"] = os.path.join(self.status_dir, "cache_versions")
+        return {ENV_PREFIX + name.upper(): value for name, value in values.items()}
+
+    def configure(self, environ, config):
+        """Makes ``environ`` (plus the overrides) the environment of the workers started next."""
+        os.environ.clear()
+        os.environ.update(environ)
+        os.environ.update(self.overrides(config))
+        self.timeout = config.server_worker_timeout
+        self.drain_timeout = config.db_pool_drain_timeout + KILL_GRACE
+
+    def reconfigure(self):
+        """Re-reads the env file and applies pending migrations with the code on disk. Returns
+        False, leaving the configuration unchanged, if either fails."""
+        try:
+            environ, config = read_environment(self.base_environ, self.env_file)
+        except (OSError, ValueError) as e:
+            self.log(f"invalid configuration: {e}")
+            return False
+        if config.db_migrate_on_startup:
+            # In a new interpreter, so migrations added by the new code are applied too
+            result = subprocess.run([sys.executable, "-m", "schema", "migrate"], env=environ)
+            if result.returncode != 0:
+                self.log(f"schema migration failed with exit code {result.returncode}")
+                return False
+        self.configure(environ, config)
+        return True
+
+    def _on_signal(self, sig, frame):
+        # Handled by the main loop, never in the middle of a restart
+        if sig == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stop = True
+
+    def spawn(self, slot):
+        self._generation += 1
+        process = self._context.Process(
+            target=_run_worker, name=f"healthcare-worker-{slot}",
+            args=(self.sock, self.status_dir, slot, self._generation, self.log_level))
+        process.start()
+        return Worker(process, slot, self._generation)
+
+    def stop_worker(self, worker, timeout):
+        """SIGTERM, then SIGKILL if the worker has not drained within ``timeout`` seconds."""
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(timeout)
+        if worker.process.is_alive():
+            self.log(f"worker {worker.slot} (pid {worker.pid}) did not drain in {timeout:.0f}s; killing it")
+            worker.process.kill()
+        worker.process.join()
+        self._forget(worker)
+
+    def _forget(self, worker):
+        try:
+            os.remove(report_path(self.status_dir, worker.pid))
+        except OSError:
+            pass
+
+    def _report(self, worker):
+        return read_json(report_path(self.status_dir, worker.pid))
+
+    def _unresponsive(self, worker):
+        """Why a live worker should be replaced, or None."""
+        now = time.time()
+        report = self._report(worker)
+        if report is None or report["state"] == "starting":
+            if now - worker.started_at > self.timeout:
+                return f"not ready after {self.timeout:.0f}s"
+        elif report["state"] == "ready" and now - report["beat_at"] > self.timeout:
+            return f"no health report for {now - report['beat_at']:.0f}s"
+        return None
+
+    def check_workers(self):
+        for worker in list(self.slots):
+            if not worker.process.is_alive():
+                worker.process.join()
+                self._forget(worker)
+                self.log(f"worker {worker.slot} (pid {worker.pid}) exited with code {worker.process.exitcode}; "
+                         "starting a replacement")
+                if time.time() - worker.started_at < CRASH_WINDOW:
+                    time.sleep(CRASH_BACKOFF)
+                self.slots[worker.slot] = self.spawn(worker.slot)
+                continue
+            reason = self._unresponsive(worker)
+            if reason:
+                # Killed here, replaced on the next check
+                self.log(f"worker {worker.slot} (pid {worker.pid}) {reason}; killing it")
+                worker.process.kill()
+
+    def wait_ready(self, worker):
+        deadline = time.time() + self.timeout
+        while time.time() < deadline and not self._stop and worker.process.is_alive():
+            report = self._report(worker)
+            if report is not None and report["state"] == "ready":
+                return True
+            time.sleep(0.1)
+        return False
+
+    def rolling_restart(self):
+        if not self.reconfigure():
+            self.log("keeping the running workers and abandoning the restart")
+            return
+        self.log(f"rolling restart of {len(self.slots)} workers")
+        for slot, old in enumerate(self.slots):
+            new = self.spawn(slot)
+            if not self.wait_ready(new):
+                self.log(f"replacement for worker {slot} did not become ready; keeping pid {old.pid} "
+                         "and abandoning the restart")
+                self.stop_worker(new, self.drain_timeout)
+                return
+            self.slots[slot] = new
+            # The replacement already accepts on the shared socket, so capacity never drops
+            self.stop_worker(old, self.drain_timeout)
+        self.log("rolling restart complete")
+
+    def shutdown(self):
+        self.log(f"draining {len(self.slots)} workers")
+        for worker in self.slots:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.time() + self.drain_timeout
+        for worker in self.slots:
+            self.stop_worker(worker, max(0.0, deadline - time.time()))
+        self.slots = []
+
+    def run(self):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, self._on_signal)
+        os.makedirs(self.status_dir, exist_ok=True)
+        for name in os.listdir(self.status_dir):
+            if name.startswith(WORKER_PREFIX):
+                os.remove(os.path.join(self.status_dir, name))
+        supervisor_file = os.path.join(self.status_dir, SUPERVISOR_FILE)
+        host, port = self.sock.getsockname()[:2]
+        write_json(supervisor_file, {"pid": os.getpid(), "host": host, "port": port,
+                                     "workers": self.workers, "started_at": time.time()})
+        self.slots = [self.spawn(slot) for slot in range(self.workers)]
+        self.log(f"serving on http://{host}:{port} with {self.workers} workers (pid {os.getpid()})")
+        try:
+            while not self._stop:
+                if self._reload:
+                    self._reload = False
+                    self.rolling_restart()
+                    continue
+                self.check_workers()
+                time.sleep(CHECK_INTERVAL)
+            self.shutdown()
+        finally:
+            try:
+                os.remove(supervisor_file)
+            except OSError:
+                pass
+
+
+# ---------- PREFLIGHT ----------
+def worker_connections(settings):
+    """Primary database connections one worker can open at most."""
+    total = settings.db_pool_size + settings.db_max_overflow
+    if settings.db_async and settings.db_backend == "mysql":
+        total += settings.db_async_pool_size
+    return total
+
+
+def preflight(settings, workers):
+    """Checks once, before any worker starts, that the database is reachable and that all
+    workers' pools fit within its connection limit, and applies pending migrations so workers
+    do not race to apply them. Returns warnings; raises SystemExit on a fatal problem."""
+    from storage import Error, connector
+    import schema
+
+    warnings = []
+    try:
+        conn = connector(settings)()
+    except ValueError as e:
+        raise SystemExit(f"invalid configuration: {e}")
+    except Error as e:
+        raise SystemExit(f"cannot connect to the database: {e}")
+    try:
+        if settings.db_migrate_on_startup:
+            schema.migrate(conn)
+        if settings.db_backend == "mysql":
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT @@max_connections")
+                limit = int(cursor.fetchone()[0])
+            finally:
+                cursor.close()
+            needed = workers * worker_connections(settings)
+            if needed > limit:
+                warnings.append(f"{workers} workers may open {needed} connections but max_connections is {limit}; "
+                                "lower HEALTHCARE_DB_POOL_SIZE / HEALTHCARE_DB_MAX_OVERFLOW or the worker count")
+    except Error as e:
+        raise SystemExit(f"database check failed: {e}")
+    finally:
+        conn.close()
+    return warnings
+
+
+def bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+# ---------- CLI ----------
+def serve(args):
+    base_environ = dict(os.environ)
+    try:
+        environ, config = read_environment(base_environ, args.env_file)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"invalid configuration: {e}")
+    workers = args.workers or config.server_workers or os.cpu_count() or 1
+    status_dir = args.status_dir or config.server_status_dir or default_status_dir(args.port)
+    os.makedirs(status_dir, exist_ok=True)
+
+    for warning in preflight(config, workers):
+        print(f"[serve] warning: {warning}", file=sys.stderr)
+
+    sock = bind(args.host, args.port)
+    supervisor = Supervisor(sock, workers, status_dir, args.log_level, base_environ, args.env_file)
+    supervisor.configure(environ, config)
+    supervisor.run()
+    return 0
+
+
+def _supervisor(status_dir):
+    """PID of the running launcher for ``status_dir``, or None."""
+    info = read_json(os.path.join(status_dir, SUPERVISOR_FILE))
+    if info is None:
+        return None
+    try:
+        os.kill(info["pid"], 0)
+    except OSError:
+        return None
+    return info
+
+
+def status(status_dir):
+    info = _supervisor(status_dir)
+    if info is None:
+        print(f"no launcher running for {status_dir}")
+        return 1
+    reports = worker_statuses(status_dir)
+    print(f"launcher pid {info['pid']} on {info['host']}:{info['port']}, {info['workers']} workers")
+    print(f"{'slot':>4} {'pid':>7} {'gen':>4} {'state':<9} {'uptime s':>9} {'beat s':>7} {'requests':>9} "
+          f"{'in flight':>9} {'pool in use':>11} {'waiters':>7}")
+    for r in reports:
+        pool = r.get("pool", {})
+        print(f"{r['slot']:>4} {r['pid']:>7} {r['generation']:>4} {r['state']:<9} "
+              f"{time.time() - r['started_at']:>9.0f} {r['beat_age']:>7.1f} {r['requests']:>9} {r['in_flight']:>9} "
+              f"{pool.get('in_use', '-'):>11} {pool.get('waiters', '-'):>7}")
+    healthy = sum(is_healthy(r, settings.server_worker_timeout) for r in reports)
+    return 0 if healthy >= info["workers"] else 1
+
+
+def signal_supervisor(status_dir, sig):
+    info = _supervisor(status_dir)
+    if info is None:
+        print(f"no launcher running for {status_dir}")
+        return 1
+    os.kill(info["pid"], sig)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "status", "reload", "stop"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes (default: HEALTHCARE_SERVER_WORKERS, else one per CPU core)")
+    parser.add_argument("--status-dir", help="health report directory (default: a per-port temporary directory)")
+    parser.add_argument("--env-file", help="HEALTHCARE_* settings as KEY=VALUE lines, on top of the environment; "
+                                           "re-read on every reload")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        return serve(args)
+    config = read_environment(os.environ, args.env_file)[1] if args.env_file else settings
+    status_dir = args.status_dir or config.server_status_dir or default_status_dir(args.port)
+    if args.command == "status":
+        return status(status_dir)
+    return signal_supervisor(status_dir, signal.SIGHUP if args.command == "reload" else signal.SIGTERM)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+
+
+logger = logging.getLogger("healthcare.duckdb")
+
+
+# ---------- DIALECT ----------
+# The handlers are written against MySQL; these rewrites cover the constructs they use.
+_REWRITES = (
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bTRUNCATE\s+TABLE\b", re.I), "DELETE FROM"),
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.I), ""),
+    (re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)", re.I), r"excluded.\1"),
+    # Multi-argument MIN/MAX are SQLite's scalar LEAST/GREATEST
+    (re.compile(r"\bLEAST\(", re.I), "MIN("),
+    (re.compile(r"\bGREATEST\(", re.I), "MAX("),
+    (re.compile(r"\bSET\s+FOREIGN_KEY_CHECKS\s*=\s*(\d)", re.I), r"PRAGMA foreign_keys=\1"),
+    # SQLite compares text bytewise already
+    (re.compile(r"\s+COLLATE\s+utf8mb4_bin\b", re.I), ""),
+)
+_LOCKING_READ = re.compile(r"\bFOR\s+UPDATE\b", re.I)
+
+
+@lru_cache(maxsize=512)
+def translate(query):
+    """Returns ``(sqlite_query, locking)``; ``locking`` marks a ``SELECT ... FOR UPDATE``."""
+    locking = bool(_LOCKING_READ.search(query))
+    for pattern, replacement in _REWRITES:
+        query = pattern.sub(replacement, query)
+    return query, locking
+
+
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda raw: datetime.date.fromisoformat(raw.decode()))
+
+
+# ---------- CONNECTION ADAPTER ----------
+class Cursor:
+    """sqlite3 cursor with the parts of the mysql.connector cursor API the app uses."""
+
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        query, locking = translate(query)
+        # SQLite has no row locks; a locking read takes the database write lock up front so
+        # the read-modify-write that follows cannot interleave with another writer.
+        if locking and not self._conn.in_transaction:
+            self._cursor.execute("BEGIN IMMEDIATE")
+        self._cursor.execute(query, params or ())
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(translate(query)[0], seq_params)
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """Wraps a sqlite3 connection so the pool and the handlers can treat it like a MySQL one."""
+
+    dialect = "sqlite"
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False):
+        return Cursor(self._conn, dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(path, busy_timeout=10.0):
+    conn = sqlite3.connect(path, timeout=busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                           check_same_thread=False)
+    # WAL lets readers proceed while a writer commits; NORMAL sync is durable across app
+    # crashes and only risks the last transactions on power loss.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return Connection(conn)
+
+
+# ---------- COLUMNAR ANALYTICS ----------
+class DuckDBReader:
+    """Runs read-only analytical queries over the SQLite file with DuckDB's vectorized engine
+    and returns Arrow tables. Needs DuckDB's ``sqlite`` extension; if it cannot be loaded the
+    reader disables itself and callers fall back to SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self.available = True
+
+    def _connection(self):
+        with self._lock:
+            if self._db is None:
+                import duckdb
+                db = duckdb.connect()
+                db.execute(f"ATTACH '{self.path}' AS healthcare (TYPE sqlite, READ_ONLY)")
+                db.execute("USE healthcare")
+                self._db = db
+        # cursor() gives each calling thread its own connection to the same database
+        return self._db.cursor()
+
+    def query_table(self, query, params=()):
+        if not self.available:
+            return None
+        try:
+            cursor = self._connection()
+        except Exception as e:
+            logger.warning("DuckDB analytics disabled: %s", e)
+            self.available = False
+            return None
+        try:
+            result = cursor.execute(query.replace("%s", "?"), list(params))
+            # to_arrow_table() replaced fetch_arrow_table() in newer DuckDB releases
+            return (getattr(result, "to_arrow_table", None) or result.fetch_arrow_table)()
+        except Exception as e:
+            logger.warning("DuckDB query failed, falling back to SQLite: %s", e)
+            return None
+        finally:
+            cursor.close()
@@ -0,0 +1,60 @@
+import sqlite3
+import mysql.connector
+import sqlite_backend
+
+
+# Storage backends behind the sync endpoints. Handlers only use the DB-API subset that
+# mysql.connector and sqlite_backend.Connection share (cursor(dictionary=...), execute with
+# %s placeholders, fetch*, column_names, commit/rollback), so they run unchanged on both.
+BACKENDS = ("mysql", "sqlite")
+
+# Handlers catch this instead of a driver-specific class so they work on every backend.
+Error = (mysql.connector.Error, sqlite3.Error)
+
+# Seconds to wait for a replica connection before reads fall back to the primary
+REPLICA_CONNECT_TIMEOUT = 2
+
+
+def connector(settings):
+    """Returns a zero-argument callable that opens a new connection for the configured backend."""
+    if settings.db_backend == "mysql":
+        args = {
+            "host": settings.db_host,
+            "port": settings.db_port,
+            "user": settings.db_user,
+            "password": settings.db_password,
+            "database": settings.db_name,
+        }
+        return lambda: mysql.connector.connect(**args)
+    if settings.db_backend == "sqlite":
+        return lambda: sqlite_backend.connect(settings.db_path, busy_timeout=settings.db_pool_timeout)
+    raise ValueError(f"Unknown db_backend '{settings.db_backend}', expected one of: {', '.join(BACKENDS)}")
+
+
+def replica_connector(settings):
+    """Like ``connector`` for the read replica, or None when no replica is configured."""
+    if settings.db_backend == "mysql" and settings.db_replica_host:
+        args = {
+            "host": settings.db_replica_host,
+            "port": settings.db_replica_port,
+            "user": settings.db_user,
+            "password": settings.db_password,
+            "database": settings.db_name,
+            # A replica that is down should fail over to the primary quickly
+            "connection_timeout": REPLICA_CONNECT_TIMEOUT,
+        }
+        return lambda: mysql.connector.connect(**args)
+    if settings.db_backend == "sqlite" and settings.db_replica_path:
+        return lambda: sqlite_backend.connect(settings.db_replica_path, busy_timeout=settings.db_pool_timeout)
+    return None
+
+
+def is_embedded(settings):
+    return settings.db_backend == "sqlite"
+
+
+def create_columnar_reader(settings):
+    """DuckDB reader for analytical queries on the embedded database, or None."""
+    if is_embedded(settings) and settings.db_analytics_engine == "duckdb":
+        return sqlite_backend.DuckDBReader(settings.db_path)
+    return None
@@ -0,0 +1,126 @@
+import base64
+import datetime
+import decimal
+import json
+from fastapi import HTTPException
+from storage import Error
+
+
+# Tables exposed through /fetch/{table}, with the primary key used for keyset pagination.
+TABLES = {
+    "patient_details": "patient_id",
+    "patient_lifestyle": "patient_id",
+    "doctors": "doctor_id",
+    "appointments": "appointment_id",
+    "test_details": "test_id",
+    "prescriptions": "prescription_id",
+}
+
+RESERVED_PARAMS = {"columns", "limit", "cursor", "format"}
+
+# Bookkeeping columns that are not part of a table's public shape
+INTERNAL_COLUMNS = {
+    "test_details": {"commit_seq"},
+}
+
+_column_cache = {}
+
+
+# ---------- METADATA ----------
+def table_columns(conn, table):
+    if table not in TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table '{table}'")
+    if table not in _column_cache:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+            cursor.fetchall()
+            internal = INTERNAL_COLUMNS.get(table, ())
+            _column_cache[table] = [c for c in cursor.column_names if c not in internal]
+        finally:
+            cursor.close()
+    return _column_cache[table]
+
+
+# ---------- CURSOR TOKENS ----------
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps({"after": value}).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))["after"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# ---------- QUERY BUILDING ----------
+def build_fetch_query(conn, table, columns=None, filters=None, after=None, limit=None):
+    """Builds a keyset-paginated SELECT; identifiers come only from the table's own column list."""
+    known = table_columns(conn, table)
+    pk = TABLES[table]
+
+    if columns:
+        selected = [c.strip() for c in columns.split(",") if c.strip()]
+        unknown = [c for c in selected if c not in known]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown column(s) for {table}: {', '.join(unknown)}")
+        if pk not in selected:
+            selected.insert(0, pk)
+    else:
+        selected = known
+
+    where, params = [], []
+    for column, value in (filters or {}).items():
+        if column not in known:
+            raise HTTPException(status_code=400, detail=f"Unknown filter column for {table}: {column}")
+        where.append(f"{column} = %s")
+        params.append(value)
+    if after is not None:
+        where.append(f"{pk} > %s")
+        params.append(after)
+
+    query = f"SELECT {', '.join(selected)} FROM {table}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY {pk}"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+# ---------- STREAMING ----------
+def _json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode(errors="replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def stream_ndjson(conn, query, params, batch_size=1000):
+    """Yields NDJSON lines from an unbuffered cursor; only one batch is held in memory at a time.
+
+    The generator owns ``conn`` and returns it to the pool when the stream ends or is abandoned.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        columns = cursor.column_names
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield "".join(json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows)
+    finally:
+        # An abandoned stream leaves unread rows behind; the pool discards such connections.
+        try:
+            cursor.close()
+        except Error:
+            pass
+        conn.close()
@@ -0,0 +1,101 @@
+"""Fixtures for the API tests: a small synthetic database and a TestClient serving the app on it.
+
+Everything runs on the embedded SQLite backend. Set HEALTHCARE_TEST_MYSQL=1 (with the usual
+HEALTHCARE_DB_HOST/PORT/USER/PASSWORD) to run the endpoint suite against MySQL as well, in a
+scratch database (HEALTHCARE_TEST_MYSQL_DATABASE, default healthcare_test) that is reloaded
+for every test.
+"""
+import importlib
+import os
+import shutil
+import pytest
+from fastapi.testclient import TestClient
+import app_config
+import sqlite_backend
+from benchmarks import synthetic
+
+
+SCALE = synthetic.Scale(patients=60, doctors=4, appointments_per_patient=2)
+
+MYSQL_ENABLED = bool(os.environ.get("HEALTHCARE_TEST_MYSQL"))
+MYSQL_DATABASE = os.environ.get("HEALTHCARE_TEST_MYSQL_DATABASE", "healthcare_test")
+
+BACKENDS = [
+    "sqlite",
+    pytest.param("mysql", marks=pytest.mark.skipif(not MYSQL_ENABLED, reason="HEALTHCARE_TEST_MYSQL is not set")),
+]
+
+
+def pytest_generate_tests(metafunc):
+    # Tests marked "backends" run once per backend; the rest only on SQLite
+    if "database" in metafunc.fixturenames and metafunc.definition.get_closest_marker("backends"):
+        metafunc.parametrize("database", BACKENDS, indirect=True)
+
+
+def load_quietly(conn, scale=SCALE, reset=False):
+    synthetic.load(conn, scale, reset=reset, log=lambda *_: None)
+
+
+@pytest.fixture(scope="session")
+def seeded_sqlite(tmp_path_factory):
+    """Path of a SQLite file with the synthetic dataset; tests work on copies of it."""
+    path = tmp_path_factory.mktemp("seed") / "healthcare.db"
+    conn = sqlite_backend.connect(str(path))
+    try:
+        load_quietly(conn)
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture
+def database(request, seeded_sqlite, tmp_path):
+    """Settings (without the HEALTHCARE_ prefix) pointing at a freshly seeded database."""
+    if getattr(request, "param", "sqlite") == "mysql":
+        conn = synthetic.connect(app_config.load_settings(), MYSQL_DATABASE)
+        try:
+            load_quietly(conn, reset=True)
+        finally:
+            conn.close()
+        return {"db_backend": "mysql", "db_name": MYSQL_DATABASE}
+    path = tmp_path / "healthcare.db"
+    shutil.copy(seeded_sqlite, path)
+    return {"db_backend": "sqlite", "db_path": str(path)}
+
+
+@pytest.fixture
+def make_api(database, monkeypatch):
+    """Returns ``make(**settings)``, which starts the app with ``settings`` on top of the test
+    database and returns a TestClient. The app module is reloaded, because its pools,
+    cache, scheduler and ID allocator are built from the settings at import time."""
+    clients = []
+
+    def make(**overrides):
+        for name, value in {**database, **overrides}.items():
+            monkeypatch.setenv(app_config.ENV_PREFIX + name.upper(), str(value))
+        importlib.reload(app_config)
+        app_main = importlib.reload(importlib.import_module("app_main"))
+        client = TestClient(app_main.app)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in reversed(clients):
+        client.__exit__(None, None, None)
+
+
+@pytest.fixture
+def api(make_api):
+    return make_api()
+
+
+@pytest.fixture
+def db(database):
+    """Direct connection to the test database, e.g. to check rows behind the API's back."""
+    if database["db_backend"] == "sqlite":
+        conn = sqlite_backend.connect(database["db_path"])
+    else:
+        conn = synthetic.connect(app_config.load_settings(), database["db_name"])
+    yield conn
+    conn.close()
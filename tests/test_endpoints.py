@@ -0,0 +1,279 @@
+"""Every endpoint, once per backend (see conftest), so the SQL dialect translation is exercised."""
+import io
+import json
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+from columnar import ARROW_STREAM, PARQUET
+from id_allocator import ID_MIN
+from sqlite_backend import translate
+
+
+pytestmark = pytest.mark.backends
+
+PATIENT = {"name": "Grace Hopper", "age": 52, "gender": 1, "height": 165.0, "weight": 61.5}
+BOOKING_DATE = "2030-01-07"
+
+
+def new_patient(api, **fields):
+    response = api.post("/patients/new", json={**PATIENT, **fields})
+    assert response.status_code == 200, response.text
+    return response.json()["patient_id"]
+
+
+def new_appointment(api, patient_id, date=BOOKING_DATE):
+    response = api.post("/appointments", json={"patient_id": patient_id, "appointment_type": "Consultation",
+                                               "appointment_date": date})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def new_test(api, appointment_id, ap_hi=150, cholesterol=1):
+    response = api.post("/tests", json={"appointment_id": appointment_id, "ap_hi": ap_hi, "ap_lo": 90,
+                                        "cholesterol": cholesterol, "gluc": 1})
+    assert response.status_code == 200, response.text
+    return response.json()["test_id"]
+
+
+def prescription(appointment_id):
+    return {"appointment_id": appointment_id, "prescribed_date": BOOKING_DATE, "medicine_name": "Amlodipine",
+            "dosage": "5mg", "duration_days": 30}
+
+
+# ---------- DIALECT ----------
+@pytest.mark.parametrize("query, expected, locking", [
+    ("SELECT * FROM t WHERE a = %s AND b = %s", "SELECT * FROM t WHERE a = ? AND b = ?", False),
+    ("INSERT IGNORE INTO t (a) VALUES (%s)", "INSERT OR IGNORE INTO t (a) VALUES (?)", False),
+    ("INSERT INTO t (a, n) VALUES (%s, %s) ON DUPLICATE KEY UPDATE n = n + VALUES(n), lo = LEAST(lo, VALUES(lo))",
+     "INSERT INTO t (a, n) VALUES (?, ?) ON CONFLICT DO UPDATE SET n = n + excluded.n, lo = MIN(lo, excluded.lo)",
+     False),
+    ("SELECT next_id FROM id_blocks WHERE name = %s FOR UPDATE", "SELECT next_id FROM id_blocks WHERE name = ?", True),
+    ("TRUNCATE TABLE t", "DELETE FROM t", False),
+    ("SELECT name FROM t ORDER BY name COLLATE utf8mb4_bin", "SELECT name FROM t ORDER BY name", False),
+])
+def test_translate(query, expected, locking):
+    assert translate(query) == (expected, locking)
+
+
+# ---------- PATIENTS ----------
+def test_patient_lifecycle(api):
+    patient_id = new_patient(api)
+    assert patient_id >= ID_MIN
+    response = api.post("/patients/lifestyle", json={"patient_id": patient_id, "smoke": 0, "alco": 1, "active": 1})
+    assert response.status_code == 200
+
+    body = api.get(f"/patients/{patient_id}").json()
+    assert body["patient"]["name"] == PATIENT["name"]
+    assert body["lifestyle"]["alco"] == 1
+
+    # A second lifestyle row for the same patient violates the primary key
+    response = api.post("/patients/lifestyle", json={"patient_id": patient_id, "smoke": 1, "alco": 1, "active": 1})
+    assert response.status_code == 500
+
+
+def test_patient_validation(api):
+    assert api.post("/patients/new", json={"name": "No Age"}).status_code == 422
+
+
+def test_patient_search(api):
+    patient_id = new_patient(api, name="Zebulon Quartermaine")
+    matches = api.get("/patients/search", params={"q": "zebu"}).json()
+    assert [(m["patient_id"], m["match"]) for m in matches] == [(patient_id, "prefix")]
+    matches = api.get("/patients/search", params={"q": str(patient_id)}).json()
+    assert matches[0]["match"] == "id"
+    assert api.get("/patients/search", params={"q": "zebu", "age_min": 60}).json() == []
+
+
+def test_dossier(api):
+    patient_id = new_patient(api)
+    appointment_id = new_appointment(api, patient_id)["appointment_id"]
+    test_id = new_test(api, appointment_id)
+    api.post("/prescriptions", json=prescription(appointment_id))
+
+    dossier = api.get(f"/patients/{patient_id}/dossier").json()
+    (appointment,) = dossier["appointments"]
+    assert appointment["appointment_id"] == appointment_id
+    assert [t["test_id"] for t in appointment["tests"]] == [test_id]
+    assert set(appointment["tests"][0]) == {"test_id", "appointment_id", "ap_hi", "ap_lo", "cholesterol", "gluc"}
+    assert len(appointment["prescriptions"]) == 1
+    assert api.get(f"/patients/{patient_id}/dossier", params={"date_to": "2029-12-31"}).json()["appointments"] == []
+    assert api.get("/patients/1/dossier").status_code == 404
+
+
+# ---------- DOCTORS AND APPOINTMENTS ----------
+def test_doctors(api):
+    doctors = api.get("/doctors").json()
+    assert len(doctors) == 4
+    response = api.get("/doctors", headers={"Accept": ARROW_STREAM})
+    assert response.headers["content-type"].startswith(ARROW_STREAM)
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == 4
+
+
+def test_appointments_spread_over_doctors(api):
+    patient_id = new_patient(api)
+    doctors = {new_appointment(api, patient_id)["assigned_doctor_id"] for _ in range(4)}
+    assert len(doctors) == 4
+    assert len(api.get(f"/appointments/{patient_id}").json()) == 4
+    loads = api.get("/scheduler/stats", params={"date": BOOKING_DATE}).json()["loads"]
+    assert sorted(loads.values()) == [1, 1, 1, 1]
+
+
+def test_appointment_calendar(api):
+    patient_id = new_patient(api)
+    booked = [new_appointment(api, patient_id, date) for date in ("2030-02-01", "2030-02-02", "2030-02-02")]
+    params = {"from": "2030-02-01", "to": "2030-02-28"}
+    body = api.get("/appointments", params=params).json()
+    assert sorted(a["appointment_id"] for a in body["appointments"]) == sorted(b["appointment_id"] for b in booked)
+    assert sum(day["appointments"] for day in body["days"]) == 3
+
+    first = api.get("/appointments", params={**params, "limit": 2})
+    second = api.get("/appointments", params={**params, "limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert len(first.json()["appointments"]) + len(second.json()["appointments"]) == 3
+    assert "days" not in second.json()
+    assert api.get("/appointments", params={"from": "2030-02-02", "to": "2030-02-01"}).status_code == 400
+
+
+def test_scheduler_refresh(api, db):
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO doctors (doctor_id, name, specialization) VALUES (%s, %s, %s)",
+                   (ID_MIN + 100, "Doctor New", "Cardiology"))
+    db.commit()
+    cursor.close()
+    assert api.post("/scheduler/refresh").json()["doctors"] == 5
+
+
+# ---------- TESTS AND PRESCRIPTIONS ----------
+def test_records(api):
+    patient_id = new_patient(api)
+    appointment_id = new_appointment(api, patient_id)["appointment_id"]
+    test_id = new_test(api, appointment_id, ap_hi=155)
+    response = api.post("/prescriptions", json=prescription(appointment_id))
+    assert response.status_code == 200
+
+    records = api.get(f"/records/{appointment_id}").json()
+    assert records["test_details"]["test_id"] == test_id
+    assert "commit_seq" not in records["test_details"]
+    # ap_hi > 140 is at risk under the default rule, so the requested medicine is kept
+    assert records["prescription"]["medicine_name"] == "Amlodipine"
+
+
+def test_prescription_for_low_risk_and_missing_test(api):
+    patient_id = new_patient(api)
+    appointment_id = new_appointment(api, patient_id)["appointment_id"]
+    new_test(api, appointment_id, ap_hi=110)
+    api.post("/prescriptions", json=prescription(appointment_id))
+    assert api.get(f"/records/{appointment_id}").json()["prescription"]["medicine_name"] == "Multivitamins"
+
+    other = new_appointment(api, patient_id)["appointment_id"]
+    assert api.post("/prescriptions", json=prescription(other)).status_code == 404
+
+
+def test_cohort_histogram_upsert(api):
+    patient_id = new_patient(api, age=97)
+    for ap_hi in (151, 153):
+        new_test(api, new_appointment(api, patient_id)["appointment_id"], ap_hi=ap_hi)
+    (bucket,) = [b for b in api.get("/analysis/aggregate", params={"metric": "ap_hi"}).json()["metrics"]["ap_hi"]["buckets"]
+                 if b["age_bucket"] == 95]
+    assert bucket["count"] == 2
+    assert bucket["mean"] == 152.0
+    assert 151 <= bucket["p25"] <= bucket["p90"] <= 153
+    assert api.get("/analysis/aggregate", params={"metric": "bmi"}).status_code == 400
+
+
+# ---------- BULK ----------
+def test_bulk_endpoints(api):
+    response = api.post("/patients/bulk", json=[PATIENT, {"name": "Broken"}, {**PATIENT, "name": "Ada Lovelace"}])
+    body = response.json()
+    assert (body["inserted"], body["failed"]) == (2, 1)
+    patient_ids = [item["patient_id"] for item in body["items"] if "patient_id" in item]
+
+    lines = "\n".join(json.dumps({"patient_id": p, "smoke": 0, "alco": 0, "active": 1}) for p in patient_ids)
+    response = api.post("/patients/lifestyle/bulk", content=lines, headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["inserted"] == 2
+
+    appointment_ids = [new_appointment(api, p)["appointment_id"] for p in patient_ids]
+    tests = [{"appointment_id": a, "ap_hi": 120, "ap_lo": 80, "cholesterol": 1, "gluc": 1} for a in appointment_ids]
+    assert api.post("/tests/bulk", json=tests).json()["inserted"] == 2
+
+    body = api.post("/prescriptions/bulk", json=[prescription(a) for a in appointment_ids] + [prescription(1)]).json()
+    assert (body["inserted"], body["failed"]) == (2, 1)
+    assert body["items"][2]["error"] == "Test data not found"
+    assert api.post("/tests/bulk", content=b"{not json").status_code == 400
+
+
+# ---------- READS ----------
+def test_fetch_pages_and_formats(api):
+    first = api.get("/fetch/patient_details", params={"limit": 25})
+    rows = first.json()
+    assert len(rows) == 25 and rows[0]["patient_id"] == ID_MIN
+    second = api.get("/fetch/patient_details", params={"limit": 25, "cursor": first.headers["X-Next-Cursor"]}).json()
+    assert second[0]["patient_id"] == rows[-1]["patient_id"] + 1
+
+    tests = api.get("/fetch/test_details", params={"limit": 1}).json()
+    assert "commit_seq" not in tests[0]
+    filtered = api.get("/fetch/appointments", params={"patient_id": ID_MIN, "columns": "doctor_id"}).json()
+    assert len(filtered) == 2 and set(filtered[0]) == {"appointment_id", "doctor_id"}
+
+    streamed = api.get("/fetch/doctors", params={"format": "ndjson"}).text.splitlines()
+    assert len(streamed) == 4
+    parquet = api.get("/fetch/doctors", headers={"Accept": PARQUET})
+    assert pq.read_table(io.BytesIO(parquet.content)).num_rows == 4
+
+    assert api.get("/fetch/users").status_code == 404
+    assert api.get("/fetch/doctors", params={"columns": "password"}).status_code == 400
+    assert api.get("/fetch/doctors", params={"cursor": "???"}).status_code == 400
+
+
+def test_analysis_delta(api):
+    full = api.get("/get_analysis")
+    watermark = int(full.headers["X-Watermark"])
+    assert len(full.json()) == 120
+
+    patient_id = new_patient(api)
+    appointment_id = new_appointment(api, patient_id)["appointment_id"]
+    new_test(api, appointment_id)
+    delta = api.get("/get_analysis", params={"since": watermark})
+    assert delta.headers["X-Delta-Since"] == str(watermark)
+    assert [row["patient_id"] for row in delta.json()] == [patient_id]
+
+
+# ---------- RISK ----------
+def test_risk_evaluate(api):
+    inline = api.post("/risk/evaluate", json={"tests": [{"ap_hi": 150, "cholesterol": 1}, {"ap_hi": 120}]}).json()
+    assert [r["at_risk"] for r in inline["results"]] == [True, False]
+
+    selected = api.post("/risk/evaluate", json={"appointment_ids": [ID_MIN, ID_MIN + 1]}).json()
+    assert selected["evaluated"] == 2
+
+    rule = {"conditions": [{"field": "ap_hi", "op": ">", "value": 0}]}
+    cohort = api.post("/risk/evaluate", json={"rule": rule}).json()
+    assert cohort["evaluated"] == cohort["at_risk"] == 120
+
+
+def test_risk_cohort_export(api):
+    rows = [json.loads(line) for line in api.get("/risk/cohort").text.splitlines()]
+    assert rows and all(row["at_risk"] for row in rows)
+    csv = api.get("/risk/cohort", params={"format": "csv", "at_risk_only": False}).text.splitlines()
+    assert len(csv) == 121
+
+
+# ---------- OPERATIONS ----------
+def test_operational_endpoints(api):
+    api.get("/doctors")
+    api.get("/doctors")
+    assert api.get("/cache/stats").json()["hits"] >= 1
+    assert api.get("/pool/stats").json()["checkouts"] > 0
+    assert api.get("/workers").json() == {"supervised": False, "workers": []}
+    assert api.get("/write_queue/stats").json() == {"enabled": False}
+    metrics = api.get("/metrics").text
+    assert 'healthcare_http_responses_total{method="GET",route="/doctors",status="200"}' in metrics
+
+
+def test_group_commit_writes(make_api):
+    api = make_api(write_queue_enabled=True, write_queue_window_ms=5)
+    patient_id = new_patient(api)
+    appointment_id = new_appointment(api, patient_id)["appointment_id"]
+    new_test(api, appointment_id)
+    assert api.get(f"/records/{appointment_id}").json()["test_details"]["ap_hi"] == 150
+    stats = api.get("/write_queue/stats").json()
+    assert stats["enabled"] is True and stats["writes"] >= 3
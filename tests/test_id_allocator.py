@@ -0,0 +1,94 @@
+"""IDs from allocators that share one id_blocks table are unique and stay in the keyspace."""
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pytest
+import sqlite_backend
+from id_allocator import ID_MAX, ID_MIN, IdAllocator, MySQLBlockReserver
+
+
+TABLE = "patient_details"
+WORKERS = 4
+IDS_PER_WORKER = 300
+# Small blocks force many refills, so the workers' reservations interleave
+BLOCK_SIZE = 7
+
+
+def allocate(path, count=IDS_PER_WORKER, block_size=BLOCK_SIZE):
+    """One worker: its own allocator and its own connections to the shared database."""
+    allocator = IdAllocator(MySQLBlockReserver(lambda: sqlite_backend.connect(path)), block_size)
+    ids = []
+    while len(ids) < count:
+        # Mix single IDs with batches, as the single-record and bulk endpoints do
+        ids.extend(allocator.next_ids(TABLE, min(1 + len(ids) % 5, count - len(ids))))
+    return ids
+
+
+def run_threads(path):
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return [i for ids in pool.map(allocate, [path] * WORKERS) for i in ids]
+
+
+def run_processes(path):
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("fork")) as pool:
+        return [i for ids in pool.map(allocate, [path] * WORKERS) for i in ids]
+
+
+def execute(db, query, params=()):
+    cursor = db.cursor()
+    cursor.execute(query, params)
+    db.commit()
+    cursor.close()
+
+
+def used_ids(db):
+    cursor = db.cursor()
+    cursor.execute(f"SELECT patient_id FROM {TABLE}")
+    ids = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return ids
+
+
+def assert_valid(ids, used):
+    assert len(ids) == WORKERS * IDS_PER_WORKER
+    assert len(set(ids)) == len(ids)
+    assert all(ID_MIN <= i <= ID_MAX for i in ids)
+    assert not set(ids) & used
+
+
+@pytest.fixture(params=[run_threads, run_processes], ids=["threads", "processes"])
+def run_workers(request):
+    return request.param
+
+
+def test_concurrent_workers_get_distinct_ids(run_workers, database, db):
+    assert_valid(run_workers(database["db_path"]), used_ids(db))
+
+
+def test_legacy_ids_in_the_range_are_skipped(run_workers, database, db):
+    # Random IDs from before the allocator, scattered through the range it is about to hand out
+    cursor = db.cursor()
+    cursor.execute("SELECT next_id FROM id_blocks WHERE name = %s", (TABLE,))
+    start = cursor.fetchone()[0]
+    cursor.close()
+    legacy = random.Random(0).sample(range(start, start + WORKERS * IDS_PER_WORKER), 200)
+    for patient_id in legacy:
+        execute(db, "INSERT INTO patient_details (patient_id, name, age, gender, height, weight) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)", (patient_id, "Legacy Patient", 50, 1, 170.0, 70.0))
+
+    ids = run_workers(database["db_path"])
+
+    assert_valid(ids, used_ids(db))
+    assert max(ids) > max(legacy)
+
+
+def test_wraparound_restarts_at_the_bottom_of_the_keyspace(run_workers, database, db):
+    # Room for a few blocks before ID_MAX; the rest must come from ID_MIN upwards, past the
+    # patients the seed data already has there
+    execute(db, "UPDATE id_blocks SET next_id = %s WHERE name = %s", (ID_MAX - 5 * BLOCK_SIZE, TABLE))
+
+    ids = run_workers(database["db_path"])
+
+    assert_valid(ids, used_ids(db))
+    assert any(i > ID_MAX - 5 * BLOCK_SIZE for i in ids)
+    assert any(i < ID_MAX - 5 * BLOCK_SIZE for i in ids)
@@ -0,0 +1,205 @@
+"""A read after any write never returns a cached result from before that write.
+
+Every test warms the cached GET endpoints, runs one kind of write, and then checks two
+things. The next reads must match what the same reads return from an empty cache. The
+reads the write touches must actually have changed.
+"""
+import os
+import subprocess
+import sys
+import pytest
+import app_main
+import cardio_import
+from app_config import load_settings
+from id_allocator import ID_MIN
+from table_access import TABLES
+
+
+DATE = "2030-05-06"
+PATIENT = {"name": "Rosalind Franklin", "age": 44, "gender": 1, "height": 162.0, "weight": 58.0}
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cached_reads(patient_id):
+    reads = {
+        "doctors": ("/doctors", {}),
+        "patient": (f"/patients/{patient_id}", {}),
+        "dossier": (f"/patients/{patient_id}/dossier", {}),
+        "calendar": ("/appointments", {"from": DATE, "to": DATE}),
+        "analysis": ("/get_analysis", {}),
+        "aggregate": ("/analysis/aggregate", {}),
+    }
+    for table in TABLES:
+        reads[f"fetch_{table}"] = (f"/fetch/{table}", {"limit": 10000})
+    return reads
+
+
+def snapshot(api, patient_id):
+    results = {}
+    for name, (path, params) in cached_reads(patient_id).items():
+        response = api.get(path, params=params)
+        assert response.status_code == 200, (name, response.text)
+        results[name] = response.json()
+    return results
+
+
+def check_write(api, patient_id, write, changes):
+    """Warms every cached read, runs ``write()`` and checks the reads that follow."""
+    before = snapshot(api, patient_id)
+    hits = api.get("/cache/stats").json()["hits"]
+    assert snapshot(api, patient_id) == before
+    assert api.get("/cache/stats").json()["hits"] - hits == len(before)
+
+    write()
+
+    after = snapshot(api, patient_id)
+    app_main.response_cache.clear()
+    assert after == snapshot(api, patient_id)
+    assert {name for name in after if after[name] != before[name]} >= changes
+
+
+def post(api, path, body):
+    response = api.post(path, json=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def new_patient(api):
+    return post(api, "/patients/new", PATIENT)["patient_id"]
+
+
+def new_appointment(api, patient_id):
+    body = {"patient_id": patient_id, "appointment_type": "Consultation", "appointment_date": DATE}
+    return post(api, "/appointments", body)["appointment_id"]
+
+
+def vitals(appointment_id):
+    return {"appointment_id": appointment_id, "ap_hi": 163, "ap_lo": 95, "cholesterol": 3, "gluc": 1}
+
+
+def prescription_body(appointment_id):
+    return {"appointment_id": appointment_id, "prescribed_date": DATE, "medicine_name": "Lisinopril",
+            "dosage": "10mg", "duration_days": 30}
+
+
+# ---------- SINGLE-RECORD WRITES ----------
+# Run with and without the group-commit queue, whose writes invalidate after their batch commits
+@pytest.fixture(params=[False, True], ids=["direct", "group_commit"])
+def writer_api(request, make_api):
+    return make_api(write_queue_enabled=request.param)
+
+
+def test_new_patient(writer_api):
+    check_write(writer_api, ID_MIN, lambda: new_patient(writer_api), {"fetch_patient_details"})
+
+
+def test_new_lifestyle(writer_api):
+    patient_id = new_patient(writer_api)
+    body = {"patient_id": patient_id, "smoke": 1, "alco": 0, "active": 1}
+    check_write(writer_api, patient_id, lambda: post(writer_api, "/patients/lifestyle", body),
+                {"patient", "dossier", "fetch_patient_lifestyle"})
+
+
+def test_new_appointment(writer_api):
+    check_write(writer_api, ID_MIN, lambda: new_appointment(writer_api, ID_MIN),
+                {"dossier", "calendar", "fetch_appointments"})
+
+
+def test_new_test(writer_api):
+    appointment_id = new_appointment(writer_api, ID_MIN)
+    check_write(writer_api, ID_MIN, lambda: post(writer_api, "/tests", vitals(appointment_id)),
+                {"dossier", "analysis", "aggregate", "fetch_test_details"})
+
+
+def test_new_prescription(writer_api):
+    appointment_id = new_appointment(writer_api, ID_MIN)
+    post(writer_api, "/tests", vitals(appointment_id))
+    check_write(writer_api, ID_MIN, lambda: post(writer_api, "/prescriptions", prescription_body(appointment_id)),
+                {"dossier", "fetch_prescriptions"})
+
+
+# ---------- BULK WRITES ----------
+def test_bulk_patients(api):
+    check_write(api, ID_MIN, lambda: post(api, "/patients/bulk", [PATIENT, PATIENT]), {"fetch_patient_details"})
+
+
+def test_bulk_lifestyle(api):
+    patient_id = new_patient(api)
+    body = [{"patient_id": patient_id, "smoke": 0, "alco": 1, "active": 0}]
+    check_write(api, patient_id, lambda: post(api, "/patients/lifestyle/bulk", body),
+                {"patient", "dossier", "fetch_patient_lifestyle"})
+
+
+def test_bulk_tests(api):
+    appointment_id = new_appointment(api, ID_MIN)
+    check_write(api, ID_MIN, lambda: post(api, "/tests/bulk", [vitals(appointment_id)]),
+                {"dossier", "analysis", "aggregate", "fetch_test_details"})
+
+
+def test_bulk_prescriptions(api):
+    appointment_id = new_appointment(api, ID_MIN)
+    post(api, "/tests", vitals(appointment_id))
+    check_write(api, ID_MIN, lambda: post(api, "/prescriptions/bulk", [prescription_body(appointment_id)]),
+                {"dossier", "fetch_prescriptions"})
+
+
+# ---------- OUT-OF-BAND WRITES ----------
+def insert_doctor(db, doctor_id):
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO doctors (doctor_id, name, specialization) VALUES (%s, %s, %s)",
+                   (doctor_id, "Doctor Added", "Cardiology"))
+    db.commit()
+    cursor.close()
+
+
+def test_scheduler_refresh(api, db):
+    def write():
+        insert_doctor(db, ID_MIN + 500)
+        post(api, "/scheduler/refresh", {})
+
+    check_write(api, ID_MIN, write, {"doctors", "fetch_doctors"})
+
+
+def test_cardio_import(make_api, tmp_path):
+    # The importer invalidates through a cache of its own, as when it runs as a separate command,
+    # so its writes only reach the API's cache through the shared versions
+    api = make_api(cache_shared_path=tmp_path / "versions")
+    csv_path = tmp_path / "cardio.csv"
+    csv_path.write_text("id;age;gender;height;weight;ap_hi;ap_lo;cholesterol;gluc;smoke;alco;active;cardio\n"
+                        "1;18393;2;168;62.0;110;80;1;1;0;0;1;0\n"
+                        "2;20228;1;156;85.0;140;90;3;1;0;0;1;1\n")
+
+    def write():
+        summary = cardio_import.run_import(str(csv_path), load_settings(), workers=1, chunk_size=10,
+                                           log=lambda *_: None)
+        assert summary["imported"] == 2
+
+    check_write(api, ID_MIN, write, {"analysis", "aggregate", "fetch_patient_details", "fetch_patient_lifestyle",
+                                     "fetch_appointments", "fetch_test_details"})
+
+
+# ---------- SHARED VERSIONS ----------
+OTHER_WORKER = """
+import sys
+import sqlite_backend
+from app_config import load_settings
+from response_cache import create_cache
+
+conn = sqlite_backend.connect(sys.argv[1])
+conn.cursor().execute("INSERT INTO doctors (doctor_id, name, specialization) VALUES (%s, %s, %s)",
+                      (int(sys.argv[2]), "Doctor Elsewhere", "Cardiology"))
+conn.commit()
+create_cache(load_settings()).invalidate("doctors")
+"""
+
+
+def test_shared_versions_across_processes(make_api, database, tmp_path):
+    api = make_api(cache_shared_path=tmp_path / "versions")
+
+    def write():
+        # Another worker process writes and bumps the shared version file
+        subprocess.run([sys.executable, "-c", OTHER_WORKER, database["db_path"], str(ID_MIN + 600)],
+                       cwd=REPO, env=os.environ, check=True)
+
+    check_write(api, ID_MIN, write, {"doctors", "fetch_doctors"})
+    assert api.get("/cache/stats").json()["shared_versions"] is True
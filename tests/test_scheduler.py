@@ -0,0 +1,66 @@
+"""Doctor capacity under concurrent bookings, within one process and across processes."""
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from id_allocator import ID_MIN
+
+
+CAPACITY = 3
+DOCTORS = 4
+DATE = "2030-03-04"
+
+
+def book_concurrently(api, patient_id, count):
+    def book(_):
+        return api.post("/appointments", json={"patient_id": patient_id, "appointment_type": "Consultation",
+                                               "appointment_date": DATE})
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(book, range(count)))
+
+
+def bookings_per_doctor(db):
+    cursor = db.cursor()
+    cursor.execute("SELECT doctor_id, COUNT(*) FROM appointments WHERE appointment_date = %s GROUP BY doctor_id",
+                   (DATE,))
+    counts = dict(cursor.fetchall())
+    cursor.close()
+    return counts
+
+
+@pytest.mark.parametrize("write_queue", [False, True])
+def test_parallel_bookings_stop_at_capacity(make_api, db, write_queue):
+    api = make_api(doctor_daily_capacity=CAPACITY, write_queue_enabled=write_queue)
+    responses = book_concurrently(api, ID_MIN, 20)
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200] * (CAPACITY * DOCTORS) + [409] * (20 - CAPACITY * DOCTORS)
+    counts = bookings_per_doctor(db)
+    assert sorted(counts.values()) == [CAPACITY] * DOCTORS
+    assert api.get("/scheduler/stats", params={"date": DATE}).json()["loads"] == {str(d): CAPACITY for d in counts}
+
+
+def test_capacity_holds_against_bookings_from_another_worker(make_api, db):
+    api = make_api(doctor_daily_capacity=CAPACITY)
+    # The first booking loads the day into this worker's scheduler; then two doctors are
+    # filled behind its back, as another worker process with its own scheduler would
+    first = api.post("/appointments", json={"patient_id": ID_MIN, "appointment_type": "Consultation",
+                                            "appointment_date": DATE})
+    assert first.status_code == 200
+    cursor = db.cursor()
+    taken = bookings_per_doctor(db)
+    next_id = ID_MIN + 900000
+    for doctor_id in (ID_MIN, ID_MIN + 1):
+        for _ in range(CAPACITY - taken.get(doctor_id, 0)):
+            cursor.execute("INSERT INTO appointments (appointment_id, patient_id, doctor_id, appointment_date, "
+                           "appointment_type) VALUES (%s, %s, %s, %s, %s)",
+                           (next_id, ID_MIN, doctor_id, DATE, "Consultation"))
+            next_id += 1
+    db.commit()
+    cursor.close()
+    room = CAPACITY * DOCTORS - sum(bookings_per_doctor(db).values())
+
+    responses = book_concurrently(api, ID_MIN, 12)
+
+    assert sum(r.status_code == 200 for r in responses) == room
+    assert sum(r.status_code == 409 for r in responses) == 12 - room
+    assert sorted(bookings_per_doctor(db).values()) == [CAPACITY] * DOCTORS
@@ -0,0 +1,80 @@
+"""The migrated schema: every hot query uses an index and every base table has its keys."""
+import pytest
+import schema
+import sqlite_backend
+
+
+pytestmark = pytest.mark.backends
+
+
+def execute(db, query, params=()):
+    cursor = db.cursor()
+    cursor.execute(query, params)
+    db.commit()
+    cursor.close()
+
+
+def test_hot_queries_use_indexes(db):
+    assert schema.check_plans(db) == []
+
+
+def test_migrations_are_applied_once(db):
+    assert schema.migrate(db, log=lambda *_: None) == []
+    cursor = db.cursor()
+    assert schema.applied_versions(cursor) == {version for version, _, _ in schema.MIGRATIONS}
+    cursor.close()
+
+
+def test_base_tables_have_their_keys(db):
+    assert schema.missing_keys(db) == ([], [])
+
+
+# ---------- HAND-MADE DATABASES ----------
+def drop_foreign_key(db, table, column):
+    cursor = db.cursor()
+    cursor.execute("SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s "
+                   "AND REFERENCED_TABLE_NAME IS NOT NULL", (table, column))
+    (name,) = cursor.fetchone()
+    cursor.close()
+    execute(db, f"ALTER TABLE {table} DROP FOREIGN KEY {name}")
+
+
+@pytest.fixture
+def mysql_db(database, db):
+    if database["db_backend"] != "mysql":
+        pytest.skip("keys are added with ALTER TABLE on MySQL only")
+    return db
+
+
+def test_missing_foreign_key_is_added(mysql_db):
+    drop_foreign_key(mysql_db, "prescriptions", "appointment_id")
+    assert schema.missing_keys(mysql_db)[1] == [("prescriptions", "appointment_id", "appointments", "appointment_id")]
+
+    schema.ensure_keys(mysql_db)
+
+    assert schema.missing_keys(mysql_db) == ([], [])
+
+
+def test_orphaned_rows_stop_the_migration(mysql_db):
+    drop_foreign_key(mysql_db, "prescriptions", "appointment_id")
+    execute(mysql_db, "INSERT INTO prescriptions (prescription_id, appointment_id, prescribed_date, medicine_name, "
+                      "dosage, duration_days) VALUES (%s, %s, %s, %s, %s, %s)",
+            (99999999, 1, "2030-01-01", "Aspirin", "75mg", 30))
+
+    with pytest.raises(RuntimeError, match="1 rows reference a missing appointments row"):
+        schema.ensure_keys(mysql_db)
+
+
+def test_hand_made_sqlite_tables_without_keys_fail_loudly(tmp_path):
+    conn = sqlite_backend.connect(str(tmp_path / "hand_made.db"))
+    try:
+        execute(conn, "CREATE TABLE doctors (doctor_id BIGINT, name VARCHAR(100), specialization VARCHAR(100))")
+
+        with pytest.raises(RuntimeError, match=r"primary keys on \['doctors'\]"):
+            schema.migrate(conn, log=lambda *_: None)
+        cursor = conn.cursor()
+        assert 9 not in schema.applied_versions(cursor)
+        cursor.close()
+    finally:
+        conn.close()
@@ -0,0 +1,80 @@
+"""The launcher's rolling restart starts workers that see the current env file."""
+import os
+import socket
+import subprocess
+import sys
+import time
+import pytest
+import requests
+import serve
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(check, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    pytest.fail("timed out")
+
+
+def pool_sizes(url, count=6):
+    return {requests.get(f"{url}/pool/stats", timeout=5).json()["pool_size"] for _ in range(count)}
+
+
+@pytest.fixture
+def launcher(database, tmp_path):
+    """Runs ``python -m serve`` with two workers and yields ``(url, env file, status dir)``."""
+    env_file = tmp_path / "healthcare.env"
+    env_file.write_text(f"HEALTHCARE_DB_BACKEND=sqlite\nHEALTHCARE_DB_PATH={database['db_path']}\n"
+                        "HEALTHCARE_DB_POOL_SIZE=3\n")
+    port = free_port()
+    status_dir = str(tmp_path / "status")
+    environ = {k: v for k, v in os.environ.items() if not k.startswith("HEALTHCARE_")}
+    proc = subprocess.Popen([sys.executable, "-m", "serve", "--port", str(port), "--workers", "2",
+                             "--env-file", str(env_file), "--status-dir", status_dir, "--log-level", "warning"],
+                            cwd=REPO, env=environ)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(lambda: sum(r["state"] == "ready" for r in serve.worker_statuses(status_dir)) == 2)
+        yield url, env_file, status_dir
+    finally:
+        proc.terminate()
+        proc.wait(30)
+
+
+def generations(status_dir):
+    return {r["generation"] for r in serve.worker_statuses(status_dir) if r["state"] == "ready"}
+
+
+def test_reload_applies_the_changed_env_file(launcher):
+    url, env_file, status_dir = launcher
+    assert pool_sizes(url) == {3}
+
+    env_file.write_text(env_file.read_text().replace("POOL_SIZE=3", "POOL_SIZE=5"))
+    assert serve.main(["reload", "--status-dir", status_dir]) == 0
+
+    wait_for(lambda: generations(status_dir) == {3, 4})
+    assert pool_sizes(url) == {5}
+
+
+def test_reload_with_an_invalid_env_file_keeps_the_workers(launcher):
+    url, env_file, status_dir = launcher
+    env_file.write_text(env_file.read_text() + "HEALTHCARE_DB_POOL_SIZE=many\n")
+    assert serve.main(["reload", "--status-dir", status_dir]) == 0
+
+    time.sleep(3)
+    assert generations(status_dir) == {1, 2}
+    assert pool_sizes(url) == {3}